@@ -0,0 +1,38 @@
+"""
+Configuration of gunicorn, read from the working directory.
+
+The application is loaded and warmed up once in the master, then shared with
+the workers it forks: they start at once, without loading Django and building
+the GraphQL schemas each. Set GUNICORN_PRELOAD=False to load it in each worker
+instead, e.g. to reload the code by restarting workers with `kill -HUP`.
+
+Workers share the memory of the master until they write to it: reference counts
+and garbage collections copy the pages of the objects they touch, so the share
+shrinks as workers run. Freezing the objects of the master (gc.freeze) would
+need Python 3.7, the runtime is 3.6.
+"""
+import os
+
+preload_app = os.environ.get("GUNICORN_PRELOAD", "True").lower() in ("true", "1", "yes", "on")
+
+
+def on_starting(server):
+    # Metrics of the workers of a previous run, see core.metrics.
+    metrics_dir = os.environ.get("METRICS_DIR")
+    if metrics_dir:
+        for filename in os.listdir(metrics_dir):
+            os.remove(os.path.join(metrics_dir, filename))
+
+
+def when_ready(server):
+    if server.cfg.preload_app:
+        from core.warmup import warm_up
+
+        warm_up()
+
+
+def post_worker_init(worker):
+    if not worker.cfg.preload_app:
+        from core.warmup import warm_up
+
+        warm_up()
@@ -1,9 +1,39 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 
+from account.backends import invalidate_cached_user
 from account.models import WYEUser
+from core.admin import BigTableAdmin, iterate_in_chunks
+from core.response_cache import invalidate_user_responses
 
 
-class WYEUserAdmin(admin.ModelAdmin):
-    pass
+class WYEUserAdmin(BigTableAdmin):
+    list_display = ("email", "pseudo", "is_active", "is_staff", "date_joined")
+    list_filter = ("is_active", "is_staff")
+    # Prefix searches, matched by the indexes of migration 0002 on PostgreSQL.
+    search_fields = ("^email", "^pseudo")
+    actions = ["deactivate_users"]
+
+    def deactivate_users(self, request, queryset):
+        response = self.confirm_action(
+            request,
+            queryset,
+            "deactivate_users",
+            "Deactivate users",
+            "Deactivate the {count} selected users? They are logged out.",
+        )
+        if response is not None:
+            return response
+        count = 0
+        for pks in iterate_in_chunks(queryset):
+            # update() does not send model signals.
+            count += WYEUser.objects.filter(pk__in=pks).update(is_active=False)
+            for pk in pks:
+                invalidate_cached_user(pk)
+                invalidate_user_responses(pk)
+        self.message_user(request, "Deactivated {} users.".format(count), messages.SUCCESS)
+
+    deactivate_users.short_description = "Deactivate selected users"
+    deactivate_users.allowed_permissions = ("change",)
+
 
 admin.site.register(WYEUser, WYEUserAdmin)
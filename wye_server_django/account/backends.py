@@ -0,0 +1,66 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import caches
+
+from account import hashers
+
+
+def get_user_cache():
+    return caches[settings.USER_CACHE]
+
+
+def get_user_cache_key(user_id):
+    return "account:user:{}".format(user_id)
+
+
+def invalidate_cached_user(user_id):
+    get_user_cache().delete(get_user_cache_key(user_id), version=settings.USER_CACHE_VERSION)
+
+
+class WYEModelBackend(ModelBackend):
+    """
+    Authentication backend caching the user looked up on every authenticated
+    request by `AuthenticationMiddleware`, and hashing passwords in the hasher
+    thread pool.
+
+    Cached users are invalidated whenever they are saved, deleted or logged out.
+    Bump `USER_CACHE_VERSION` whenever `WYEUser` changes, so that users cached by
+    a previous release are never unpickled.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Hashes the password anyway, so that response times do not reveal
+            # whether a user exists.
+            hashers.make_password(password)
+            return None
+
+        is_correct, upgraded_password = hashers.check_password(password, user.password)
+        if not is_correct or not self.user_can_authenticate(user):
+            return None
+
+        if upgraded_password is not None:
+            user.password = upgraded_password
+            user.save(update_fields=["password"])
+        return user
+
+    def get_user(self, user_id):
+        cache = get_user_cache()
+        key = get_user_cache_key(user_id)
+        user = cache.get(key, version=settings.USER_CACHE_VERSION)
+        if user is None:
+            user = super(WYEModelBackend, self).get_user(user_id)
+            if user is not None:
+                cache.set(
+                    key, user, settings.USER_CACHE_TIMEOUT, version=settings.USER_CACHE_VERSION
+                )
+        return user
@@ -1,35 +1,249 @@
 import datetime
 
+from django.conf import settings
 from django.contrib.auth import authenticate, login, logout, get_user_model
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
 
 import graphene
+from graphene import relay
 from graphene_django import DjangoObjectType
+from graphql import GraphQLError
 
-from rooms.models import EscapeRoomSession
+from account import hashers
+from account.jobs import send_welcome_email
+from account.ratelimit import LoginRateLimiter
+from core.loaders import ModelLoader, RelatedSetLoader, get_loader
+from core.optimizer import optimize_queryset
+from core.pagination import KeysetPaginator, connection_from_paginator
+from core.subscriptions import publish
+from rooms.catalogue import search_rooms
+from rooms.importers import build_room_session, save_room_sessions
+from rooms.leaderboards import Leaderboard
+from rooms.models import (
+    EscapeRoom,
+    EscapeRoomSession,
+    LeaderboardEntry,
+    RoomSessionMonthlyStats,
+    RoomSessionStats,
+)
+
+
+def get_room_sessions_group(user_id):
+    return "room_sessions.user.{}".format(user_id)
+
+
+def get_room_sessions(context):
+    return EscapeRoomSession.objects.filter(user=context.user)
+
+
+def get_user_loader(info):
+    loader = get_loader(info.context, ModelLoader, get_user_model())
+    user = info.context.user
+    if user.is_authenticated:
+        # Most sessions queried belong to the requesting user, already fetched
+        # by the authentication middleware.
+        loader.prime(user.pk, user)
+    return loader
 
 
 class UserType(DjangoObjectType):
+    def resolve_escaperoomsession_set(self, info):
+        if "escaperoomsession_set" in getattr(self, "_prefetched_objects_cache", {}):
+            return self.escaperoomsession_set.all()
+        return get_loader(info.context, RelatedSetLoader, EscapeRoomSession, "user").load(
+            self.pk
+        )
+
     class Meta:
         model = get_user_model()
 
 
+class EscapeRoomType(DjangoObjectType):
+    class Meta:
+        model = EscapeRoom
+        fields = ("id", "name")
+
+
 class EscapeRoomSessionType(DjangoObjectType):
+    # Columns of the fields with a resolver, for lists of sessions served from
+    # rows (see core.flat_lists).
+    row_columns = {"duration_time": ("duration_time", datetime.timedelta.total_seconds)}
+
     def resolve_duration_time(self, info):
         return self.duration_time.total_seconds()
 
+    def resolve_user(self, info):
+        if EscapeRoomSession.user.is_cached(self):
+            return self.user
+        return get_user_loader(info).load(self.user_id)
+
     class Meta:
         model = EscapeRoomSession
 
 
+class EscapeRoomSessionConnection(relay.Connection):
+    class Meta:
+        node = EscapeRoomSessionType
+
+
+class EscapeRoomSessionOrder(graphene.Enum):
+    PLAYED_DATETIME_ASC = "played_datetime"
+    PLAYED_DATETIME_DESC = "-played_datetime"
+    DURATION_TIME_ASC = "duration_time"
+    DURATION_TIME_DESC = "-duration_time"
+    NUMBER_OF_HINTS_ASC = "number_of_hints"
+    NUMBER_OF_HINTS_DESC = "-number_of_hints"
+
+
+def duration_to_seconds(duration):
+    if duration is None:
+        return None
+    return duration.total_seconds()
+
+
+class RoomStatsFields(object):
+    count = graphene.Int(required=True)
+    total_duration_time = graphene.Float(required=True)
+    average_duration_time = graphene.Float()
+    best_duration_time = graphene.Float()
+    average_number_of_hints = graphene.Float()
+
+    def resolve_total_duration_time(self, info):
+        return duration_to_seconds(self.total_duration_time)
+
+    def resolve_average_duration_time(self, info):
+        return duration_to_seconds(self.average_duration_time)
+
+    def resolve_best_duration_time(self, info):
+        return duration_to_seconds(self.best_duration_time)
+
+
+class RoomMonthStatsType(RoomStatsFields, graphene.ObjectType):
+    month = graphene.Date(required=True)
+
+
+class RoomStatsType(RoomStatsFields, graphene.ObjectType):
+    months = graphene.List(graphene.NonNull(RoomMonthStatsType), required=True)
+
+    def resolve_months(self, info):
+        return RoomSessionMonthlyStats.objects.filter(user_id=self.user_id).order_by("month")
+
+
+class LeaderboardMetric(graphene.Enum):
+    DURATION_TIME = LeaderboardEntry.DURATION_TIME
+    NUMBER_OF_HINTS = LeaderboardEntry.NUMBER_OF_HINTS
+
+
+class LeaderboardEntryType(graphene.ObjectType):
+    rank = graphene.Int(required=True)
+    pseudo = graphene.String(required=True)
+    played_datetime = graphene.DateTime(required=True)
+    duration_time = graphene.Float(required=True)
+    number_of_hints = graphene.Int(required=True)
+
+    def resolve_pseudo(self, info):
+        return self.user.pseudo
+
+    def resolve_duration_time(self, info):
+        return duration_to_seconds(self.duration_time)
+
+
+def clamp_count(count):
+    return max(0, min(count, settings.GRAPHQL_MAX_PAGE_SIZE))
+
+
+class LeaderboardType(graphene.ObjectType):
+    top = graphene.List(
+        graphene.NonNull(LeaderboardEntryType),
+        required=True,
+        first=graphene.Int(default_value=10),
+    )
+    me = graphene.Field(LeaderboardEntryType)
+    around_me = graphene.List(
+        graphene.NonNull(LeaderboardEntryType),
+        required=True,
+        count=graphene.Int(default_value=5),
+    )
+
+    def resolve_top(self, info, first):
+        return self.top(clamp_count(first))
+
+    def resolve_me(self, info):
+        return self.get_entry(info.context.user.pk)
+
+    def resolve_around_me(self, info, count):
+        entry = self.get_entry(info.context.user.pk)
+        if entry is None:
+            return []
+        return self.around(entry, clamp_count(count))
+
+
 class Query(graphene.ObjectType):
     whoami = graphene.String(name=graphene.String(default_value="stranger"))
     room_sessions = graphene.List(EscapeRoomSessionType)
+    room_sessions_connection = relay.ConnectionField(
+        EscapeRoomSessionConnection,
+        played_after=graphene.DateTime(),
+        played_before=graphene.DateTime(),
+        name_prefix=graphene.String(),
+        room=graphene.ID(),
+        min_number_of_hints=graphene.Int(),
+        max_number_of_hints=graphene.Int(),
+        order_by=EscapeRoomSessionOrder(
+            default_value=EscapeRoomSessionOrder.PLAYED_DATETIME_DESC.value
+        ),
+    )
+    room_stats = graphene.Field(RoomStatsType, required=True)
+    search_rooms = graphene.List(
+        graphene.NonNull(EscapeRoomType),
+        required=True,
+        prefix=graphene.String(required=True),
+        first=graphene.Int(default_value=10),
+    )
+    leaderboard = graphene.Field(
+        LeaderboardType,
+        required=True,
+        metric=LeaderboardMetric(required=True),
+        room=graphene.ID(),
+    )
 
     def resolve_whoami(self, info, name):
         return "I am " + info.context.user.email
 
     def resolve_room_sessions(self, info):
-        return EscapeRoomSession.objects.filter(user=info.context.user)
+        return optimize_queryset(get_room_sessions(info.context), info)
+
+    def resolve_room_sessions_connection(
+        self, info, order_by, first=None, after=None, last=None, before=None, **filters
+    ):
+        queryset = EscapeRoomSession.objects.filter(user=info.context.user).filter_by(
+            **filters
+        )
+        queryset = optimize_queryset(
+            queryset, info, path=("edges", "node"), extra_fields=(order_by.lstrip("-"),)
+        )
+        paginator = KeysetPaginator(queryset, order_by)
+
+        return connection_from_paginator(
+            EscapeRoomSessionConnection,
+            paginator,
+            first=first,
+            after=after,
+            last=last,
+            before=before,
+        )
+
+    def resolve_room_stats(self, info):
+        user = info.context.user
+        return RoomSessionStats.objects.filter(user=user).first() or RoomSessionStats(user=user)
+
+    def resolve_search_rooms(self, info, prefix, first):
+        return search_rooms(prefix, clamp_count(first))
+
+    def resolve_leaderboard(self, info, metric, room=None):
+        return Leaderboard(metric, room)
 
 
 class CreateUser(graphene.Mutation):
@@ -42,9 +256,12 @@ class CreateUser(graphene.Mutation):
 
     def mutate(self, info, email, pseudo, password):
         user = get_user_model()(email=email, pseudo=pseudo)
-        user.set_password(password)
+        user.password = hashers.make_password(password)
         user.save()
         login(info.context, user)
+        send_welcome_email.enqueue_on_commit(
+            user_id=user.pk, idempotency_key="welcome_email:{}".format(user.pk)
+        )
 
         return CreateUser(user=user)
 
@@ -57,9 +274,16 @@ class LoginUser(graphene.Mutation):
         password = graphene.String(required=True)
 
     def mutate(self, info, email, password):
+        rate_limiter = LoginRateLimiter(info.context, email)
+        if rate_limiter.is_limited():
+            raise GraphQLError("Too many failed login attempts, please retry later.")
+
         user = authenticate(info.context, email=email, password=password)
         if user is not None:
+            rate_limiter.succeed()
             login(info.context, user)
+        else:
+            rate_limiter.fail()
 
         return LoginUser(user=user)
 
@@ -76,17 +300,60 @@ class CreateRoomSession(graphene.Mutation):
     def mutate(self, info, name, played_datetime, duration_time, number_of_hints):
         formatted_duration_time = datetime.timedelta(seconds=duration_time)
 
-        room_session = EscapeRoomSession.objects.create(
-            name=name,
-            played_datetime=played_datetime,
-            duration_time=formatted_duration_time,
-            number_of_hints=number_of_hints,
-            user=info.context.user,
+        # Room session statistics are updated along with the session itself.
+        with transaction.atomic():
+            room_session = EscapeRoomSession.objects.create(
+                name=name,
+                played_datetime=played_datetime,
+                duration_time=formatted_duration_time,
+                number_of_hints=number_of_hints,
+                user=info.context.user,
+            )
+        # Other devices of the user are notified once the session is visible to them.
+        transaction.on_commit(
+            lambda: publish(
+                get_room_sessions_group(room_session.user_id),
+                {"id": room_session.pk, "played_datetime": room_session.played_datetime.isoformat()},
+            )
         )
 
         return CreateRoomSession(room_session=room_session)
 
 
+class RoomSessionInput(graphene.InputObjectType):
+    name = graphene.String(required=True)
+    played_datetime = graphene.DateTime(required=True)
+    duration_time = graphene.Float(required=True)
+    number_of_hints = graphene.Int(required=True)
+
+
+class CreateRoomSessions(graphene.Mutation):
+    count = graphene.Int()
+
+    class Arguments:
+        room_sessions = graphene.List(graphene.NonNull(RoomSessionInput), required=True)
+
+    def mutate(self, info, room_sessions):
+        if len(room_sessions) > settings.ROOM_SESSIONS_IMPORT_BATCH_SIZE:
+            raise GraphQLError(
+                "Cannot create more than {} room sessions at once.".format(
+                    settings.ROOM_SESSIONS_IMPORT_BATCH_SIZE
+                )
+            )
+
+        sessions = []
+        for index, values in enumerate(room_sessions):
+            try:
+                sessions.append(build_room_session(info.context.user, values))
+            except ValidationError as e:
+                raise GraphQLError(
+                    "Invalid room session at index {}: {}".format(index, e.message_dict)
+                )
+        save_room_sessions(sessions)
+
+        return CreateRoomSessions(count=len(sessions))
+
+
 class LogOutUser(graphene.Mutation):
     user = graphene.Field(UserType)
 
@@ -106,3 +373,22 @@ class Mutation(graphene.ObjectType):
 class PrivateMutation(graphene.ObjectType):
     logout_user = LogOutUser.Field()
     create_room_session = CreateRoomSession.Field()
+    create_room_sessions = CreateRoomSessions.Field()
+
+
+class Subscription(graphene.ObjectType):
+    room_session_created = graphene.Field(EscapeRoomSessionType, required=True)
+
+    def resolve_room_session_created(self, info):
+        def load_room_session(event):
+            return (
+                EscapeRoomSession.objects.select_related("user")
+                .with_key(event["id"], parse_datetime(event["played_datetime"]))
+                .first()
+            )
+
+        return (
+            info.context.stream(get_room_sessions_group(info.context.user.pk))
+            .map(load_room_session)
+            .filter(lambda room_session: room_session is not None)
+        )
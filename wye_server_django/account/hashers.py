@@ -0,0 +1,68 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """
+    PBKDF2 hasher whose iteration count is set by `PASSWORD_HASHER_ITERATIONS`.
+
+    Hashes with another iteration count are still checked, and upgraded on the
+    next successful login.
+    """
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASHER_ITERATIONS or hashers.PBKDF2PasswordHasher.iterations
+
+
+_hasher_pool = None
+_hasher_pool_lock = threading.Lock()
+
+
+def get_hasher_pool():
+    # Created on first use, so that preforked workers do not share its threads.
+    global _hasher_pool
+    with _hasher_pool_lock:
+        if _hasher_pool is None:
+            _hasher_pool = ThreadPoolExecutor(
+                max_workers=settings.PASSWORD_HASHER_THREADS or os.cpu_count(),
+                thread_name_prefix="password-hasher",
+            )
+    return _hasher_pool
+
+
+def run_in_hasher_pool(func, *args):
+    """
+    Runs CPU bound hashing in a bounded pool of threads.
+
+    Hash functions release the GIL, so other requests handled by the worker keep
+    running, while no more than `PASSWORD_HASHER_THREADS` hashes are computed at
+    once.
+    """
+    return get_hasher_pool().submit(func, *args).result()
+
+
+def _check_password(password, encoded):
+    upgraded = []
+    is_correct = hashers.check_password(
+        password,
+        encoded,
+        setter=lambda raw_password: upgraded.append(hashers.make_password(raw_password)),
+    )
+    return is_correct, upgraded[0] if upgraded else None
+
+
+def check_password(password, encoded):
+    """
+    Returns whether the password is correct, and its new hash when the preferred
+    hasher or its settings changed since it was hashed.
+    """
+    return run_in_hasher_pool(_check_password, password, encoded)
+
+
+def make_password(password):
+    return run_in_hasher_pool(hashers.make_password, password)
@@ -0,0 +1,21 @@
+from django.contrib.auth import get_user_model
+
+from jobs.queue import task
+
+WELCOME_EMAIL_SUBJECT = "Welcome to WYE"
+WELCOME_EMAIL_MESSAGE = """Hi {pseudo},
+
+Your WYE account is ready: log your escape room sessions and see how you rank
+against the other players.
+
+The WYE team
+"""
+
+
+@task
+def send_welcome_email(user_id):
+    user = get_user_model().objects.filter(pk=user_id).first()
+    if user is None:
+        # Deleted since it signed up.
+        return
+    user.email_user(WELCOME_EMAIL_SUBJECT, WELCOME_EMAIL_MESSAGE.format(pseudo=user.pseudo))
@@ -0,0 +1,60 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher, make_password
+from django.core.management.base import BaseCommand
+
+from account import hashers
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures how many logins per second the configured password hasher allows, "
+        "on one core and through the hasher thread pool."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--duration",
+            type=float,
+            default=5,
+            help="Number of seconds each measure runs for.",
+        )
+
+    def measure(self, check, duration, concurrency):
+        encoded = make_password("benchmark-password")
+        deadline = time.monotonic() + duration
+
+        def run():
+            count = 0
+            while time.monotonic() < deadline:
+                check("benchmark-password", encoded)
+                count += 1
+            return count
+
+        started_at = time.monotonic()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            logins = sum(executor.map(lambda _: run(), range(concurrency)))
+        return logins / (time.monotonic() - started_at)
+
+    def handle(self, *args, **options):
+        duration = options["duration"]
+        threads = settings.PASSWORD_HASHER_THREADS or os.cpu_count()
+        hasher = get_hasher()
+
+        per_core = self.measure(
+            lambda password, encoded: hashers._check_password(password, encoded), duration, 1
+        )
+        pooled = self.measure(hashers.check_password, duration, threads * 2)
+
+        self.stdout.write(
+            "{} ({}): {:.1f} logins/s per core, {:.1f} logins/s through {} hasher threads".format(
+                hasher.algorithm,
+                settings.PASSWORD_HASHER_ITERATIONS or getattr(hasher, "iterations", "-"),
+                per_core,
+                pooled,
+                threads,
+            )
+        )
@@ -0,0 +1,41 @@
+from django.db import migrations
+
+# Searches of the admin, `^email` and `^pseudo`, filter with
+# `UPPER(column::text) LIKE UPPER(%s)`: these indexes match them whatever the
+# collation of the database. They are built concurrently, without locking the
+# writes to the table, which cannot be done in a transaction.
+INDEXES = [
+    ("account_wyeuser_email_upper_like", "email"),
+    ("account_wyeuser_pseudo_upper_like", "pseudo"),
+]
+
+
+def create_search_indexes(apps, schema_editor):
+    # Only on PostgreSQL, other databases scan the table.
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, column in INDEXES:
+        schema_editor.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS {} ON account_wyeuser "
+            "(UPPER({}::text) text_pattern_ops)".format(name, column)
+        )
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, _ in INDEXES:
+        schema_editor.execute("DROP INDEX CONCURRENTLY IF EXISTS {}".format(name))
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('account', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,75 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class RateLimiter(object):
+    """
+    Counts hits per identifier in fixed time windows.
+
+    Counters live in the `RATE_LIMIT_CACHE` cache, shared by every worker as
+    long as the cache itself is shared (e.g. Redis).
+    """
+
+    def __init__(self, scope, limit, window):
+        self.scope = scope
+        self.limit = limit
+        self.window = window
+
+    @property
+    def cache(self):
+        return caches[settings.RATE_LIMIT_CACHE]
+
+    def get_key(self, identifier):
+        digest = hashlib.sha256(identifier.encode("utf-8")).hexdigest()
+        return "ratelimit:{}:{}:{}".format(self.scope, digest, int(time.time() // self.window))
+
+    def is_limited(self, identifier):
+        return self.cache.get(self.get_key(identifier), 0) >= self.limit
+
+    def hit(self, identifier):
+        key = self.get_key(identifier)
+        self.cache.add(key, 0, self.window)
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            # The counter expired in between.
+            self.cache.set(key, 1, self.window)
+
+    def reset(self, identifier):
+        self.cache.delete(self.get_key(identifier))
+
+
+def get_client_ip(request):
+    forwarded_for = request.META.get("HTTP_X_FORWARDED_FOR")
+    if settings.TRUSTED_PROXY_COUNT and forwarded_for:
+        # Each trusted proxy appends the address it received the request from,
+        # addresses before them may be forged by the client.
+        addresses = [address.strip() for address in forwarded_for.split(",")]
+        return addresses[max(len(addresses) - settings.TRUSTED_PROXY_COUNT, 0)]
+    return request.META.get("REMOTE_ADDR", "")
+
+
+class LoginRateLimiter(object):
+    """
+    Limits failed login attempts per client IP address and per email.
+    """
+
+    def __init__(self, request, email):
+        self.identifiers = [
+            (RateLimiter("login_ip", *settings.LOGIN_RATE_LIMIT_PER_IP), get_client_ip(request)),
+            (RateLimiter("login_email", *settings.LOGIN_RATE_LIMIT_PER_EMAIL), email.lower()),
+        ]
+
+    def is_limited(self):
+        return any(limiter.is_limited(identifier) for limiter, identifier in self.identifiers)
+
+    def fail(self):
+        for limiter, identifier in self.identifiers:
+            limiter.hit(identifier)
+
+    def succeed(self):
+        limiter, email = self.identifiers[1]
+        limiter.reset(email)
@@ -0,0 +1,20 @@
+from django.contrib.auth.signals import user_logged_out
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from account.backends import invalidate_cached_user
+from account.models import WYEUser
+from core.response_cache import invalidate_user_responses
+
+
+@receiver(post_save, sender=WYEUser)
+@receiver(post_delete, sender=WYEUser)
+def invalidate_cached_user_on_change(sender, instance, **kwargs):
+    invalidate_cached_user(instance.pk)
+    invalidate_user_responses(instance.pk)
+
+
+@receiver(user_logged_out)
+def invalidate_cached_user_on_logout(sender, request, user, **kwargs):
+    if user is not None:
+        invalidate_cached_user(user.pk)
@@ -1,11 +1,20 @@
 import datetime
+import io
+import json
 import pytz
 import urllib
+from unittest import mock
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.sessions.backends.db import SessionStore
 from django.contrib.sessions.models import Session
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
 
+from account.backends import get_user_cache, get_user_cache_key
 from account.models import WYEUser
 from core.test_helpers import AssertMixin
 
@@ -206,3 +215,260 @@ class WYEWhoAmI(AssertMixin, TestCase):
 
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.content, b'{"data":{"whoami":"I am romain@wye.com"}}')
+
+
+class WYEAuthenticationCache(AssertMixin, TestCase):
+    def setUp(self):
+        self.private_graph_url = "/private_graphql/"
+        self.user = get_user_model().objects.create_user(
+            email="romain@wye.com", pseudo="Romain", password="pass"
+        )
+
+        self.client.login(email="romain@wye.com", password="pass")
+
+    def test_authenticated_requests_do_not_query_session_and_user(self):
+        query = """
+            {
+                whoami
+            }
+        """
+        self.client.get(self.private_graph_url, {"query": query})
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.private_graph_url, {"query": query})
+
+        self.assertEqual(response.content, b'{"data":{"whoami":"I am romain@wye.com"}}')
+
+    def test_cached_user_is_invalidated_on_save(self):
+        query = """
+            {
+                whoami
+            }
+        """
+        self.client.get(self.private_graph_url, {"query": query})
+
+        self.user.email = "new-romain@wye.com"
+        self.user.save()
+        response = self.client.get(self.private_graph_url, {"query": query})
+
+        self.assertEqual(response.content, b'{"data":{"whoami":"I am new-romain@wye.com"}}')
+
+    def test_cached_user_is_invalidated_on_logout(self):
+        query = """
+            {
+                whoami
+            }
+        """
+        self.client.get(self.private_graph_url, {"query": query})
+
+        self.client.logout()
+
+        self.assertIsNone(
+            get_user_cache().get(
+                get_user_cache_key(self.user.pk), version=settings.USER_CACHE_VERSION
+            )
+        )
+
+
+class WYEPurgeExpiredSessions(TestCase):
+    def test_purges_expired_sessions_in_batches(self):
+        store = SessionStore()
+        for index in range(5):
+            Session.objects.create(
+                session_key="expired{}".format(index),
+                session_data=store.encode({}),
+                expire_date=timezone.now() - datetime.timedelta(days=1),
+            )
+        Session.objects.create(
+            session_key="active",
+            session_data=store.encode({}),
+            expire_date=timezone.now() + datetime.timedelta(days=1),
+        )
+
+        call_command("purge_expired_sessions", batch_size=2, stdout=io.StringIO())
+
+        self.assertEqual(list(Session.objects.values_list("session_key", flat=True)), ["active"])
+
+
+class WYELoginThrottling(AssertMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.graph_url = "/graphql/"
+        self.user = get_user_model().objects.create_user(
+            email="romain@wye.com", pseudo="Romain", password="pass"
+        )
+
+    def login(self, password, email="romain@wye.com", **extra):
+        mutation = """
+            mutation {
+              loginUser(email: "%s", password: "%s") {
+                user {
+                  email
+                }
+              }
+            }
+        """ % (email, password)
+
+        return self.client.post(self.graph_url, {"query": mutation}, **extra)
+
+    @override_settings(LOGIN_RATE_LIMIT_PER_EMAIL=(3, 60))
+    def test_blocks_login_after_too_many_failed_attempts_on_an_email(self):
+        for _ in range(3):
+            response = self.login("wrong_password")
+            self.assertEqual(response.content, b'{"data":{"loginUser":{"user":null}}}')
+
+        response = self.login("pass")
+
+        self.assertEqual(
+            json.loads(response.content.decode())["errors"][0]["message"],
+            "Too many failed login attempts, please retry later.",
+        )
+        self.assertFalse(Session.objects.exists())
+
+    @override_settings(LOGIN_RATE_LIMIT_PER_IP=(3, 60))
+    def test_blocks_login_after_too_many_failed_attempts_from_an_ip(self):
+        for index in range(3):
+            self.login("wrong_password", email="unknown{}@wye.com".format(index))
+
+        response = self.login("pass", REMOTE_ADDR="127.0.0.2")
+        self.assertUserLoggedIn(self.user, response)
+
+        response = self.login("pass")
+        self.assertIn(b"Too many failed login attempts", response.content)
+
+    @override_settings(LOGIN_RATE_LIMIT_PER_IP=(3, 60))
+    def test_attempts_are_counted_per_forwarded_client_ip(self):
+        # The router appends the address of its client to the forged ones.
+        for index in range(3):
+            self.login(
+                "wrong_password",
+                email="unknown{}@wye.com".format(index),
+                HTTP_X_FORWARDED_FOR="10.0.0.{}, 203.0.113.1".format(index),
+            )
+
+        response = self.login("pass", HTTP_X_FORWARDED_FOR="203.0.113.2")
+        self.assertUserLoggedIn(self.user, response)
+
+        response = self.login("pass", HTTP_X_FORWARDED_FOR="10.0.0.9, 203.0.113.1")
+        self.assertIn(b"Too many failed login attempts", response.content)
+
+    @override_settings(LOGIN_RATE_LIMIT_PER_EMAIL=(3, 60))
+    def test_successful_login_resets_failed_attempts_on_an_email(self):
+        for _ in range(2):
+            self.login("wrong_password")
+        self.login("pass")
+        for _ in range(2):
+            self.login("wrong_password")
+
+        response = self.login("pass")
+
+        self.assertUserLoggedIn(self.user, response)
+
+
+class WYEPasswordHashing(AssertMixin, TestCase):
+    def setUp(self):
+        self.graph_url = "/graphql/"
+
+    def test_upgrades_password_hash_on_login(self):
+        with override_settings(PASSWORD_HASHER_ITERATIONS=1000):
+            user = get_user_model().objects.create_user(
+                email="romain@wye.com", pseudo="Romain", password="pass"
+            )
+        self.assertTrue(user.password.startswith("pbkdf2_sha256$1000$"))
+
+        mutation = """
+            mutation {
+              loginUser(email: "romain@wye.com", password: "pass") {
+                user {
+                  email
+                }
+              }
+            }
+        """
+        with override_settings(PASSWORD_HASHER_ITERATIONS=2000):
+            response = self.client.post(self.graph_url, {"query": mutation})
+
+        self.assertUserLoggedIn(user, response)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith("pbkdf2_sha256$2000$"))
+        self.assertTrue(user.check_password("pass"))
+
+    def test_benchmark_reports_logins_per_second(self):
+        stdout = io.StringIO()
+
+        with override_settings(PASSWORD_HASHER_ITERATIONS=1000):
+            call_command("benchmark_login", duration=0.1, stdout=stdout)
+
+        self.assertIn("logins/s per core", stdout.getvalue())
+
+
+class WYEUserAdmin(AssertMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.changelist_url = "/admin/account/wyeuser/"
+        self.admin = WYEUser.objects.create_superuser(
+            email="admin@wye.com", pseudo="Admin", password="pass"
+        )
+        self.user = WYEUser.objects.create_user(
+            email="romain@wye.com", pseudo="Romain", password="pass"
+        )
+        self.other_user = WYEUser.objects.create_user(
+            email="nicolas@wye.com", pseudo="Nico", password="pass"
+        )
+
+        self.client.login(email="admin@wye.com", password="pass")
+
+    def test_users_are_searched_by_email_and_pseudo_prefix(self):
+        response = self.client.get(self.changelist_url, {"q": "ROM"})
+        self.assertEqual(list(response.context["cl"].result_list), [self.user])
+
+        response = self.client.get(self.changelist_url, {"q": "nico"})
+        self.assertEqual(list(response.context["cl"].result_list), [self.other_user])
+
+        # Only prefixes are matched.
+        response = self.client.get(self.changelist_url, {"q": "wye"})
+        self.assertEqual(list(response.context["cl"].result_list), [])
+
+    def test_deactivated_users_are_logged_out(self):
+        client = self.client_class()
+        client.login(email="romain@wye.com", password="pass")
+        query = "{ whoami }"
+        response = client.get("/private_graphql/", {"query": query})
+        self.assertIn(b"romain@wye.com", response.content)
+
+        data = {
+            "action": "deactivate_users",
+            "_selected_action": [self.user.pk, self.other_user.pk],
+        }
+        response = self.client.post(self.changelist_url, data)
+        self.assertContains(response, "Deactivate the 2 selected users?")
+        self.assertEqual(WYEUser.objects.filter(is_active=True).count(), 3)
+
+        with self.settings(ADMIN_ACTION_CHUNK_SIZE=1):
+            response = self.client.post(self.changelist_url, dict(data, post="yes"))
+
+        self.assertRedirects(response, self.changelist_url, fetch_redirect_response=False)
+        self.assertEqual(
+            list(WYEUser.objects.filter(is_active=True).values_list("email", flat=True)),
+            ["admin@wye.com"],
+        )
+        response = client.get("/private_graphql/", {"query": query})
+        self.assertNotIn(b"romain@wye.com", response.content)
+
+    @override_settings(ADMIN_EXACT_COUNT_LIMIT=1000)
+    def test_estimated_counts_are_confirmed_as_such(self):
+        data = {
+            "action": "deactivate_users",
+            "_selected_action": [self.user.pk],
+            "select_across": 1,
+        }
+        with mock.patch("core.admin.estimate_count", return_value=5000):
+            response = self.client.post(self.changelist_url, data)
+
+        self.assertContains(response, "Deactivate the about 5000 selected users?")
+
+    def test_delete_selected_action_is_not_offered(self):
+        response = self.client.get(self.changelist_url)
+
+        self.assertNotContains(response, "delete_selected")
+        self.assertContains(response, "deactivate_users")
@@ -0,0 +1,217 @@
+import datetime
+import json
+from functools import partial
+
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin import helpers
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import PAGE_VAR, ChangeList
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max, Min, QuerySet
+from django.template.response import TemplateResponse
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+# Parameter of the changelist URLs listing the rows before a primary key.
+CURSOR_VAR = "before"
+
+
+def estimate_count(queryset):
+    """
+    Returns the number of rows of `queryset` estimated by PostgreSQL, or None
+    on other databases or when the table was never analyzed. Whole tables are
+    estimated from their statistics (`reltuples`, summed over the partitions of
+    partitioned tables), filtered querysets from their query plan.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return None
+    query = queryset.query
+    with connection.cursor() as cursor:
+        if not query.where and not query.distinct:
+            table = queryset.model._meta.db_table
+            cursor.execute(
+                "SELECT SUM(GREATEST(reltuples, 0)) FROM pg_class WHERE oid = to_regclass(%s) "
+                "OR oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = to_regclass(%s))",
+                [table, table],
+            )
+            estimate = cursor.fetchone()[0]
+        else:
+            sql, params = (
+                queryset.order_by().values("pk").query.get_compiler(queryset.db).as_sql()
+            )
+            cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            estimate = plan[0]["Plan"]["Plan Rows"]
+    return int(estimate) if estimate else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator of big tables: querysets estimated to have more than
+    ADMIN_EXACT_COUNT_LIMIT rows are not counted, see `estimate_count()`.
+    """
+
+    estimated = False
+
+    @cached_property
+    def count(self):
+        estimate = None
+        if isinstance(self.object_list, QuerySet):
+            estimate = estimate_count(self.object_list)
+        if estimate is None or estimate < settings.ADMIN_EXACT_COUNT_LIMIT:
+            return super().count
+        self.estimated = True
+        return estimate
+
+
+def to_local_date(value):
+    if isinstance(value, datetime.datetime):
+        if timezone.is_aware(value):
+            value = timezone.localtime(value)
+        return value.date()
+    return value
+
+
+def list_dates(queryset, field_name, kind, order="ASC", bounds=None):
+    """
+    Replaces `queryset.dates()` in the date hierarchy of changelists: every year
+    or month between the first and last dates is listed, from the index of the
+    field, instead of those of the rows which are all read. Days of a month are
+    listed as usual. `bounds` keeps the first and last dates between calls.
+    """
+    if kind not in ("year", "month"):
+        return QuerySet.dates(queryset, field_name, kind, order)
+    if bounds is None:
+        bounds = {}
+    if not bounds:
+        bounds.update(queryset.aggregate(first=Min(field_name), last=Max(field_name)))
+    if bounds["first"] is None:
+        return []
+    first, last = to_local_date(bounds["first"]), to_local_date(bounds["last"])
+    if kind == "year":
+        months = range(first.year * 12, last.year * 12 + 1, 12)
+    else:
+        months = range(first.year * 12 + first.month - 1, last.year * 12 + last.month)
+    dates = [datetime.date(month // 12, month % 12 + 1, 1) for month in months]
+    return dates if order == "ASC" else dates[::-1]
+
+
+class BigTableChangeList(ChangeList):
+    """
+    Changelist of big tables. Listed newest first, rows after the first pages
+    are reached with a cursor, the primary key of the last row of the previous
+    page, instead of an offset which reads every row before the page.
+    """
+
+    cursor = None
+    next_page_url = None
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if self.is_keyset_ordered(queryset) and CURSOR_VAR in self.params:
+            try:
+                self.cursor = self.model._meta.pk.to_python(self.params[CURSOR_VAR])
+            except ValidationError as e:
+                raise IncorrectLookupParameters(e) from e
+        if self.date_hierarchy:
+            queryset.dates = partial(list_dates, queryset, bounds={})
+        return queryset
+
+    def is_keyset_ordered(self, queryset):
+        # The ordering of the admin is repeated by the changelist.
+        ordering = set(queryset.query.order_by)
+        return bool(ordering) and ordering <= {"-pk", "-" + self.model._meta.pk.attname}
+
+    def get_results(self, request):
+        super().get_results(request)
+        if not self.is_keyset_ordered(self.queryset) or self.show_all:
+            return
+        # Only the listed rows start at the cursor: counts, the date hierarchy and
+        # actions on every row span all the pages.
+        if self.cursor is not None:
+            self.result_list = self.queryset.filter(pk__lt=self.cursor)[: self.list_per_page]
+        if len(self.result_list) == self.list_per_page:
+            self.next_page_url = self.get_query_string(
+                {CURSOR_VAR: self.result_list[len(self.result_list) - 1].pk}, [PAGE_VAR]
+            )
+
+    @property
+    def first_page_url(self):
+        return self.get_query_string(remove=[CURSOR_VAR, PAGE_VAR])
+
+
+class BigTableAdmin(admin.ModelAdmin):
+    """
+    Admin of tables too big to count or to load at once: counts are estimated,
+    rows are listed newest first with cursors, and bulk actions change rows by
+    chunks of ADMIN_ACTION_CHUNK_SIZE. The `delete_selected` action, which loads
+    every selected object, is replaced by actions of each admin.
+    """
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    ordering = ("-pk",)
+    change_list_template = "admin/big_table_change_list.html"
+
+    def get_changelist(self, request, **kwargs):
+        return BigTableChangeList
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        actions.pop("delete_selected", None)
+        return actions
+
+    def confirm_action(self, request, queryset, action, title, question):
+        """
+        Returns the page asking to confirm `action` on the selected rows, or None
+        once it is confirmed. Only the number of rows is shown, formatted in
+        `question` as `{count}`.
+        """
+        if request.POST.get("post") == "yes":
+            return None
+        paginator = self.get_paginator(request, queryset, 1)
+        # Counting sets `estimated`.
+        count = paginator.count
+        if paginator.estimated:
+            count = "about {}".format(count)
+        context = dict(
+            self.admin_site.each_context(request),
+            title=title,
+            question=question.format(count=count),
+            opts=self.model._meta,
+            action=action,
+            action_checkbox_name=helpers.ACTION_CHECKBOX_NAME,
+            selected=request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+            select_across=request.POST.get("select_across", "0"),
+            media=self.media,
+        )
+        request.current_app = self.admin_site.name
+        return TemplateResponse(request, "admin/chunked_action_confirmation.html", context)
+
+
+def iterate_in_chunks(queryset, chunk_size=None):
+    """
+    Yields the primary keys of `queryset` by lists of `chunk_size`, in order,
+    walking the primary key index instead of loading them all at once.
+    """
+    chunk_size = chunk_size or settings.ADMIN_ACTION_CHUNK_SIZE
+    pks = queryset.order_by("pk").values_list("pk", flat=True)
+    last_pk = None
+    while True:
+        chunk = pks if last_pk is None else pks.filter(pk__gt=last_pk)
+        chunk = list(chunk[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        last_pk = chunk[-1]
@@ -0,0 +1,20 @@
+"""
+ASGI config for wye_server_django project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Requires ``channels``.
+
+For more information on this file, see
+https://channels.readthedocs.io/en/2.x/deploying.html
+"""
+
+import os
+
+import django
+from channels.routing import get_default_application
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "wye_server_django.core.settings")
+
+django.setup()
+
+application = get_default_application()
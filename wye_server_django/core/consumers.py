@@ -0,0 +1,168 @@
+import asyncio
+
+from django.conf import settings
+
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from graphql.error import format_error
+from graphql.execution import ExecutionResult
+from promise import Promise
+
+from core.gql_schema import document_backend, private_schema
+from core.subscriptions import SubscriptionContext
+
+GRAPHQL_WS_PROTOCOL = "graphql-ws"
+
+
+class Subscription(object):
+    def __init__(self, context, observable):
+        self.context = context
+        self.results = []
+        self.disposable = observable.subscribe(self.results.append)
+
+    def push(self, group, payload):
+        """
+        Runs the subscription for an event and returns its results.
+        """
+        self.context.reset()
+        self.context.stream(group).on_next(payload)
+        results, self.results = self.results, []
+        for result in results:
+            # Fields loaded in batches are still pending.
+            if result.data:
+                result.data = {
+                    key: value.get() if isinstance(value, Promise) else value
+                    for key, value in result.data.items()
+                }
+        return results
+
+
+class GraphQLWSConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Serves GraphQL subscriptions over WebSockets, following the graphql-ws
+    protocol of Apollo's subscriptions-transport-ws.
+
+    Subscription resolvers return `info.context.stream(group)`, the observable
+    of the events published to `group` with `core.subscriptions.publish()`. Each event runs the
+    selection set of the subscription and is sent to the client.
+
+    Idle connections cost no thread, events are executed in the database thread
+    pool. A client that does not read its messages fills the channel layer
+    capacity of its connection, further events are then dropped for it.
+    """
+
+    schema = private_schema
+
+    async def connect(self):
+        self.subscriptions = {}
+        self.groups = {}
+        self.keepalive = None
+        if not self.scope["user"].is_authenticated:
+            await self.close()
+            return
+        await self.accept(GRAPHQL_WS_PROTOCOL)
+
+    async def disconnect(self, code):
+        if self.keepalive is not None:
+            self.keepalive.cancel()
+        for operation_id in list(self.subscriptions):
+            await self.stop(operation_id)
+
+    async def receive_json(self, message):
+        message_type = message.get("type")
+        operation_id = message.get("id")
+
+        if message_type == "connection_init":
+            await self.send_json({"type": "connection_ack"})
+            if settings.GRAPHQL_WS_KEEPALIVE_INTERVAL and self.keepalive is None:
+                await self.send_json({"type": "ka"})
+                self.keepalive = asyncio.ensure_future(self.send_keepalives())
+        elif message_type == "start":
+            await self.start(operation_id, message.get("payload") or {})
+        elif message_type == "stop":
+            await self.stop(operation_id)
+            await self.send_json({"type": "complete", "id": operation_id})
+        elif message_type == "connection_terminate":
+            await self.close()
+        else:
+            await self.send_error(operation_id, "Unknown message type.")
+
+    async def send_keepalives(self):
+        while True:
+            await asyncio.sleep(settings.GRAPHQL_WS_KEEPALIVE_INTERVAL)
+            await self.send_json({"type": "ka"})
+
+    async def start(self, operation_id, payload):
+        if operation_id in self.subscriptions:
+            await self.stop(operation_id)
+        if len(self.subscriptions) >= settings.GRAPHQL_WS_MAX_SUBSCRIPTIONS:
+            await self.send_error(operation_id, "Too many subscriptions on this connection.")
+            return
+
+        subscription, result = await database_sync_to_async(self.subscribe)(payload)
+        if subscription is None:
+            await self.send_error(operation_id, str(result.errors[0]))
+            return
+
+        self.subscriptions[operation_id] = subscription
+        for group in subscription.context.streams:
+            self.groups.setdefault(group, set()).add(operation_id)
+            if len(self.groups[group]) == 1:
+                await self.channel_layer.group_add(group, self.channel_name)
+
+    def subscribe(self, payload):
+        context = SubscriptionContext(self.scope["user"])
+        try:
+            document = document_backend.document_from_string(self.schema, payload.get("query"))
+        except Exception as e:
+            return None, ExecutionResult(errors=[e], invalid=True)
+        if document.get_operation_type(payload.get("operationName")) != "subscription":
+            return None, ExecutionResult(
+                errors=[Exception("Only subscriptions are served over WebSockets.")]
+            )
+
+        result = document.execute(
+            context_value=context,
+            variable_values=payload.get("variables"),
+            operation_name=payload.get("operationName"),
+            allow_subscriptions=True,
+        )
+        if isinstance(result, ExecutionResult):
+            return None, result
+        return Subscription(context, result), None
+
+    async def stop(self, operation_id):
+        subscription = self.subscriptions.pop(operation_id, None)
+        if subscription is None:
+            return
+        subscription.disposable.dispose()
+        for group in subscription.context.streams:
+            operation_ids = self.groups.get(group, set())
+            operation_ids.discard(operation_id)
+            if not operation_ids:
+                self.groups.pop(group, None)
+                await self.channel_layer.group_discard(group, self.channel_name)
+
+    async def graphql_event(self, message):
+        group = message["group"]
+        for operation_id in list(self.groups.get(group, ())):
+            subscription = self.subscriptions.get(operation_id)
+            if subscription is None:
+                # Stopped while a previous subscription was running.
+                continue
+            results = await database_sync_to_async(subscription.push)(group, message["payload"])
+            for result in results:
+                await self.send_json(
+                    {"type": "data", "id": operation_id, "payload": self.format_result(result)}
+                )
+
+    async def send_error(self, operation_id, message):
+        await self.send_json({"type": "error", "id": operation_id, "payload": {"message": message}})
+
+    @staticmethod
+    def format_result(result):
+        payload = {}
+        if result.errors:
+            payload["errors"] = [format_error(error) for error in result.errors]
+        payload["data"] = result.data
+        return payload
@@ -0,0 +1,257 @@
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from graphql import GraphQLError
+from graphql.execution.utils import get_operation_root_type
+from graphql.language import ast
+from graphql.type import GraphQLInt, GraphQLList, GraphQLNonNull, is_leaf_type
+from graphql.type.definition import get_named_type
+from graphql.utils.get_operation_ast import get_operation_ast
+from graphql.utils.value_from_ast import value_from_ast
+
+from account.ratelimit import get_client_ip
+
+PAGINATION_ARGUMENTS = ("first", "last")
+
+
+def is_list_type(type_):
+    if isinstance(type_, GraphQLNonNull):
+        type_ = type_.of_type
+    return isinstance(type_, GraphQLList)
+
+
+def get_fields(selection_set, fragments):
+    """
+    Yields the fields of `selection_set`, including those of its fragments.
+    """
+    for selection in selection_set.selections:
+        if isinstance(selection, ast.Field):
+            yield selection
+        else:
+            if isinstance(selection, ast.FragmentSpread):
+                selection = fragments[selection.name.value]
+            for field in get_fields(selection.selection_set, fragments):
+                yield field
+
+
+class QueryCostAnalyzer(object):
+    """
+    Bounds the work a GraphQL document can require before it runs.
+
+    Depth and aliases are checked along with the other validation rules. The cost
+    depends on the variables, it is computed for each request: a field costs its
+    own cost (from `field_costs`, keyed by "Type.field", 1 for objects and 0 for
+    scalars by default) plus the cost of its selection set, multiplied by the
+    number of items it can return. That is its `first` or `last` argument for a
+    paginated field, and GRAPHQL_COST_LIST_SIZE for other lists. Introspection
+    fields are free.
+    """
+
+    def __init__(self, field_costs=None):
+        self.field_costs = field_costs or {}
+
+    def validate(self, schema, document_ast):
+        fragments = self.get_fragments(document_ast)
+        operations = [
+            definition
+            for definition in document_ast.definitions
+            if isinstance(definition, ast.OperationDefinition)
+        ]
+        errors = []
+
+        aliases = sum(
+            self.count_aliases(operation.selection_set, fragments) for operation in operations
+        )
+        if aliases > settings.GRAPHQL_MAX_ALIASES:
+            errors.append(
+                GraphQLError(
+                    "Document has {} aliases, the maximum is {}.".format(
+                        aliases, settings.GRAPHQL_MAX_ALIASES
+                    )
+                )
+            )
+
+        for operation in operations:
+            depth = self.get_depth(operation.selection_set, fragments)
+            if depth > settings.GRAPHQL_MAX_DEPTH:
+                errors.append(
+                    GraphQLError(
+                        "Operation has a depth of {}, the maximum is {}.".format(
+                            depth, settings.GRAPHQL_MAX_DEPTH
+                        ),
+                        [operation],
+                    )
+                )
+        return errors
+
+    @staticmethod
+    def get_fragments(document_ast):
+        return {
+            definition.name.value: definition
+            for definition in document_ast.definitions
+            if isinstance(definition, ast.FragmentDefinition)
+        }
+
+    def count_aliases(self, selection_set, fragments):
+        return sum(
+            (field.alias is not None)
+            + (self.count_aliases(field.selection_set, fragments) if field.selection_set else 0)
+            for field in get_fields(selection_set, fragments)
+        )
+
+    def get_depth(self, selection_set, fragments):
+        depths = [
+            1 + (self.get_depth(field.selection_set, fragments) if field.selection_set else 0)
+            for field in get_fields(selection_set, fragments)
+            if not field.name.value.startswith("__")
+        ]
+        return max(depths, default=0)
+
+    def get_cost(self, schema, document_ast, operation_name=None, variables=None):
+        operation = get_operation_ast(document_ast, operation_name)
+        if operation is None:
+            return 0
+
+        values = {
+            definition.variable.name.value: value_from_ast(definition.default_value, GraphQLInt)
+            for definition in operation.variable_definitions or []
+            if definition.default_value is not None
+        }
+        values.update(variables or {})
+
+        return self.get_selection_set_cost(
+            schema,
+            get_operation_root_type(schema, operation),
+            operation.selection_set,
+            self.get_fragments(document_ast),
+            values,
+        )
+
+    def get_selection_set_cost(
+        self, schema, parent_type, selection_set, fragments, variables, paginated=False
+    ):
+        cost = 0
+        for selection in selection_set.selections:
+            if isinstance(selection, ast.Field):
+                cost += self.get_field_cost(
+                    schema, parent_type, selection, fragments, variables, paginated
+                )
+                continue
+
+            if isinstance(selection, ast.FragmentSpread):
+                selection = fragments[selection.name.value]
+            type_ = parent_type
+            if selection.type_condition is not None:
+                type_ = schema.get_type(selection.type_condition.name.value)
+            cost += self.get_selection_set_cost(
+                schema, type_, selection.selection_set, fragments, variables, paginated
+            )
+        return cost
+
+    def get_field_cost(self, schema, parent_type, field_ast, fragments, variables, paginated):
+        name = field_ast.name.value
+        if name.startswith("__"):
+            return 0
+
+        field = parent_type.fields[name]
+        field_type = get_named_type(field.type)
+        cost = self.field_costs.get(
+            "{}.{}".format(parent_type.name, name), 0 if is_leaf_type(field_type) else 1
+        )
+
+        size = self.get_page_size(field, field_ast, variables)
+        if size is None:
+            # The lists of a page, e.g. connection edges, are already bounded by its size.
+            size = settings.GRAPHQL_COST_LIST_SIZE if is_list_type(field.type) and not paginated else 1
+
+        if field_ast.selection_set:
+            cost += self.get_selection_set_cost(
+                schema,
+                field_type,
+                field_ast.selection_set,
+                fragments,
+                variables,
+                paginated=any(argument in field.args for argument in PAGINATION_ARGUMENTS),
+            )
+        return size * cost
+
+    @staticmethod
+    def get_page_size(field, field_ast, variables):
+        if not any(argument in field.args for argument in PAGINATION_ARGUMENTS):
+            return None
+
+        sizes = [
+            value_from_ast(argument.value, GraphQLInt, variables)
+            for argument in field_ast.arguments
+            if argument.name.value in PAGINATION_ARGUMENTS
+        ]
+        sizes = [size for size in sizes if isinstance(size, int)]
+        size = max(sizes) if sizes else settings.GRAPHQL_PAGE_SIZE
+        return max(0, min(size, settings.GRAPHQL_MAX_PAGE_SIZE))
+
+    def check(self, schema, document_ast, request, operation_name=None, variables=None):
+        """
+        Returns the cost of the operation run by `request`, as reported to the client,
+        and the error to reject it with, if any.
+        """
+        cost = self.get_cost(schema, document_ast, operation_name, variables)
+        report = {"requestedQueryCost": cost, "maximumAvailable": settings.GRAPHQL_MAX_COST}
+
+        if cost > settings.GRAPHQL_MAX_COST:
+            return report, GraphQLError(
+                "Query cost is {}, the maximum is {}.".format(cost, settings.GRAPHQL_MAX_COST)
+            )
+
+        budget = CostBudget.for_request(request)
+        allowed, remaining = budget.consume(cost)
+        report["throttleStatus"] = {
+            "currentlyAvailable": int(remaining),
+            "maximumAvailable": budget.capacity,
+            "restoreRate": budget.rate,
+        }
+        if not allowed:
+            return report, GraphQLError("Query cost budget exhausted, please retry later.")
+        return report, None
+
+
+class CostBudget(object):
+    """
+    Token bucket of cost units per client, refilled continuously.
+
+    Buckets live in the `GRAPHQL_COST_BUDGET_CACHE` cache. Reading and updating a
+    bucket is not atomic: concurrent requests of a client may spend slightly more
+    than its budget, which is acceptable for throttling.
+    """
+
+    def __init__(self, identifier, capacity, rate):
+        self.key = "graphql_cost:" + identifier
+        self.capacity = capacity
+        self.rate = rate
+
+    @classmethod
+    def for_request(cls, request):
+        user = getattr(request, "user", None)
+        if user is not None and user.is_authenticated:
+            identifier = "user:{}".format(user.pk)
+        else:
+            identifier = "ip:" + get_client_ip(request)
+        return cls(identifier, *settings.GRAPHQL_COST_BUDGET)
+
+    @property
+    def cache(self):
+        return caches[settings.GRAPHQL_COST_BUDGET_CACHE]
+
+    def consume(self, amount):
+        now = time.time()
+        tokens, updated_at = self.cache.get(self.key, (self.capacity, now))
+        tokens = min(self.capacity, tokens + (now - updated_at) * self.rate)
+        if amount > tokens:
+            return False, tokens
+
+        tokens -= amount
+        # A bucket left alone for this long is full again, it can be dropped.
+        self.cache.set(self.key, (tokens, now), math.ceil(self.capacity / self.rate))
+        return True, tokens
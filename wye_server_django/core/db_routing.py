@@ -0,0 +1,140 @@
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_state = threading.local()
+
+# Sessions and the table of a DatabaseCache (rate limits, query cost budgets) are
+# written by most requests, and read back at once: they stay on the primary, and
+# their writes do not keep clients reading from it.
+PRIMARY_APP_LABELS = {"sessions", "django_cache"}
+
+
+def get_read_database():
+    return getattr(_state, "read_database", None)
+
+
+@contextmanager
+def read_from(alias):
+    """
+    Sends the reads of the current thread to the database `alias`, or to the
+    primary when it is None.
+    """
+    previous = get_read_database()
+    _state.read_database = alias
+    try:
+        yield
+    finally:
+        _state.read_database = previous
+
+
+def get_replica():
+    """
+    Returns the replica the reads of a query may be sent to, None when there is
+    none or when the client recently wrote to the primary.
+    """
+    if not settings.DATABASE_REPLICAS or getattr(_state, "pinned", False):
+        return None
+    _state.used_replica = True
+    return random.choice(settings.DATABASE_REPLICAS)
+
+
+def used_replica():
+    """
+    Returns whether reads of the current request may have been sent to a
+    replica, and may not see the latest writes.
+    """
+    return getattr(_state, "used_replica", False)
+
+
+class ReplicaRouter(object):
+    """
+    Reads from the database set by `read_from()`, i.e. a replica during the
+    execution of GraphQL queries, and from the primary otherwise. Writes always
+    go to the primary, and are noted so that the client keeps reading from it
+    for a while, see `DatabaseRoutingMiddleware`; sessions and the cache table
+    always use the primary, see `PRIMARY_APP_LABELS`.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in PRIMARY_APP_LABELS:
+            return None
+        return get_read_database()
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label not in PRIMARY_APP_LABELS:
+            _state.wrote = True
+        # Instances read from a replica would be saved back to it otherwise.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+def check_connections():
+    """
+    Closes the persistent connections which cannot be used anymore, e.g. after
+    a failover or an idle timeout of the server, so that a new one is opened
+    instead of failing the request. Each connection is checked at most every
+    DATABASE_HEALTH_CHECK_INTERVAL seconds, a check costs a round trip.
+    """
+    checked_at = getattr(_state, "checked_at", None)
+    if checked_at is None:
+        checked_at = _state.checked_at = {}
+    now = time.monotonic()
+    for connection in connections.all():
+        if connection.connection is None:
+            continue
+        last_check = checked_at.get(connection.alias)
+        if last_check is not None and now - last_check < settings.DATABASE_HEALTH_CHECK_INTERVAL:
+            continue
+        checked_at[connection.alias] = now
+        if not connection.is_usable():
+            connection.close()
+
+
+class DatabaseRoutingMiddleware(object):
+    """
+    Keeps the clients which wrote to the primary reading from it for
+    DATABASE_REPLICA_STICKINESS seconds, so that they read their own writes
+    while replicas catch up. The deadline is kept in a cookie.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if settings.DATABASE_HEALTH_CHECKS:
+            check_connections()
+
+        try:
+            pinned_until = float(request.COOKIES.get(settings.DATABASE_REPLICA_COOKIE_NAME, 0))
+        except ValueError:
+            pinned_until = 0
+        _state.pinned = pinned_until > time.time()
+        _state.wrote = _state.used_replica = False
+        try:
+            response = self.get_response(request)
+        finally:
+            wrote = _state.wrote
+            _state.pinned = _state.wrote = _state.used_replica = False
+
+        if wrote and settings.DATABASE_REPLICAS:
+            response.set_cookie(
+                settings.DATABASE_REPLICA_COOKIE_NAME,
+                str(time.time() + settings.DATABASE_REPLICA_STICKINESS),
+                max_age=settings.DATABASE_REPLICA_STICKINESS,
+                domain=settings.SESSION_COOKIE_DOMAIN,
+                secure=settings.SESSION_COOKIE_SECURE,
+                httponly=True,
+                samesite=settings.SESSION_COOKIE_SAMESITE,
+            )
+        return response
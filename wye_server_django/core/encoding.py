@@ -0,0 +1,116 @@
+import json
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.text import compress_string
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Quality 11, the default, is meant for static files: it is too slow for responses.
+BROTLI_QUALITY = 5
+
+
+def dumps_json(data, pretty=False):
+    if pretty:
+        return json.dumps(data, sort_keys=True, indent=2, separators=(",", ": "))
+    return json.dumps(data, separators=(",", ":"))
+
+
+def dumps_orjson(data, pretty=False):
+    option = orjson.OPT_SORT_KEYS | orjson.OPT_INDENT_2 if pretty else 0
+    # Responses of batches are joined as strings.
+    return orjson.dumps(data, option=option).decode()
+
+
+ENCODERS = {"json": dumps_json, "orjson": dumps_orjson}
+
+
+def get_encoder(name=None):
+    """
+    Returns the function encoding data to a JSON string set by
+    GRAPHQL_JSON_ENCODER, or by `name`. "auto" picks orjson when installed.
+    """
+    name = name or settings.GRAPHQL_JSON_ENCODER
+    if name == "auto":
+        name = "json" if orjson is None else "orjson"
+    if name not in ENCODERS:
+        raise ImproperlyConfigured(
+            "Unknown JSON encoder {}, use one of: auto, {}.".format(name, ", ".join(ENCODERS))
+        )
+    if name == "orjson" and orjson is None:
+        raise ImproperlyConfigured("The orjson JSON encoder requires the orjson package.")
+    return ENCODERS[name]
+
+
+def encode_columns(value):
+    """
+    Returns `value` with its lists of objects having the same fields encoded as
+    `{"columns": [field, ...], "rows": [[value, ...], ...]}`: the name of each
+    field is sent once instead of once per object. Lists of other values are
+    kept, clients know which fields are lists from their document.
+    """
+    if isinstance(value, dict):
+        for item in value.values():
+            if isinstance(item, (dict, list)):
+                return {key: encode_columns(item) for key, item in value.items()}
+        # Objects of scalars, e.g. the items of most lists, are kept as they are.
+        return value
+    if not isinstance(value, list):
+        return value
+    items = [encode_columns(item) for item in value]
+    if not items or not all(isinstance(item, dict) for item in items):
+        return items
+    columns = tuple(items[0])
+    if not all(tuple(item) == columns for item in items):
+        # E.g. objects of different types of a union.
+        return items
+    return {"columns": list(columns), "rows": [list(item.values()) for item in items]}
+
+
+def get_content_encodings():
+    """
+    Returns the content encodings responses can be compressed with, preferred first.
+    """
+    return ["gzip"] if brotli is None else ["br", "gzip"]
+
+
+def negotiate_content_encoding(accept_encoding):
+    """
+    Returns the content encoding to compress a response with, from the value of
+    the Accept-Encoding header of the request, or None to send it as is.
+    """
+    qualities = {}
+    for coding in accept_encoding.split(","):
+        coding, _, parameters = coding.partition(";")
+        quality = 1.0
+        for parameter in parameters.split(";"):
+            name, _, value = parameter.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.strip().lower()] = quality
+
+    best, best_quality = None, 0.0
+    for coding in get_content_encodings():
+        quality = qualities.get(coding, qualities.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def compress(content, content_encoding):
+    if content_encoding == "br":
+        return brotli.compress(content, quality=BROTLI_QUALITY)
+    if content_encoding == "gzip":
+        return compress_string(content)
+    raise ValueError("Unsupported content encoding {}.".format(content_encoding))
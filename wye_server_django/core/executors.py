@@ -0,0 +1,77 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from functools import partial
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models.query import QuerySet
+
+from graphql.execution.executors.asyncio import AsyncioExecutor
+
+from core import db_routing
+
+_resolver_pool = None
+_resolver_pool_lock = threading.Lock()
+
+
+def get_resolver_pool():
+    # Created on first use, so that preforked workers do not share its threads.
+    global _resolver_pool
+    with _resolver_pool_lock:
+        if _resolver_pool is None:
+            _resolver_pool = ThreadPoolExecutor(
+                max_workers=settings.GRAPHQL_RESOLVER_THREADS, thread_name_prefix="resolver"
+            )
+    return _resolver_pool
+
+
+def _resolve_in_thread(next, root, info, args, read_database):
+    trace = getattr(info.context, "graphql_trace", None)
+    try:
+        with db_routing.read_from(read_database), (
+            trace.capture_sql() if trace is not None else ExitStack()
+        ):
+            result = next(root, info, **args)
+            if isinstance(result, QuerySet):
+                # Querysets are lazy, they must be evaluated on the thread owning
+                # the database connection.
+                result = list(result)
+        return result
+    finally:
+        close_old_connections()
+
+
+class ThreadedRootResolverMiddleware(object):
+    """
+    Runs the root fields of query operations in the resolver thread pool, each
+    with its own database connection, so that they resolve concurrently.
+
+    Nested fields are resolved on the request thread from the objects loaded by
+    their root field. Mutations are left untouched, as their root fields must
+    run one after the other.
+    """
+
+    def resolve(self, next, root, info, **args):
+        if len(info.path) > 1 or info.operation.operation != "query":
+            return next(root, info, **args)
+
+        loop = info.context.graphql_event_loop
+        return loop.run_in_executor(
+            get_resolver_pool(),
+            partial(_resolve_in_thread, next, root, info, args, db_routing.get_read_database()),
+        )
+
+
+class RequestAsyncioExecutor(AsyncioExecutor):
+    """
+    Asyncio executor running on an event loop of its own, so that it can be used
+    from any thread serving a request, under WSGI as under ASGI.
+    """
+
+    def __init__(self):
+        super(RequestAsyncioExecutor, self).__init__(loop=asyncio.new_event_loop())
+
+    def close(self):
+        self.loop.close()
@@ -0,0 +1,236 @@
+from graphene.types.resolver import attr_resolver, dict_or_attr_resolver
+from graphene.utils.str_converters import to_snake_case
+from graphene_django import DjangoObjectType
+from graphql.execution import ExecutionResult
+from graphql.language import ast
+from graphql.type import GraphQLList, GraphQLNonNull, is_leaf_type
+from graphql.utils.get_operation_ast import get_operation_ast
+
+from core.optimizer import get_model_fields
+
+DEFAULT_RESOLVERS = (attr_resolver, dict_or_attr_resolver)
+
+
+class NotFlat(Exception):
+    pass
+
+
+def get_flat_lists(selection_set):
+    """
+    Yields the root fields of `selection_set`, as long as none of them can be
+    skipped or has arguments.
+    """
+    for selection in selection_set.selections:
+        if selection.directives or not isinstance(selection, ast.Field):
+            raise NotFlat()
+        if selection.arguments or selection.selection_set is None:
+            raise NotFlat()
+        yield selection
+
+
+def get_flat_fields(selection_set, fragments, type_name):
+    """
+    Yields the fields of `selection_set`, including those of its fragments, as
+    long as none of them can be skipped or has arguments or a selection set.
+    """
+    for selection in selection_set.selections:
+        if selection.directives:
+            raise NotFlat()
+        if isinstance(selection, ast.Field):
+            if selection.arguments or selection.selection_set:
+                raise NotFlat()
+            yield selection
+            continue
+        if isinstance(selection, ast.FragmentSpread):
+            selection = fragments[selection.name.value]
+            if selection.directives:
+                raise NotFlat()
+        if selection.type_condition and selection.type_condition.name.value != type_name:
+            raise NotFlat()
+        for field in get_flat_fields(selection.selection_set, fragments, type_name):
+            yield field
+
+
+def unwrap_non_null(type_):
+    if isinstance(type_, GraphQLNonNull):
+        return type_.of_type, True
+    return type_, False
+
+
+def make_getter(index, serialize, convert=None):
+    if convert is None:
+        return lambda row: serialize(row[index])
+    return lambda row: serialize(convert(row[index]))
+
+
+class FlatList(object):
+    """
+    A root field returning a list of model instances, whose selected fields
+    are all read from columns of their rows.
+    """
+
+    def __init__(self, key, get_queryset, columns, keys, getters, required):
+        self.key = key
+        self.get_queryset = get_queryset
+        self.columns = columns
+        self.keys = keys
+        self.getters = getters
+        self.required = required
+
+    def resolve(self, context):
+        keys, getters, required = self.keys, self.getters, self.required
+        items = []
+        for row in self.get_queryset(context).values_list(*self.columns):
+            values = [getter(row) for getter in getters]
+            if None in values and any(
+                value is None and is_required for value, is_required in zip(values, required)
+            ):
+                # The generic execution reports the error.
+                raise NotFlat()
+            items.append(dict(zip(keys, values)))
+        return items
+
+
+class FlatListPlan(object):
+    def __init__(self, lists):
+        self.lists = lists
+
+    def execute(self, context):
+        """
+        Returns the result of the operation, or None when the generic execution
+        must run instead.
+        """
+        try:
+            return ExecutionResult(
+                data={flat_list.key: flat_list.resolve(context) for flat_list in self.lists}
+            )
+        except NotFlat:
+            return None
+
+
+class FlatListCompiler(object):
+    """
+    Compiles the query operations which only select columns of the items of
+    lists, so that they are executed from rows instead of model instances.
+
+    `querysets` maps root fields, keyed by "Type.field", to a function returning
+    their queryset from the context; the resolver of those fields must return
+    the same queryset. The field types of the items must be `DjangoObjectType`s.
+    Their fields are read from the column of their model field, or the `id`
+    from the primary key. Fields with another resolver are read from the
+    columns listed in the `row_columns` attribute of their type, mapping the
+    name of the field to its column and a function converting the column value
+    the way the resolver does.
+
+    Each plan is compiled once per document: its rows are converted with the
+    `serialize` function of each field type, no resolver nor middleware runs.
+    """
+
+    def __init__(self, querysets):
+        self.querysets = querysets
+
+    def compile(self, schema, document_ast):
+        """
+        Returns the plans of the operations of `document_ast` which can be
+        executed from rows, keyed by operation name.
+        """
+        fragments = {
+            definition.name.value: definition
+            for definition in document_ast.definitions
+            if isinstance(definition, ast.FragmentDefinition)
+        }
+        plans = {}
+        for definition in document_ast.definitions:
+            if not isinstance(definition, ast.OperationDefinition):
+                continue
+            if definition.operation != "query" or definition.directives:
+                continue
+            try:
+                plan = self.compile_operation(schema, definition, fragments)
+            except NotFlat:
+                continue
+            plans[definition.name.value if definition.name else None] = plan
+        return plans
+
+    def compile_operation(self, schema, operation, fragments):
+        root_type = schema.get_query_type()
+        lists = []
+        keys = set()
+        for field in get_flat_lists(operation.selection_set):
+            key = field.alias.value if field.alias else field.name.value
+            if key in keys:
+                raise NotFlat()
+            keys.add(key)
+
+            get_queryset = self.querysets.get("{}.{}".format(root_type.name, field.name.value))
+            if get_queryset is None:
+                raise NotFlat()
+            list_type, _ = unwrap_non_null(root_type.fields[field.name.value].type)
+            if not isinstance(list_type, GraphQLList):
+                raise NotFlat()
+            item_type, _ = unwrap_non_null(list_type.of_type)
+            lists.append(self.compile_list(key, get_queryset, item_type, field, fragments))
+        if not lists:
+            raise NotFlat()
+        return FlatListPlan(lists)
+
+    def compile_list(self, key, get_queryset, item_type, list_field, fragments):
+        graphene_type = getattr(item_type, "graphene_type", None)
+        if graphene_type is None or not issubclass(graphene_type, DjangoObjectType):
+            raise NotFlat()
+        model_fields = get_model_fields(graphene_type._meta.model)
+        row_columns = getattr(graphene_type, "row_columns", {})
+
+        columns, keys, getters, required = [], [], [], []
+        for field in get_flat_fields(list_field.selection_set, fragments, item_type.name):
+            field_key = field.alias.value if field.alias else field.name.value
+            if field_key in keys:
+                # Fields sharing a response key are merged by validation.
+                continue
+
+            if field.name.value == "__typename":
+                getters.append(lambda row, type_name=item_type.name: type_name)
+                keys.append(field_key)
+                required.append(True)
+                continue
+
+            field_type, is_required = unwrap_non_null(item_type.fields[field.name.value].type)
+            if not is_leaf_type(field_type):
+                raise NotFlat()
+            column, convert = self.get_column(
+                item_type.fields[field.name.value].resolver,
+                to_snake_case(field.name.value),
+                model_fields,
+                row_columns,
+            )
+            if column not in columns:
+                columns.append(column)
+            getters.append(make_getter(columns.index(column), field_type.serialize, convert))
+            keys.append(field_key)
+            required.append(is_required)
+
+        if not columns:
+            # Rows without any column cannot be fetched.
+            raise NotFlat()
+        return FlatList(key, get_queryset, columns, keys, getters, required)
+
+    @staticmethod
+    def get_column(resolver, name, model_fields, row_columns):
+        if name in row_columns:
+            return row_columns[name]
+        if resolver is DjangoObjectType.resolve_id:
+            return "pk", None
+        if getattr(resolver, "func", None) in DEFAULT_RESOLVERS:
+            model_field = model_fields.get(resolver.args[0])
+            if model_field is not None and model_field.concrete and not model_field.is_relation:
+                return model_field.attname, None
+        raise NotFlat()
+
+
+def get_plan(plans, document_ast, operation_name):
+    if not plans:
+        return None
+    operation = get_operation_ast(document_ast, operation_name)
+    if operation is None:
+        return None
+    return plans.get(operation.name.value if operation.name else None)
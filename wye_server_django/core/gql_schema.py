@@ -1,7 +1,48 @@
 from graphene_django import DjangoObjectType
 import graphene
 
-from account.gql_schema import Query, Mutation, PrivateMutation
+from account.gql_schema import (
+    Query,
+    Mutation,
+    PrivateMutation,
+    Subscription,
+    get_room_sessions,
+)
+from core.cost import QueryCostAnalyzer
+from core.flat_lists import FlatListCompiler
+from core.incremental import directives
+from core.persisted_queries import CachedDocumentBackend
+from core.tracing import TracingMiddleware
 
-schema = graphene.Schema(mutation=Mutation)
-private_schema = graphene.Schema(query=Query, mutation=PrivateMutation)
+# Both schemas accept @defer and @stream, see `core.incremental`.
+schema = graphene.Schema(mutation=Mutation, directives=directives)
+private_schema = graphene.Schema(
+    query=Query, mutation=PrivateMutation, subscription=Subscription, directives=directives
+)
+
+# Fields whose resolvers cost more than loading an object, e.g. hashing a password.
+cost_analyzer = QueryCostAnalyzer(
+    field_costs={
+        "Mutation.createUser": 10,
+        "Mutation.loginUser": 10,
+        "PrivateMutation.createRoomSessions": 100,
+    }
+)
+
+# Lists served from database rows when only their columns are selected, with the
+# queryset returned by their resolver.
+flat_list_compiler = FlatListCompiler(querysets={"Query.roomSessions": get_room_sessions})
+
+# Fields of the data shared by every user, the leaderboards and the room catalogue:
+# responses selecting them are dropped when it changes, see `core.response_cache`.
+shared_fields = ["Query.leaderboard", "Query.searchRooms", "EscapeRoomSessionType.room"]
+
+# Shared by both GraphQL views, it keeps one cache of documents per schema.
+document_backend = CachedDocumentBackend(
+    cost_analyzer=cost_analyzer,
+    flat_list_compiler=flat_list_compiler,
+    shared_fields=shared_fields,
+)
+
+# Middleware of both GraphQL views.
+middleware = [TracingMiddleware()]
@@ -0,0 +1,460 @@
+import copy
+from collections import deque
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import QuerySet
+
+from graphql.error import GraphQLError
+from graphql.execution import ExecutionResult, execute
+from graphql.execution.base import ExecutionContext, collect_fields
+from graphql.execution.executor import complete_value_catching_error, execute_fields
+from graphql.execution.executors.sync import SyncExecutor
+from graphql.execution.middleware import MiddlewareManager
+from graphql.execution.values import get_argument_values, get_variable_values
+from graphql.language import ast
+from graphql.pyutils.default_ordered_dict import DefaultOrderedDict
+from graphql.type import (
+    GraphQLArgument,
+    GraphQLBoolean,
+    GraphQLInt,
+    GraphQLList,
+    GraphQLNonNull,
+    GraphQLString,
+)
+from graphql.type.directives import (
+    DirectiveLocation,
+    GraphQLDirective,
+    GraphQLIncludeDirective,
+    GraphQLSkipDirective,
+)
+from graphql.utils.get_operation_ast import get_operation_ast
+from promise import Promise, is_thenable
+
+from core import db_routing
+from core.executors import ThreadedRootResolverMiddleware
+
+GraphQLDeferDirective = GraphQLDirective(
+    name="defer",
+    description="Delivers the fields of this fragment after the rest of the result.",
+    args={
+        "label": GraphQLArgument(GraphQLString),
+        "if": GraphQLArgument(GraphQLBoolean, default_value=True),
+    },
+    locations=[DirectiveLocation.FRAGMENT_SPREAD, DirectiveLocation.INLINE_FRAGMENT],
+)
+
+GraphQLStreamDirective = GraphQLDirective(
+    name="stream",
+    description=(
+        "Delivers the first `initialCount` items of this list with the rest of the result, "
+        "then the next ones in batches."
+    ),
+    args={
+        "label": GraphQLArgument(GraphQLString),
+        "initialCount": GraphQLArgument(GraphQLInt, default_value=0),
+        "if": GraphQLArgument(GraphQLBoolean, default_value=True),
+    },
+    locations=[DirectiveLocation.FIELD],
+)
+
+# Directives of the schemas.
+directives = [
+    GraphQLIncludeDirective,
+    GraphQLSkipDirective,
+    GraphQLDeferDirective,
+    GraphQLStreamDirective,
+]
+
+# Deferred fragments are skipped and followed by a `__typename` field with an alias
+# starting with this prefix, whose resolution records the object to complete them on.
+DEFER_MARKER_PREFIX = "__defer_"
+SKIP = ast.Directive(
+    name=ast.Name(GraphQLSkipDirective.name),
+    arguments=[ast.Argument(name=ast.Name("if"), value=ast.BooleanValue(True))],
+)
+
+
+def get_selection_sets(document_ast):
+    """
+    Yields the selection sets of `document_ast`, nested ones included.
+    """
+    selection_sets = [definition.selection_set for definition in document_ast.definitions]
+    while selection_sets:
+        selection_set = selection_sets.pop()
+        if selection_set is None:
+            continue
+        yield selection_set
+        for selection in selection_set.selections:
+            if not isinstance(selection, ast.FragmentSpread):
+                selection_sets.append(selection.selection_set)
+
+
+def uses_incremental_delivery(document_ast):
+    names = {GraphQLDeferDirective.name, GraphQLStreamDirective.name}
+    return any(
+        directive.name.value in names
+        for selection_set in get_selection_sets(document_ast)
+        for selection in selection_set.selections
+        for directive in selection.directives or ()
+    )
+
+
+def get_directive_values(directive, node, variables):
+    """
+    Returns the arguments of `directive` on `node` when it applies to it, None
+    otherwise.
+    """
+    for node_directive in node.directives or ():
+        if node_directive.name.value == directive.name:
+            values = get_argument_values(directive.args, node_directive.arguments, variables)
+            return None if values.get("if") is False else values
+    return None
+
+
+class Deferred(object):
+    def __init__(self, label, path, parent_type, source, fragment):
+        self.label = label
+        self.path = path
+        self.parent_type = parent_type
+        self.source = source
+        self.fragment = fragment
+
+
+class Stream(object):
+    def __init__(self, label, path, info, items, next_index):
+        self.label = label
+        self.path = path
+        self.info = info
+        self.items = items
+        self.next_index = next_index
+
+
+def defer_fragments(document_ast, variables):
+    """
+    Returns a copy of `document_ast` where deferred fragments are skipped and
+    followed by markers, along with the fragments of each marker and their
+    label. Skipped fragments are still seen by `optimize_queryset()`, which
+    loads the columns of their fields at once.
+    """
+    document_ast = copy.deepcopy(document_ast)
+    fragments = {}
+    # Listed before changing fragments, whose selection sets are then rewritten too.
+    for selection_set in list(get_selection_sets(document_ast)):
+        selections = []
+        for selection in selection_set.selections:
+            selections.append(selection)
+            if isinstance(selection, ast.Field):
+                continue
+            values = get_directive_values(GraphQLDeferDirective, selection, variables)
+            if values is None:
+                continue
+            # @skip and @include still apply to the marker.
+            directives = [
+                directive
+                for directive in selection.directives
+                if directive.name.value != GraphQLDeferDirective.name
+            ]
+            marker = DEFER_MARKER_PREFIX + str(len(fragments))
+            fragment = copy.copy(selection)
+            fragment.directives = directives
+            fragments[marker] = (fragment, values.get("label"))
+            selection.directives = [SKIP]
+            marker_field = ast.Field(
+                alias=ast.Name(marker), name=ast.Name("__typename"), directives=directives
+            )
+            selections.append(marker_field)
+        selection_set.selections = selections
+    return document_ast, fragments
+
+
+def unwrap_list_type(type_):
+    if isinstance(type_, GraphQLNonNull):
+        type_ = type_.of_type
+    return type_ if isinstance(type_, GraphQLList) else None
+
+
+def iterate_lazily(queryset):
+    # Not evaluated until its first item is needed.
+    for item in queryset:
+        yield item
+
+
+def split_items(value, initial_count):
+    """
+    Returns the first `initial_count` items of `value` and an iterator on the
+    next ones. Querysets only load their first items at first.
+    """
+    if isinstance(value, QuerySet) and value._result_cache is None:
+        if not value.ordered:
+            # Both queries must list the items in the same order.
+            value = value.order_by("pk")
+        return list(value[:initial_count]), iterate_lazily(value[initial_count:])
+    items = iter(value)
+    return list(islice(items, initial_count)), items
+
+
+class IncrementalRecorder(object):
+    """
+    Middleware recording the deferred fragments and streamed lists met during
+    the execution, to complete them later.
+    """
+
+    def __init__(self, fragments):
+        self.fragments = fragments
+        self.deferred = []
+        self.streams = []
+
+    def resolve(self, next, root, info, **args):
+        field_ast = info.field_asts[0]
+        alias = field_ast.alias.value if field_ast.alias else ""
+        if alias.startswith(DEFER_MARKER_PREFIX):
+            fragment, label = self.fragments[alias]
+            self.deferred.append(Deferred(label, info.path[:-1], info.parent_type, root, fragment))
+            return info.parent_type.name
+
+        result = next(root, info, **args)
+        values = get_directive_values(GraphQLStreamDirective, field_ast, info.variable_values)
+        if values is None or unwrap_list_type(info.return_type) is None:
+            return result
+        if is_thenable(result):
+            return Promise.resolve(result).then(lambda value: self.stream(value, info, values))
+        return self.stream(result, info, values)
+
+    def stream(self, value, info, values):
+        if value is None:
+            return value
+        initial_count = max(values.get("initialCount") or 0, 0)
+        initial, rest = split_items(value, initial_count)
+        self.streams.append(Stream(values.get("label"), info.path, info, rest, len(initial)))
+        return initial
+
+    def pop(self):
+        deferred, streams = self.deferred, self.streams
+        self.deferred, self.streams = [], []
+        return deferred, streams
+
+
+def locate(data, path):
+    """
+    Returns the value of `data` at `path`, None when it is missing, e.g. when
+    an error nulled one of its parents.
+    """
+    for key in path:
+        if isinstance(data, dict):
+            data = data.get(key)
+        elif isinstance(data, list) and isinstance(key, int) and 0 <= key < len(data):
+            data = data[key]
+        else:
+            return None
+    return data
+
+
+class IncrementalExecutionResult(ExecutionResult):
+    """
+    Result of the initial execution, whose subsequent payloads are computed
+    while iterating `subsequent_payloads`.
+    """
+
+    def __init__(self, subsequent_payloads, **kwargs):
+        super(IncrementalExecutionResult, self).__init__(**kwargs)
+        self.subsequent_payloads = subsequent_payloads
+
+
+class IncrementalExecution(object):
+    """
+    Executes a document, leaving out its deferred fragments and the items of its
+    streamed lists past their `initialCount`. These are then executed one after
+    the other, yielding the subsequent payloads of the incremental delivery.
+    """
+
+    def __init__(
+        self,
+        schema,
+        document_ast,
+        root_value=None,
+        context_value=None,
+        variable_values=None,
+        operation_name=None,
+        middleware=None,
+        read_database=None,
+        root=None,
+        context=None,
+        variables=None,
+        **execute_params
+    ):
+        self.schema = schema
+        # graphene-django still passes the deprecated `root`, `context` and `variables`.
+        self.root_value = root_value if root_value is not None else root
+        self.context_value = context_value if context_value is not None else context
+        self.variable_values = variable_values or variables or {}
+        self.operation_name = operation_name
+        self.execute_params = execute_params
+        self.read_database = read_database
+        self.pending = deque()
+
+        operation = get_operation_ast(document_ast, operation_name)
+        variables = get_variable_values(
+            schema, operation.variable_definitions or [], self.variable_values
+        )
+        self.document_ast, fragments = defer_fragments(document_ast, variables)
+        self.recorder = IncrementalRecorder(fragments)
+        # The recorder comes first, so that it gets the values of the resolvers.
+        if isinstance(middleware, MiddlewareManager):
+            middleware = middleware.middlewares
+        self.middleware = MiddlewareManager(
+            self.recorder, *(middleware or ()), wrap_in_promise=False
+        )
+        # Subsequent payloads are resolved on the thread sending them, the event
+        # loop of the resolver threads only lasts for the initial result.
+        self.subsequent_middleware = MiddlewareManager(
+            self.recorder,
+            *(
+                resolver_middleware
+                for resolver_middleware in middleware or ()
+                if not isinstance(resolver_middleware, ThreadedRootResolverMiddleware)
+            ),
+            wrap_in_promise=False
+        )
+
+    def execute(self):
+        result = execute(
+            self.schema,
+            self.document_ast,
+            root_value=self.root_value,
+            context_value=self.context_value,
+            variable_values=self.variable_values,
+            operation_name=self.operation_name,
+            middleware=self.middleware,
+            **self.execute_params
+        )
+        self.record_pending([], result.data)
+        if not self.pending:
+            return result
+        return IncrementalExecutionResult(
+            self.get_subsequent_payloads(), data=result.data, errors=result.errors
+        )
+
+    def record_pending(self, path, data):
+        """
+        Removes the markers of deferred fragments from `data`, the result at
+        `path`, and queues those fragments and the streams met meanwhile. They
+        are delivered together.
+        """
+        deferred, streams = self.recorder.pop()
+        group = []
+        for fragment in deferred:
+            parent = locate(data, fragment.path[len(path):])
+            if isinstance(parent, dict):
+                for key in [key for key in parent if key.startswith(DEFER_MARKER_PREFIX)]:
+                    del parent[key]
+                group.append(fragment)
+        for stream in streams:
+            if locate(data, stream.path[len(path):]) is not None:
+                group.append(stream)
+        if group:
+            self.pending.append(group)
+
+    def get_context(self):
+        return ExecutionContext(
+            self.schema,
+            self.document_ast,
+            self.root_value,
+            self.context_value,
+            self.variable_values,
+            self.operation_name,
+            SyncExecutor(),
+            self.subsequent_middleware,
+            False,
+        )
+
+    def wait(self, context, value):
+        context.executor.wait_until_finished()
+        return Promise.resolve(value).get()
+
+    def execute_deferred(self, deferred):
+        context = self.get_context()
+        fields = collect_fields(
+            context,
+            deferred.parent_type,
+            ast.SelectionSet(selections=[deferred.fragment]),
+            DefaultOrderedDict(list),
+            set(),
+        )
+        try:
+            data = self.wait(
+                context,
+                execute_fields(
+                    context, deferred.parent_type, deferred.source, fields, deferred.path, None
+                ),
+            )
+        except GraphQLError as e:
+            # A non-null field failed, none of the fragment is delivered.
+            data = None
+            context.errors.append(e)
+        self.record_pending(deferred.path, data)
+        return {"data": data, "path": deferred.path}, context.errors
+
+    def execute_stream(self, stream):
+        items = list(islice(stream.items, settings.GRAPHQL_STREAM_BATCH_SIZE))
+        if not items:
+            return None, []
+        start = stream.next_index
+        stream.next_index += len(items)
+
+        context = self.get_context()
+        item_type = unwrap_list_type(stream.info.return_type).of_type
+        try:
+            completed = self.wait(
+                context,
+                Promise.all(
+                    [
+                        complete_value_catching_error(
+                            context,
+                            item_type,
+                            stream.info.field_asts,
+                            stream.info,
+                            stream.path + [index],
+                            item,
+                        )
+                        for index, item in enumerate(items, start)
+                    ]
+                ),
+            )
+        except GraphQLError as e:
+            # A non-null item failed, the stream ends there.
+            context.errors.append(e)
+            return {"items": None, "path": stream.path + [start]}, context.errors
+
+        self.record_pending(stream.path, dict(enumerate(completed, start)))
+        # Its next items come after the fragments and streams queued meanwhile.
+        if len(items) == settings.GRAPHQL_STREAM_BATCH_SIZE:
+            self.pending.append([stream])
+        return {"items": completed, "path": stream.path + [start]}, context.errors
+
+    def get_subsequent_payloads(self):
+        """
+        Yields the subsequent payloads, in the format of the incremental delivery
+        of graphql-js: `{"incremental": [...], "hasNext": ...}`.
+        """
+        while self.pending:
+            payloads = []
+            # Run after the response started, out of the request middleware.
+            with db_routing.read_from(self.read_database):
+                for pending in self.pending.popleft():
+                    if isinstance(pending, Deferred):
+                        payload, errors = self.execute_deferred(pending)
+                    else:
+                        payload, errors = self.execute_stream(pending)
+                    if payload is None:
+                        continue
+                    if pending.label is not None:
+                        payload["label"] = pending.label
+                    if errors:
+                        payload["errors"] = errors
+                    payloads.append(payload)
+
+            if payloads:
+                yield {"incremental": payloads, "hasNext": bool(self.pending)}
+            elif not self.pending:
+                yield {"hasNext": False}
@@ -0,0 +1,57 @@
+from collections import defaultdict
+
+from promise import Promise
+from promise.dataloader import DataLoader
+
+
+class ModelLoader(DataLoader):
+    """
+    Loads instances of a model by primary key, one `IN` query per batch.
+    """
+
+    def __init__(self, model):
+        super(ModelLoader, self).__init__()
+        self.model = model
+
+    def batch_load_fn(self, keys):
+        instances = self.model._default_manager.in_bulk(keys)
+        return Promise.resolve([instances.get(key) for key in keys])
+
+
+class RelatedSetLoader(DataLoader):
+    """
+    Loads, for each key, the instances of a model whose foreign key `field_name`
+    points to it, one `IN` query per batch.
+    """
+
+    def __init__(self, model, field_name):
+        super(RelatedSetLoader, self).__init__()
+        self.model = model
+        self.field = model._meta.get_field(field_name)
+
+    def batch_load_fn(self, keys):
+        related = defaultdict(list)
+        instances = self.model._default_manager.filter(
+            **{self.field.name + "__in": keys}
+        ).order_by("pk")
+        for instance in instances:
+            related[getattr(instance, self.field.attname)].append(instance)
+        return Promise.resolve([related[key] for key in keys])
+
+
+def get_loader(context, loader_class, *args):
+    """
+    Returns the loader built from `loader_class(*args)` for the current request.
+
+    Loaders are attached to the request so that their cache never outlives it,
+    and so that every resolver of a request shares the same batches.
+    """
+    loaders = getattr(context, "dataloaders", None)
+    if loaders is None:
+        loaders = context.dataloaders = {}
+
+    key = (loader_class,) + args
+    loader = loaders.get(key)
+    if loader is None:
+        loader = loaders[key] = loader_class(*args)
+    return loader
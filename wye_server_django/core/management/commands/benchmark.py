@@ -0,0 +1,576 @@
+import datetime
+import http.cookies
+import importlib.util
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from rooms.catalogue import get_rooms
+from rooms.models import EscapeRoomSession
+
+EMAIL_TEMPLATE = "benchmark-{}@wye.com"
+PASSWORD = "benchmark-password"
+ROOMS = ["Benchmark room {}".format(index) for index in range(20)]
+
+LOGIN_USER = (
+    "mutation($email: String!, $password: String!) "
+    "{ loginUser(email: $email, password: $password) { user { id } } }"
+)
+WHOAMI = "{ whoami }"
+ROOM_SESSIONS = "{ roomSessions { id name playedDatetime durationTime numberOfHints } }"
+# Root fields waiting on the database, resolved concurrently with GRAPHQL_ASYNC_EXECUTION.
+ROOT_FIELDS = "{ whoami roomStats { count averageDurationTime } roomSessions { name } }"
+CREATE_ROOM_SESSION = (
+    "mutation($name: String!, $playedDatetime: DateTime!, $durationTime: Float!, "
+    "$numberOfHints: Int!) { createRoomSession(name: $name, playedDatetime: $playedDatetime, "
+    "durationTime: $durationTime, numberOfHints: $numberOfHints) { roomSession { id } } }"
+)
+
+
+def log_in(email):
+    return ("/graphql/", {"query": LOGIN_USER, "variables": {"email": email, "password": PASSWORD}})
+
+
+def whoami(email):
+    return ("/private_graphql/", {"query": WHOAMI})
+
+
+def room_sessions(email):
+    return ("/private_graphql/", {"query": ROOM_SESSIONS})
+
+
+def root_fields(email):
+    return ("/private_graphql/", {"query": ROOT_FIELDS})
+
+
+def create_room_session(email):
+    variables = {
+        "name": random.choice(ROOMS),
+        "playedDatetime": timezone.now().isoformat(),
+        "durationTime": random.uniform(1200, 5400),
+        "numberOfHints": random.randrange(10),
+    }
+    return ("/private_graphql/", {"query": CREATE_ROOM_SESSION, "variables": variables})
+
+
+# Requests of each scenario, run in this order: writes come last so that the
+# reads of a run see the same data.
+SCENARIOS = [
+    ("login", log_in),
+    ("whoami", whoami),
+    ("roomSessions", room_sessions),
+    ("rootFields", root_fields),
+    ("createRoomSession", create_room_session),
+]
+
+
+def percentile(values, ratio):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * ratio))]
+
+
+def reset_peak_rss(pid="self"):
+    # Linux only, the peak is then that of the whole process.
+    try:
+        with open("/proc/{}/clear_refs".format(pid), "w") as clear_refs:
+            clear_refs.write("5")
+    except OSError:
+        pass
+
+
+def get_peak_rss(pid="self"):
+    """
+    Returns the peak resident set size of the process in kB, None when unknown.
+    """
+    try:
+        with open("/proc/{}/status".format(pid)) as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    if pid != "self":
+        return None
+    import resource
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # In bytes on macOS, in kB elsewhere.
+    return peak_rss // 1024 if sys.platform == "darwin" else peak_rss
+
+
+class InProcessClient(object):
+    """
+    Sends requests through the Django test client, counting every SQL query they
+    run, session and authentication included.
+    """
+
+    def __init__(self):
+        self.client = Client()
+        self.sql_count = 0
+
+    def count_sql(self, execute, sql, params, many, context):
+        self.sql_count += 1
+        return execute(sql, params, many, context)
+
+    def post(self, path, body, trace=False):
+        self.sql_count = 0
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self.count_sql))
+            response = self.client.post(path, json.dumps(body), content_type="application/json")
+        return response.status_code, json.loads(response.content.decode()), self.sql_count
+
+    def get_pids(self):
+        return ["self"]
+
+
+class HttpClient(object):
+    """
+    Sends requests to a running server. Only the SQL queries of the GraphQL
+    execution are counted, from the tracing extension of traced requests.
+    """
+
+    def __init__(self, url, pids):
+        self.url = url
+        self.pids = pids
+        # Kept whatever their domain, e.g. the production one of a local server.
+        self.cookies = {}
+
+    def post(self, path, body, trace=False):
+        headers = {"Content-Type": "application/json", "Referer": self.url + "/"}
+        if self.cookies:
+            headers["Cookie"] = "; ".join(
+                "{}={}".format(name, value) for name, value in self.cookies.items()
+            )
+        if "csrftoken" in self.cookies:
+            headers["X-CSRFToken"] = self.cookies["csrftoken"]
+        if trace:
+            body = dict(body, extensions={"tracing": True})
+        request = urllib.request.Request(self.url + path, json.dumps(body).encode(), headers)
+        try:
+            response = urllib.request.urlopen(request)
+        except urllib.error.HTTPError as e:
+            response = e
+        with response:
+            status, content = response.status, response.read()
+            for header in response.headers.get_all("Set-Cookie") or ():
+                for name, morsel in http.cookies.SimpleCookie(header).items():
+                    self.cookies[name] = morsel.value
+
+        try:
+            result = json.loads(content.decode())
+        except ValueError:
+            result = {"errors": [{"message": "HTTP {}".format(status)}]}
+        sql_count = None
+        if trace and "tracing" in result.get("extensions", {}):
+            sql_count = result["extensions"]["tracing"]["sql"]["count"]
+        return status, result, sql_count
+
+    def get_pids(self):
+        return self.pids
+
+
+class Gunicorn(object):
+    """
+    Runs gunicorn with the current settings and `gunicorn.conf.py` on a free local
+    port. The application is preloaded unless `preload` is False. With `asgi`,
+    uvicorn workers serve `core.asgi` with GRAPHQL_ASYNC_EXECUTION on.
+    """
+
+    def __init__(self, workers, preload=True, asgi=False):
+        self.workers = workers
+        self.preload = preload
+        self.asgi = asgi
+        self.process = None
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            self.port = sock.getsockname()[1]
+        # Served as one of the ALLOWED_HOSTS.
+        self.url = "http://localhost:{}".format(self.port)
+
+    def __enter__(self):
+        self.start()
+        self.wait_until_ready()
+        return self
+
+    def start(self):
+        env = dict(os.environ, GUNICORN_PRELOAD=str(self.preload))
+        worker_class = []
+        if self.asgi:
+            env["GRAPHQL_ASYNC_EXECUTION"] = "True"
+            worker_class = ["--worker-class", "uvicorn.workers.UvicornWorker"]
+        self.process = subprocess.Popen(
+            [
+                # Of the current environment, gunicorn 20.0 has no __main__ module.
+                sys.executable,
+                "-c",
+                "from gunicorn.app.wsgiapp import run; run()",
+                "core.asgi" if self.asgi else "core.wsgi",
+                "--pythonpath",
+                os.path.join(settings.BASE_DIR, "wye_server_django"),
+                "--config",
+                os.path.join(settings.BASE_DIR, "gunicorn.conf.py"),
+                "--bind",
+                "127.0.0.1:{}".format(self.port),
+                "--workers",
+                str(self.workers),
+                "--log-level",
+                "warning",
+            ]
+            + worker_class,
+            cwd=settings.BASE_DIR,
+            env=env,
+        )
+
+    def wait_until_ready(self, interval=0.1):
+        deadline = time.monotonic() + 30
+        while len(self.get_worker_pids()) < self.workers or not self.is_listening():
+            if self.process.poll() is not None or time.monotonic() > deadline:
+                self.__exit__()
+                raise CommandError("gunicorn did not start.")
+            time.sleep(interval)
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        self.process.wait()
+
+    def is_listening(self):
+        try:
+            socket.create_connection(("127.0.0.1", self.port), timeout=1).close()
+        except OSError:
+            return False
+        return True
+
+    def get_worker_pids(self):
+        # Linux only, workers are not measured elsewhere.
+        pid = self.process.pid
+        try:
+            with open("/proc/{}/task/{}/children".format(pid, pid)) as children:
+                return children.read().split()
+        except OSError:
+            return []
+
+
+class Command(BaseCommand):
+    help = (
+        "Fills the database with generated users and room sessions, then measures the "
+        "throughput and latency of the GraphQL endpoints, in process, through gunicorn or "
+        "against a running server. Run it against a throwaway database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--yes-i-know",
+            action="store_true",
+            help="Run even though DEBUG is off, e.g. on a staging copy of production.",
+        )
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument(
+            "--sessions",
+            type=int,
+            default=100,
+            help="Number of room sessions of each user, generated sessions included.",
+        )
+        parser.add_argument(
+            "--skip-populate",
+            action="store_true",
+            help="Reuse the users and sessions generated by a previous run.",
+        )
+        parser.add_argument(
+            "--requests", type=int, default=500, help="Number of requests of each scenario."
+        )
+        parser.add_argument(
+            "--warmup", type=int, default=5, help="Number of untimed requests of each client."
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=1,
+            help="Number of clients sending requests at once, each logged in as its own user.",
+        )
+        parser.add_argument(
+            "--scenario",
+            action="append",
+            choices=[name for name, _ in SCENARIOS],
+            help="Scenario to run, all by default. May be repeated.",
+        )
+        server = parser.add_mutually_exclusive_group()
+        server.add_argument(
+            "--gunicorn",
+            type=int,
+            metavar="WORKERS",
+            help="Send requests to gunicorn run with this number of workers.",
+        )
+        server.add_argument(
+            "--url", help="Send requests to a server already running at this URL."
+        )
+        parser.add_argument(
+            "--asgi",
+            action="store_true",
+            help="Run gunicorn with uvicorn workers serving the ASGI application, executing "
+            "documents asynchronously (requires uvicorn and channels).",
+        )
+        parser.add_argument("--output", help="Write the results to this JSON file.")
+        parser.add_argument("--compare", help="Compare the results with this JSON file.")
+
+    def populate(self, users, sessions, batch_size=10000):
+        User = get_user_model()
+        # Hashing each password would take longer than the benchmark.
+        password = make_password(PASSWORD)
+        existing = User.objects.filter(email__startswith="benchmark-").count()
+        for start in range(existing, users, batch_size):
+            User.objects.bulk_create(
+                User(
+                    email=EMAIL_TEMPLATE.format(index),
+                    pseudo="Player {}".format(index),
+                    password=password,
+                )
+                for index in range(start, min(users, start + batch_size))
+            )
+        # Users of previous runs are only topped up to `sessions` sessions.
+        session_counts = (
+            User.objects.filter(email__startswith="benchmark-")
+            .annotate(session_count=Count("escaperoomsession"))
+            .order_by("pk")
+            .values_list("pk", "session_count")[:users]
+        )
+
+        rooms = list(get_rooms(ROOMS).values())
+        now = timezone.now()
+        new_sessions = (
+            EscapeRoomSession(
+                name=room.name,
+                room=room,
+                played_datetime=now - datetime.timedelta(minutes=random.randrange(10 ** 6)),
+                duration_time=datetime.timedelta(seconds=random.uniform(1200, 5400)),
+                number_of_hints=random.randrange(10),
+                user_id=user_id,
+            )
+            for user_id, session_count in session_counts
+            for room in random.choices(rooms, k=max(sessions - session_count, 0))
+        )
+        while True:
+            batch = [session for _, session in zip(range(batch_size), new_sessions)]
+            if not batch:
+                break
+            EscapeRoomSession.objects.bulk_create(batch)
+
+        call_command("rebuild_room_stats", stdout=self.stdout)
+        call_command("rebuild_leaderboards", stdout=self.stdout)
+
+    def run_scenario(self, clients, emails, build_request, requests, warmup):
+        """
+        Sends `requests` requests built by `build_request` from the clients at
+        once, and returns the measures.
+        """
+        latencies, errors, sql_counts = [], [], []
+
+        def send(client, email, trace=False):
+            path, body = build_request(email)
+            started_at = time.perf_counter()
+            try:
+                status, result, sql_count = client.post(path, body, trace)
+            except OSError as e:
+                # E.g. the server closed the connection.
+                status, result, sql_count = None, {"errors": [{"message": str(e)}]}, None
+            duration = time.perf_counter() - started_at
+            error = None
+            if status != 200 or result.get("errors"):
+                error = result.get("errors", [{}])[0].get("message", status)
+            return duration, sql_count, error
+
+        def run(index, count):
+            client = clients[index]
+            # Clients log in as other users of the same share, for the login scenario.
+            client_emails = emails[index :: len(clients)]
+            for request in range(warmup):
+                send(client, client_emails[request % len(client_emails)])
+            for request in range(count):
+                duration, sql_count, error = send(
+                    client, client_emails[request % len(client_emails)]
+                )
+                latencies.append(duration)
+                if error is not None:
+                    errors.append(error)
+                if sql_count is not None:
+                    sql_counts.append(sql_count)
+            if not sql_counts:
+                _, sql_count, _ = send(client, client_emails[0], trace=True)
+                if sql_count is not None:
+                    sql_counts.append(sql_count)
+            if len(clients) > 1:
+                connections.close_all()
+
+        shares = [
+            requests // len(clients) + (index < requests % len(clients))
+            for index in range(len(clients))
+        ]
+        pids = clients[0].get_pids()
+        for pid in pids:
+            reset_peak_rss(pid)
+        started_at = time.perf_counter()
+        if len(clients) == 1:
+            # Runs in the current thread, e.g. within the transaction of a test.
+            run(0, shares[0])
+        else:
+            threads = [
+                threading.Thread(target=run, args=(index, share))
+                for index, share in enumerate(shares)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        duration = time.perf_counter() - started_at
+        peak_rss = [get_peak_rss(pid) for pid in pids]
+
+        return {
+            "requests": len(latencies),
+            "errors": len(errors),
+            "first_error": errors[0] if errors else None,
+            "requests_per_second": round(len(latencies) / duration, 1),
+            "latency_ms": {
+                "mean": round(statistics.mean(latencies) * 1000, 2),
+                "p50": round(percentile(latencies, 0.5) * 1000, 2),
+                "p95": round(percentile(latencies, 0.95) * 1000, 2),
+                "p99": round(percentile(latencies, 0.99) * 1000, 2),
+            },
+            "sql_queries_per_request": (
+                round(statistics.mean(sql_counts), 1) if sql_counts else None
+            ),
+            # Of the largest process.
+            "peak_rss_kb": max(peak_rss) if peak_rss and None not in peak_rss else None,
+        }
+
+    def run(self, make_client, emails, options):
+        clients = [make_client() for _ in range(options["concurrency"])]
+        for index, client in enumerate(clients):
+            path, body = log_in(emails[index])
+            status, result, _ = client.post(path, body)
+            if status != 200 or not (result.get("data") or {}).get("loginUser", {}).get("user"):
+                raise CommandError("Could not log in as {}: {}".format(emails[index], result))
+
+        scenarios = options["scenario"] or [name for name, _ in SCENARIOS]
+        results = {}
+        for name, build_request in SCENARIOS:
+            if name not in scenarios:
+                continue
+            results[name] = self.run_scenario(
+                clients, emails, build_request, options["requests"], options["warmup"]
+            )
+            self.write_result(name, results[name])
+        return results
+
+    def write_result(self, name, result):
+        self.stdout.write(
+            "{:<18} {:8.1f} req/s   p50 {:7.2f} ms   p95 {:7.2f} ms   p99 {:7.2f} ms   "
+            "{:>5} SQL/req   {:>7} kB RSS   {} errors".format(
+                name,
+                result["requests_per_second"],
+                result["latency_ms"]["p50"],
+                result["latency_ms"]["p95"],
+                result["latency_ms"]["p99"],
+                "-" if result["sql_queries_per_request"] is None
+                else result["sql_queries_per_request"],
+                "-" if result["peak_rss_kb"] is None else result["peak_rss_kb"],
+                result["errors"],
+            )
+        )
+        if result["first_error"]:
+            self.stdout.write("  First error: {}".format(result["first_error"]))
+
+    def compare(self, report, path):
+        with open(path) as previous_file:
+            previous_report = json.load(previous_file)
+        self.stdout.write("Compared with {}:".format(path))
+        options = ("mode", "workers", "concurrency", "users", "sessions", "requests")
+        different = [option for option in options if previous_report[option] != report[option]]
+        if different:
+            self.stdout.write(
+                self.style.WARNING("Run with other options: {}".format(", ".join(different)))
+            )
+        previous = previous_report["scenarios"]
+        for name, result in report["scenarios"].items():
+            if name not in previous:
+                continue
+            changes = []
+            for label, get in (
+                ("req/s", lambda r: r["requests_per_second"]),
+                ("p50", lambda r: r["latency_ms"]["p50"]),
+                ("p99", lambda r: r["latency_ms"]["p99"]),
+                ("SQL/req", lambda r: r["sql_queries_per_request"]),
+                ("RSS", lambda r: r["peak_rss_kb"]),
+            ):
+                before, after = get(previous[name]), get(result)
+                if before and after is not None:
+                    changes.append("{} {:+.1f}%".format(label, (after - before) / before * 100))
+            self.stdout.write("{:<18} {}".format(name, "   ".join(changes)))
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options["yes_i_know"]:
+            raise CommandError(
+                "Generated users and sessions are added to the database, run with DEBUG "
+                "or --yes-i-know."
+            )
+        if options["requests"] < 1 or options["concurrency"] < 1:
+            raise CommandError("--requests and --concurrency must be positive.")
+        if options["users"] < options["concurrency"]:
+            raise CommandError("Each client needs a user of its own, add --users.")
+        if options["asgi"]:
+            if not options["gunicorn"]:
+                raise CommandError("--asgi runs gunicorn, add --gunicorn.")
+            if not all(importlib.util.find_spec(name) for name in ("uvicorn", "channels")):
+                raise CommandError("--asgi requires uvicorn and channels.")
+        if not options["skip_populate"]:
+            self.populate(options["users"], options["sessions"])
+        emails = [EMAIL_TEMPLATE.format(index) for index in range(options["users"])]
+
+        if options["url"]:
+            mode, url = "http", options["url"].rstrip("/")
+            results = self.run(lambda: HttpClient(url, []), emails, options)
+        elif options["gunicorn"]:
+            mode = "gunicorn-asgi" if options["asgi"] else "gunicorn"
+            with Gunicorn(options["gunicorn"], asgi=options["asgi"]) as gunicorn:
+                pids = gunicorn.get_worker_pids()
+                results = self.run(lambda: HttpClient(gunicorn.url, pids), emails, options)
+        else:
+            mode = "in-process"
+            # As in tests, the test client is served as "testserver".
+            with override_settings(ALLOWED_HOSTS=settings.ALLOWED_HOSTS + ["testserver"]):
+                results = self.run(InProcessClient, emails, options)
+
+        report = {
+            "mode": mode,
+            "workers": options["gunicorn"],
+            "concurrency": options["concurrency"],
+            "users": options["users"],
+            "sessions": options["sessions"],
+            "requests": options["requests"],
+            "scenarios": results,
+        }
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(report, output, indent=2, sort_keys=True)
+                output.write("\n")
+        if options["compare"]:
+            self.compare(report, options["compare"])
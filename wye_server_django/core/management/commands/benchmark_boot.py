@@ -0,0 +1,156 @@
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.management.commands.benchmark import Gunicorn, HttpClient, percentile
+
+# Runs through the views, the GraphQL backend and the executor, without data.
+REQUEST = ("/graphql/", {"query": "mutation { __typename }"})
+
+MODES = [("preload", True), ("no preload", False)]
+
+
+def get_memory(pid):
+    """
+    Returns the memory of a process in kB: resident (RSS), proportional, with
+    pages shared with other processes split among them (PSS), and unique to the
+    process (USS). None when unknown.
+    """
+    # Linux 4.14+ only.
+    sizes = {}
+    try:
+        with open("/proc/{}/smaps_rollup".format(pid)) as smaps:
+            for line in smaps:
+                name, _, value = line.partition(":")
+                if name in ("Rss", "Pss", "Private_Clean", "Private_Dirty"):
+                    sizes[name] = int(value.split()[0])
+    except OSError:
+        return None
+    return {
+        "rss_kb": sizes["Rss"],
+        "pss_kb": sizes["Pss"],
+        "uss_kb": sizes["Private_Clean"] + sizes["Private_Dirty"],
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Starts gunicorn with and without preloading the application, and measures the "
+        "time until it answers a first request and the memory of each worker."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--runs", type=int, default=3, help="Number of starts of each mode.")
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=200,
+            help="Number of requests sent after the first one, before measuring memory.",
+        )
+        parser.add_argument("--output", help="Write the results to this JSON file.")
+
+    def start(self, preload, requests):
+        gunicorn = Gunicorn(self.workers, preload=preload)
+        started_at = time.perf_counter()
+        gunicorn.start()
+        try:
+            client = HttpClient(gunicorn.url, [])
+            deadline = time.monotonic() + 30
+            while True:
+                if gunicorn.process.poll() is not None or time.monotonic() > deadline:
+                    raise CommandError("gunicorn did not start.")
+                request_started_at = time.perf_counter()
+                try:
+                    status, result, _ = client.post(*REQUEST)
+                except OSError:
+                    # Not listening yet.
+                    time.sleep(0.005)
+                    continue
+                break
+            first_response = time.perf_counter() - started_at
+            first_request = time.perf_counter() - request_started_at
+            if status != 200 or result.get("errors"):
+                raise CommandError("The first request failed: {}".format(result))
+
+            gunicorn.wait_until_ready()
+            latencies = []
+            for _ in range(requests):
+                request_started_at = time.perf_counter()
+                client.post(*REQUEST)
+                latencies.append(time.perf_counter() - request_started_at)
+            workers = [get_memory(pid) for pid in gunicorn.get_worker_pids()]
+            master = get_memory(gunicorn.process.pid)
+        finally:
+            gunicorn.__exit__()
+
+        return {
+            "first_response_ms": round(first_response * 1000, 1),
+            "first_request_ms": round(first_request * 1000, 2),
+            "p50_ms": round(percentile(latencies, 0.5) * 1000, 2) if latencies else None,
+            "master": master,
+            "workers": workers,
+        }
+
+    def summarize(self, runs):
+        """
+        Returns the medians of the runs of a mode, and the memory of its last run.
+        """
+        last = runs[-1]
+        summary = {
+            name: statistics.median(run[name] for run in runs)
+            for name in ("first_response_ms", "first_request_ms")
+        }
+        summary["p50_ms"] = last["p50_ms"]
+        summary["master"] = last["master"]
+        summary["workers"] = last["workers"]
+        if last["master"] and all(last["workers"]):
+            for size in ("rss_kb", "pss_kb", "uss_kb"):
+                summary["worker_" + size] = round(
+                    statistics.mean(worker[size] for worker in last["workers"])
+                )
+            # What the master and its workers take in memory altogether.
+            summary["total_pss_kb"] = last["master"]["pss_kb"] + sum(
+                worker["pss_kb"] for worker in last["workers"]
+            )
+        return summary
+
+    def write_summary(self, mode, summary):
+        self.stdout.write(
+            "{:<11} first response {:8.1f} ms   first request {:7.2f} ms   p50 {:>6} ms".format(
+                mode,
+                summary["first_response_ms"],
+                summary["first_request_ms"],
+                "-" if summary["p50_ms"] is None else summary["p50_ms"],
+            )
+        )
+        if "total_pss_kb" in summary:
+            self.stdout.write(
+                "{:<11} per worker RSS {:>7} kB   PSS {:>7} kB   USS {:>7} kB   "
+                "total PSS {:>7} kB".format(
+                    "",
+                    summary["worker_rss_kb"],
+                    summary["worker_pss_kb"],
+                    summary["worker_uss_kb"],
+                    summary["total_pss_kb"],
+                )
+            )
+
+    def handle(self, *args, **options):
+        if options["workers"] < 1 or options["runs"] < 1:
+            raise CommandError("--workers and --runs must be positive.")
+        self.workers = options["workers"]
+
+        results = {}
+        for mode, preload in MODES:
+            runs = [self.start(preload, options["requests"]) for _ in range(options["runs"])]
+            results[mode] = self.summarize(runs)
+            self.write_summary(mode, results[mode])
+
+        if options["output"]:
+            report = {"workers": self.workers, "runs": options["runs"], "modes": results}
+            with open(options["output"], "w") as output:
+                json.dump(report, output, indent=2, sort_keys=True)
+                output.write("\n")
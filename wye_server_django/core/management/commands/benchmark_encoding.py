@@ -0,0 +1,126 @@
+import datetime
+import json
+import random
+import time
+from functools import partial
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core import encoding
+from core.management.commands.benchmark import ROOMS
+
+LAYOUTS = ["objects", "columns"]
+
+
+def get_response(sessions):
+    """
+    Returns the response to `{ roomSessions { id name playedDatetime durationTime
+    numberOfHints } }` for a user with this number of sessions.
+    """
+    now = timezone.now()
+    return {
+        "data": {
+            "roomSessions": [
+                {
+                    "id": str(index + 1),
+                    "name": random.choice(ROOMS),
+                    "playedDatetime": (
+                        now - datetime.timedelta(minutes=random.randrange(10 ** 6))
+                    ).isoformat(),
+                    "durationTime": round(random.uniform(1200, 5400), 3),
+                    "numberOfHints": random.randrange(10),
+                }
+                for index in range(sessions)
+            ]
+        }
+    }
+
+
+def encode_response(dumps, response, layout):
+    # Lists are encoded as columns along with the response, as by the views.
+    if layout == "columns":
+        response = dict(response, data=encoding.encode_columns(response["data"]))
+    return dumps(response)
+
+
+def measure_cpu(function, repeat):
+    """
+    Returns the result of `function` and its CPU time per call in microseconds.
+    """
+    started_at = time.process_time()
+    for _ in range(repeat):
+        result = function()
+    return result, (time.process_time() - started_at) / repeat * 1e6
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures the bytes and CPU time of a roomSessions response with each JSON encoder, "
+        "list layout and content encoding available."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sessions", type=int, default=100, help="Number of room sessions in the response."
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=200, help="Number of times each measure runs."
+        )
+        parser.add_argument("--output", help="Write the results to this JSON file.")
+
+    def handle(self, *args, **options):
+        if options["sessions"] < 1 or options["repeat"] < 1:
+            raise CommandError("--sessions and --repeat must be positive.")
+        repeat = options["repeat"]
+        response = get_response(options["sessions"])
+        encoders = ["json"] if encoding.orjson is None else ["json", "orjson"]
+        content_encodings = encoding.get_content_encodings()[::-1]
+
+        results = []
+        for name in encoders:
+            dumps = encoding.get_encoder(name)
+            for layout in LAYOUTS:
+                content, encode_us = measure_cpu(
+                    partial(encode_response, dumps, response, layout), repeat
+                )
+                content = content.encode()
+                result = {
+                    "encoder": name,
+                    "layout": layout,
+                    "encode_us": round(encode_us, 1),
+                    "bytes": {"identity": len(content)},
+                    "compress_us": {},
+                }
+                for content_encoding in content_encodings:
+                    compressed, compress_us = measure_cpu(
+                        partial(encoding.compress, content, content_encoding), repeat
+                    )
+                    result["bytes"][content_encoding] = len(compressed)
+                    result["compress_us"][content_encoding] = round(compress_us, 1)
+                results.append(result)
+                self.write_result(result, content_encodings)
+
+        if options["output"]:
+            report = {"sessions": options["sessions"], "results": results}
+            with open(options["output"], "w") as output:
+                json.dump(report, output, indent=2, sort_keys=True)
+                output.write("\n")
+
+    def write_result(self, result, content_encodings):
+        self.stdout.write(
+            "{:<7} {:<8} encode {:8.1f} us   {:>8} B".format(
+                result["encoder"],
+                result["layout"],
+                result["encode_us"],
+                result["bytes"]["identity"],
+            )
+            + "".join(
+                "   {} {:>7} B {:8.1f} us".format(
+                    content_encoding,
+                    result["bytes"][content_encoding],
+                    result["compress_us"][content_encoding],
+                )
+                for content_encoding in content_encodings
+            )
+        )
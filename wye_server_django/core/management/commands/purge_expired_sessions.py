@@ -0,0 +1,34 @@
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes expired sessions from the database in batches, so that the table "
+        "is never locked by one large DELETE."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of sessions deleted per query.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        expired_sessions = Session.objects.filter(expire_date__lt=timezone.now())
+
+        purged = 0
+        while True:
+            session_keys = list(
+                expired_sessions.values_list("session_key", flat=True)[:batch_size]
+            )
+            if not session_keys:
+                break
+            Session.objects.filter(session_key__in=session_keys).delete()
+            purged += len(session_keys)
+
+        self.stdout.write("Purged {} expired sessions.".format(purged))
@@ -0,0 +1,191 @@
+import bisect
+import json
+import os
+import threading
+import time
+
+from django.conf import settings
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Seconds between two writes of the series of a process to METRICS_DIR.
+WRITE_INTERVAL = 1
+
+REGISTRY = []
+
+
+class Histogram(object):
+    """
+    Prometheus histogram kept in the memory of the process.
+
+    Without METRICS_DIR, each worker process exposes its own observations. With
+    it, each process writes its series to a file of this directory, and any
+    worker exposes the sum of all of them, see `render()`.
+    """
+
+    def __init__(
+        self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=REGISTRY
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        self.series = {}
+        self.lock = threading.Lock()
+        self.registry = registry
+        registry.append(self)
+
+    def new_counts(self):
+        # One counter per bucket, then the +Inf bucket, then the sum.
+        return [0] * (len(self.buckets) + 1) + [0.0]
+
+    def observe(self, value, *labelvalues):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(labelvalues)
+            if series is None:
+                series = self.series[labelvalues] = self.new_counts()
+            series[index] += 1
+            series[-1] += value
+        if self.registry is REGISTRY:
+            write_periodically()
+
+    def get_series(self):
+        with self.lock:
+            return {labelvalues: list(counts) for labelvalues, counts in self.series.items()}
+
+    def add_series(self, series):
+        with self.lock:
+            for labelvalues, counts in series.items():
+                # Written by a process with other buckets, e.g. before a deployment.
+                if len(counts) != len(self.buckets) + 2:
+                    continue
+                total = self.series.setdefault(labelvalues, self.new_counts())
+                for index, count in enumerate(counts):
+                    total[index] += count
+
+    def format_labels(self, labelvalues, **extra):
+        labels = list(zip(self.labelnames, labelvalues)) + list(extra.items())
+        if not labels:
+            return ""
+        return "{" + ",".join(
+            '{}="{}"'.format(
+                name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+            )
+            for name, value in labels
+        ) + "}"
+
+    def collect(self, series=None):
+        """
+        Yields the lines of the series of this histogram, or of `series`.
+        """
+        yield "# HELP {} {}".format(self.name, self.documentation)
+        yield "# TYPE {} histogram".format(self.name)
+        if series is None:
+            series = self.get_series()
+
+        for labelvalues, counts in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                yield "{}_bucket{} {}".format(
+                    self.name, self.format_labels(labelvalues, le=bound), cumulative
+                )
+            yield "{}_sum{} {}".format(self.name, self.format_labels(labelvalues), counts[-1])
+            yield "{}_count{} {}".format(self.name, self.format_labels(labelvalues), cumulative)
+
+
+def write(directory, registry=REGISTRY, pid=None):
+    """
+    Writes the series of the histograms of `registry` to the file of the
+    process `pid`, the current one by default, in `directory`.
+    """
+    path = os.path.join(directory, "{}.json".format(os.getpid() if pid is None else pid))
+    series = {
+        histogram.name: [
+            [list(labelvalues), counts] for labelvalues, counts in histogram.get_series().items()
+        ]
+        for histogram in registry
+    }
+    # Replaced at once, readers never see a partial file.
+    with open(path + ".tmp", "w") as output:
+        json.dump(series, output)
+    os.replace(path + ".tmp", path)
+
+
+def read(directory, registry=REGISTRY):
+    """
+    Returns the series of the histograms of `registry` summed over the files of
+    every process in `directory`, by histogram name.
+    """
+    totals = {
+        histogram.name: Histogram(histogram.name, "", buckets=histogram.buckets, registry=[])
+        for histogram in registry
+    }
+    for filename in os.listdir(directory):
+        if not filename.endswith(".json"):
+            continue
+        series = read_file(os.path.join(directory, filename))
+        for name, total in totals.items():
+            total.add_series(series.get(name, {}))
+    return {name: total.get_series() for name, total in totals.items()}
+
+
+def read_file(path):
+    try:
+        with open(path) as file:
+            series = json.load(file)
+    except (OSError, ValueError):
+        return {}
+    return {
+        name: {tuple(labelvalues): counts for labelvalues, counts in rows}
+        for name, rows in series.items()
+    }
+
+
+_last_write = {"pid": None, "time": 0}
+_write_lock = threading.Lock()
+
+
+def write_periodically(force=False):
+    """
+    Writes the series of this process to METRICS_DIR, unless they were written
+    less than WRITE_INTERVAL seconds ago.
+    """
+    directory = settings.METRICS_DIR
+    if not directory:
+        return
+    pid = os.getpid()
+    now = time.monotonic()
+    if not force and _last_write["pid"] == pid and now - _last_write["time"] < WRITE_INTERVAL:
+        return
+    # Observations do not wait for the thread writing.
+    if not _write_lock.acquire(blocking=force):
+        return
+    try:
+        if _last_write["pid"] != pid:
+            # A dead process of the same pid left its counts, which must not go down.
+            path = os.path.join(directory, "{}.json".format(pid))
+            series = read_file(path)
+            for histogram in REGISTRY:
+                histogram.add_series(series.get(histogram.name, {}))
+        _last_write.update(pid=pid, time=now)
+        write(directory)
+    finally:
+        _write_lock.release()
+
+
+def render(registry=REGISTRY, directory=None):
+    """
+    Returns the metrics in the Prometheus text exposition format: of this
+    process, or of every process writing to `directory`, METRICS_DIR by default.
+    """
+    directory = directory or settings.METRICS_DIR
+    if not directory:
+        return "".join(line + "\n" for histogram in registry for line in histogram.collect())
+
+    if registry is REGISTRY:
+        write_periodically(force=True)
+    series = read(directory, registry)
+    return "".join(
+        line + "\n" for histogram in registry for line in histogram.collect(series[histogram.name])
+    )
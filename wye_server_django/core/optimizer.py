@@ -0,0 +1,131 @@
+from functools import lru_cache
+
+from django.db.models import Prefetch
+
+from graphene.utils.str_converters import to_snake_case
+from graphql.language import ast
+
+
+@lru_cache(maxsize=None)
+def get_model_fields(model):
+    # Fields are keyed the way graphene-django names them: reverse relations by
+    # their accessor name, e.g. `escaperoomsession_set`.
+    fields = {}
+    for field in model._meta.get_fields():
+        if field.auto_created and not field.concrete:
+            fields[field.get_accessor_name()] = field
+        else:
+            fields[field.name] = field
+    return fields
+
+
+class QueryOptimizer(object):
+    """
+    Restricts a queryset to what the GraphQL selection set needs.
+
+    Selected model fields are mapped to `only()`, forward relations to
+    `select_related()` and reverse or many-to-many relations to
+    `prefetch_related()`, recursively. A selected field that does not map to a
+    model field (e.g. a custom resolver) disables `only()` on its level, so that
+    resolvers never trigger one query per row to load a deferred column.
+    """
+
+    def __init__(self, info):
+        self.info = info
+
+    def get_fields(self, selection_set):
+        if selection_set is None:
+            return
+        for selection in selection_set.selections:
+            if isinstance(selection, ast.Field):
+                yield selection
+            elif isinstance(selection, ast.InlineFragment):
+                for field in self.get_fields(selection.selection_set):
+                    yield field
+            elif isinstance(selection, ast.FragmentSpread):
+                fragment = self.info.fragments[selection.name.value]
+                for field in self.get_fields(fragment.selection_set):
+                    yield field
+
+    def get_selection_sets(self, path):
+        selection_sets = [field.selection_set for field in self.info.field_asts]
+        for name in path:
+            selection_sets = [
+                field.selection_set
+                for selection_set in selection_sets
+                for field in self.get_fields(selection_set)
+                if field.name.value == name
+            ]
+        return selection_sets
+
+    def optimize(self, queryset, selection_sets, extra_fields=()):
+        only, select_related, prefetch_related = [], [], []
+        self.collect(
+            queryset.model, selection_sets, "", only, select_related, prefetch_related
+        )
+        only.extend(extra_fields)
+
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        return queryset.only(*only)
+
+    def collect(self, model, selection_sets, prefix, only, select_related, prefetch_related):
+        model_fields = get_model_fields(model)
+        columns = {model._meta.pk.name}
+        restrict_columns = True
+
+        fields = [field for selection_set in selection_sets for field in self.get_fields(selection_set)]
+        for field_ast in fields:
+            name = to_snake_case(field_ast.name.value)
+            if name.startswith("__"):
+                continue
+
+            field = model_fields.get(name)
+            if field is None:
+                restrict_columns = False
+            elif field.one_to_many or field.many_to_many:
+                extra_fields = ()
+                if field.one_to_many:
+                    # The foreign key is needed to attach prefetched rows to their parent.
+                    extra_fields = (field.field.name,)
+                related_queryset = self.optimize(
+                    field.related_model._default_manager.all(),
+                    [field_ast.selection_set],
+                    extra_fields=extra_fields,
+                )
+                prefetch_related.append(Prefetch(prefix + name, queryset=related_queryset))
+            elif field.is_relation and field.concrete:
+                columns.add(name)
+                select_related.append(prefix + name)
+                self.collect(
+                    field.related_model,
+                    [field_ast.selection_set],
+                    prefix + name + "__",
+                    only,
+                    select_related,
+                    prefetch_related,
+                )
+            elif not field.is_relation:
+                columns.add(name)
+
+        if not restrict_columns:
+            columns.update(
+                field.name for field in model._meta.concrete_fields
+            )
+        only.extend(prefix + column for column in sorted(columns))
+
+
+def optimize_queryset(queryset, info, path=(), extra_fields=()):
+    """
+    Optimizes `queryset` for the selection set of the field being resolved.
+
+    `path` leads to the selection set of the queryset items when they are
+    nested in the field, e.g. `("edges", "node")` for a connection.
+    `extra_fields` are loaded even if not selected, e.g. to order or paginate.
+    """
+    optimizer = QueryOptimizer(info)
+    return optimizer.optimize(
+        queryset, optimizer.get_selection_sets(path), extra_fields=extra_fields
+    )
@@ -0,0 +1,103 @@
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+from graphene import relay
+from graphql import GraphQLError
+from graphql_relay.utils import base64, unbase64
+
+
+class KeysetPaginator(object):
+    """
+    Relay pagination over a queryset using (order field, primary key) cursors.
+
+    Pages are fetched with a `WHERE field >= value AND (field > value OR
+    (field = value AND pk > pk_value))` predicate (reversed when descending)
+    instead of an `OFFSET`. The first conjunct bounds the index range, so deep
+    pages start seeking at the cursor and cost the same as the first one as long
+    as an index covers the ordering.
+    """
+
+    def __init__(self, queryset, ordering):
+        self.queryset = queryset
+        self.descending = ordering.startswith("-")
+        self.field_name = ordering.lstrip("-")
+        self.field = queryset.model._meta.get_field(self.field_name)
+
+    def get_ordering(self, reverse=False):
+        descending = self.descending != reverse
+        prefix = "-" if descending else ""
+        return [prefix + self.field_name, prefix + "pk"]
+
+    def encode_cursor(self, obj):
+        value = self.field.value_to_string(obj)
+        return base64(json.dumps([self.field_name, value, obj.pk]))
+
+    def decode_cursor(self, cursor):
+        try:
+            field_name, value, pk = json.loads(unbase64(cursor))
+            if field_name != self.field_name:
+                raise ValueError(field_name)
+            return self.field.to_python(value), int(pk)
+        except (TypeError, ValueError, ValidationError):
+            raise GraphQLError('Invalid cursor "{}".'.format(cursor))
+
+    def _following(self, cursor, reverse=False):
+        value, pk = self.decode_cursor(cursor)
+        lookup, bound = ("lt", "lte") if self.descending != reverse else ("gt", "gte")
+        # The OR alone gives the database no bound to seek the index from.
+        return Q(**{self.field_name + "__" + bound: value}) & (
+            Q(**{self.field_name + "__" + lookup: value})
+            | Q(**{self.field_name: value, "pk__" + lookup: pk})
+        )
+
+    def paginate(self, first=None, after=None, last=None, before=None):
+        for name, size in (("first", first), ("last", last)):
+            if size is not None and size < 0:
+                raise GraphQLError('Argument "{}" must be a non-negative integer.'.format(name))
+
+        queryset = self.queryset
+        if after:
+            queryset = queryset.filter(self._following(after))
+        if before:
+            queryset = queryset.filter(self._following(before, reverse=True))
+
+        if first is None and last is not None:
+            last = min(last, settings.GRAPHQL_MAX_PAGE_SIZE)
+            items = list(queryset.order_by(*self.get_ordering(reverse=True))[: last + 1])
+            has_previous_page = len(items) > last
+            items = items[:last][::-1]
+            has_next_page = bool(before)
+        else:
+            if first is None:
+                first = settings.GRAPHQL_PAGE_SIZE
+            first = min(first, settings.GRAPHQL_MAX_PAGE_SIZE)
+            items = list(queryset.order_by(*self.get_ordering())[: first + 1])
+            has_next_page = len(items) > first
+            items = items[:first]
+            has_previous_page = bool(after)
+            if last is not None and len(items) > last:
+                items = items[len(items) - last :]
+                has_previous_page = True
+
+        return items, has_previous_page, has_next_page
+
+
+def connection_from_paginator(connection_type, paginator, **args):
+    items, has_previous_page, has_next_page = paginator.paginate(**args)
+    edges = [
+        connection_type.Edge(node=item, cursor=paginator.encode_cursor(item))
+        for item in items
+    ]
+
+    return connection_type(
+        edges=edges,
+        page_info=relay.PageInfo(
+            start_cursor=edges[0].cursor if edges else None,
+            end_cursor=edges[-1].cursor if edges else None,
+            has_previous_page=has_previous_page,
+            has_next_page=has_next_page,
+        ),
+    )
@@ -0,0 +1,274 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from functools import lru_cache, partial
+
+from django.conf import settings
+from django.core.cache import caches
+
+from graphql.backend.base import GraphQLDocument
+from graphql.backend.core import GraphQLCoreBackend
+from graphql.execution import ExecutionResult, execute
+from graphql.execution.utils import get_operation_root_type
+from graphql.language import ast
+from graphql.language.parser import parse
+from graphql.type.definition import get_named_type
+from graphql.utils.get_operation_ast import get_operation_ast
+from graphql.validation import validate
+
+from core import db_routing, incremental, tracing
+from core.flat_lists import get_plan
+
+
+def hash_query(query):
+    return hashlib.sha256(query.encode("utf-8")).hexdigest()
+
+
+class LRUCache(object):
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.items.get(key)
+            if value is not None:
+                self.items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.max_size:
+                self.items.popitem(last=False)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def _invalid_document(errors, **kwargs):
+    return ExecutionResult(errors=errors, invalid=True)
+
+
+def _selects_fields(schema, parent_type, selection_set, coordinates):
+    for selection in selection_set.selections:
+        if isinstance(selection, ast.FragmentSpread):
+            # Walked from its definition.
+            continue
+        if isinstance(selection, ast.InlineFragment):
+            type_ = parent_type
+            if selection.type_condition is not None:
+                type_ = schema.get_type(selection.type_condition.name.value)
+            if _selects_fields(schema, type_, selection.selection_set, coordinates):
+                return True
+            continue
+
+        name = selection.name.value
+        if "{}.{}".format(parent_type.name, name) in coordinates:
+            return True
+        if selection.selection_set is not None and not name.startswith("__"):
+            field_type = get_named_type(parent_type.fields[name].type)
+            if _selects_fields(schema, field_type, selection.selection_set, coordinates):
+                return True
+    return False
+
+
+def selects_fields(schema, document_ast, coordinates):
+    """
+    Returns whether any operation or fragment of the valid `document_ast`
+    selects one of the fields of `coordinates`, keyed by "Type.field".
+    """
+    for definition in document_ast.definitions:
+        if isinstance(definition, ast.OperationDefinition):
+            parent_type = get_operation_root_type(schema, definition)
+        elif isinstance(definition, ast.FragmentDefinition):
+            parent_type = schema.get_type(definition.type_condition.name.value)
+        else:
+            continue
+        if _selects_fields(schema, parent_type, definition.selection_set, coordinates):
+            return True
+    return False
+
+
+class CachedDocumentBackend(GraphQLCoreBackend):
+    """
+    Keeps parsed and validated documents in a bounded LRU cache per schema.
+
+    Validation runs once per document instead of once per request, documents
+    are then executed directly. With a `cost_analyzer`, documents too deep or
+    with too many aliases are invalid, and operations are checked against the
+    cost limits of the requesting client before running. With a
+    `flat_list_compiler`, queries of flat lists are compiled along with their
+    validation and executed from database rows, see `core.flat_lists`. Documents
+    using @defer or @stream are delivered incrementally to the clients accepting
+    it, see `core.incremental`. Documents selecting any of the `shared_fields`,
+    keyed by "Type.field", read data shared by every user: their
+    `reads_shared_data` attribute is set, see `core.response_cache`.
+    """
+
+    def __init__(
+        self,
+        cache_size=None,
+        executor=None,
+        cost_analyzer=None,
+        flat_list_compiler=None,
+        shared_fields=(),
+    ):
+        super(CachedDocumentBackend, self).__init__(executor=executor)
+        self.cache_size = cache_size or settings.GRAPHQL_DOCUMENT_CACHE_SIZE
+        self.cost_analyzer = cost_analyzer
+        self.flat_list_compiler = flat_list_compiler
+        self.shared_fields = frozenset(shared_fields)
+        self.caches = {}
+
+    def get_cache(self, schema):
+        cache = self.caches.get(schema)
+        if cache is None:
+            cache = self.caches.setdefault(schema, LRUCache(self.cache_size))
+        return cache
+
+    def document_from_string(self, schema, document_string):
+        if not isinstance(document_string, str):
+            return super(CachedDocumentBackend, self).document_from_string(
+                schema, document_string
+            )
+
+        cache = self.get_cache(schema)
+        key = hash_query(document_string)
+        document = cache.get(key)
+        if document is None:
+            document = self.build_document(schema, document_string)
+            cache.set(key, document)
+        return document
+
+    def build_document(self, schema, document_string):
+        with tracing.phase("parsing"):
+            document_ast = parse(document_string)
+        with tracing.phase("validation"):
+            validation_errors = validate(schema, document_ast)
+            if not validation_errors and self.cost_analyzer is not None:
+                validation_errors = self.cost_analyzer.validate(schema, document_ast)
+
+        reads_shared_data = False
+        if validation_errors:
+            execute_document = partial(_invalid_document, validation_errors)
+        else:
+            reads_shared_data = selects_fields(schema, document_ast, self.shared_fields)
+            plans = {}
+            if self.flat_list_compiler is not None:
+                plans = self.flat_list_compiler.compile(schema, document_ast)
+            execute_document = partial(
+                self.execute_document,
+                schema,
+                document_ast,
+                plans,
+                incremental.uses_incremental_delivery(document_ast),
+            )
+
+        document = GraphQLDocument(
+            schema=schema,
+            document_string=document_string,
+            document_ast=document_ast,
+            execute=execute_document,
+        )
+        document.reads_shared_data = reads_shared_data
+        return document
+
+    def execute_document(
+        self, schema, document_ast, flat_list_plans=None, deferrable=False, **execute_params
+    ):
+        context = execute_params.get("context_value", execute_params.get("context"))
+        operation_name = execute_params.get("operation_name")
+        extensions = {}
+        if self.cost_analyzer is not None:
+            # graphene-django still passes the deprecated `context` and `variables`.
+            extensions["cost"], error = self.cost_analyzer.check(
+                schema,
+                document_ast,
+                context,
+                operation_name,
+                execute_params.get("variable_values", execute_params.get("variables")),
+            )
+            if error is not None:
+                return ExecutionResult(errors=[error], extensions=extensions)
+
+        plan = None
+        # Clients which do not accept incremental delivery get complete results.
+        deferred = deferrable and getattr(context, "graphql_incremental", False)
+        if settings.GRAPHQL_FLAT_LISTS and not deferred:
+            plan = get_plan(flat_list_plans, document_ast, operation_name)
+        # Queries read from a replica, mutations from the primary they write to.
+        read_database = None
+        operation = get_operation_ast(document_ast, operation_name)
+        if operation is not None and operation.operation == "query":
+            read_database = db_routing.get_replica()
+
+        with db_routing.read_from(read_database), tracing.phase("execution"):
+            result = plan.execute(context) if plan is not None else None
+            if result is None and deferred:
+                result = incremental.IncrementalExecution(
+                    schema,
+                    document_ast,
+                    read_database=read_database,
+                    **dict(self.execute_params, **execute_params)
+                ).execute()
+            elif result is None:
+                result = execute(
+                    schema, document_ast, **dict(self.execute_params, **execute_params)
+                )
+        if isinstance(result, ExecutionResult):
+            result.extensions.update(extensions)
+        return result
+
+
+@lru_cache(maxsize=None)
+def load_manifest(path):
+    if not path:
+        return {}
+    with open(path) as manifest:
+        return json.load(manifest)
+
+
+class PersistedQueryStore(object):
+    """
+    Maps SHA-256 hashes to query documents.
+
+    Documents listed in the `GRAPHQL_PERSISTED_QUERIES_MANIFEST` JSON file are
+    registered at build time. When `GRAPHQL_PERSISTED_QUERIES_ONLY` is off,
+    clients may also register documents at runtime, following the Automatic
+    Persisted Queries protocol; those are kept in the cache for
+    `GRAPHQL_PERSISTED_QUERIES_TIMEOUT` seconds, and documents longer than
+    `GRAPHQL_PERSISTED_QUERIES_MAX_LENGTH` are not kept.
+    """
+
+    cache_key_prefix = "persisted_query:"
+
+    @property
+    def manifest(self):
+        return load_manifest(settings.GRAPHQL_PERSISTED_QUERIES_MANIFEST)
+
+    @property
+    def cache(self):
+        return caches[settings.GRAPHQL_PERSISTED_QUERIES_CACHE]
+
+    @property
+    def registered_only(self):
+        return settings.GRAPHQL_PERSISTED_QUERIES_ONLY
+
+    def get(self, query_hash):
+        query = self.manifest.get(query_hash)
+        if query is None and not self.registered_only:
+            query = self.cache.get(self.cache_key_prefix + query_hash)
+        return query
+
+    def register(self, query_hash, query):
+        if self.registered_only or len(query) > settings.GRAPHQL_PERSISTED_QUERIES_MAX_LENGTH:
+            return
+        self.cache.set(
+            self.cache_key_prefix + query_hash,
+            query,
+            timeout=settings.GRAPHQL_PERSISTED_QUERIES_TIMEOUT,
+        )
@@ -0,0 +1,100 @@
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+
+def get_cache():
+    return caches[settings.GRAPHQL_RESPONSE_CACHE]
+
+
+# Version of the responses built from data shared by every user, e.g. leaderboards
+# and the room catalogue.
+GLOBAL_SCOPE = "global"
+
+
+def get_version_key(scope):
+    return "graphql_response:version:{}".format(scope)
+
+
+def _new_version():
+    # Starting from the current time, a version evicted from the cache is never
+    # reused: responses cached before the eviction stay out of reach.
+    return int(time.time() * 1e6)
+
+
+def get_versions(*scopes):
+    cache = get_cache()
+    keys = [get_version_key(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if versions.get(key) is None:
+            cache.add(key, _new_version(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def get_user_version(user_id):
+    return get_versions(user_id)[0]
+
+
+def _bump_version(scope):
+    cache = get_cache()
+    try:
+        cache.incr(get_version_key(scope))
+    except ValueError:
+        cache.add(get_version_key(scope), _new_version(), None)
+
+
+def _invalidate(scope):
+    _bump_version(scope)
+    # A response computed before the commit could be cached under the new version,
+    # the version is bumped once more after it.
+    transaction.on_commit(lambda: _bump_version(scope))
+
+
+def invalidate_user_responses(user_id):
+    """
+    Drops the cached responses of a user, when data they can query changes.
+    """
+    _invalidate(user_id)
+
+
+def invalidate_global_responses():
+    """
+    Drops the cached responses of every user, when data shared by all of them
+    changes: leaderboard entries or rooms of the catalogue.
+    """
+    _invalidate(GLOBAL_SCOPE)
+
+
+def get_response_key(path, user_id, query_hash, operation_name, variables, shared=True):
+    """
+    Returns the cache key of a response. Responses to documents reading data
+    shared by every user, when `shared`, are also dropped when it changes.
+    """
+    versions = get_versions(user_id, GLOBAL_SCOPE) if shared else get_versions(user_id)
+    key = json.dumps(
+        [path, user_id, versions, query_hash, operation_name, variables], sort_keys=True
+    )
+    return "graphql_response:" + hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def make_etag(content):
+    return '"{}"'.format(hashlib.sha256(content).hexdigest())
+
+
+def get_cached_response(key):
+    """
+    Returns the ETag and the content of a cached response, or None.
+    """
+    return get_cache().get(key)
+
+
+def cache_response(key, content):
+    cached = (make_etag(content), content)
+    get_cache().set(key, cached, settings.GRAPHQL_RESPONSE_CACHE_TIMEOUT)
+    return cached
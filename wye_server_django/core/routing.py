@@ -0,0 +1,43 @@
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.urls import path
+from django.utils.http import is_same_domain
+
+from channels.auth import AuthMiddlewareStack
+from channels.http import AsgiHandler
+from channels.routing import ProtocolTypeRouter, URLRouter
+from channels.security.websocket import OriginValidator
+
+from core.consumers import GraphQLWSConsumer
+
+
+class ClientOriginValidator(OriginValidator):
+    """
+    Accepts the origins of CORS_ORIGIN_WHITELIST, which always have a scheme.
+
+    The pattern parsing of channels breaks with the `urlparse` of Python 3.9+.
+    """
+
+    def match_allowed_origin(self, parsed_origin, pattern):
+        if parsed_origin is None or parsed_origin.hostname is None:
+            return False
+        parsed_pattern = urlparse(pattern.lower())
+        return (
+            parsed_pattern.scheme == parsed_origin.scheme
+            and self.get_origin_port(parsed_pattern) == self.get_origin_port(parsed_origin)
+            and is_same_domain(parsed_origin.hostname, parsed_pattern.hostname)
+        )
+
+
+application = ProtocolTypeRouter({
+    # Django views run in a thread pool, as under WSGI.
+    "http": AsgiHandler,
+    # Sessions authenticate WebSockets, which must then come from the client.
+    "websocket": ClientOriginValidator(
+        AuthMiddlewareStack(URLRouter([
+            path("private_graphql/", GraphQLWSConsumer),
+        ])),
+        list(settings.CORS_ORIGIN_WHITELIST),
+    ),
+})
@@ -0,0 +1,42 @@
+from rx.subjects import Subject
+
+
+def publish(group, payload):
+    """
+    Sends `payload` to the subscriptions listening to `group`, from synchronous code.
+    """
+    try:
+        from asgiref.sync import async_to_sync
+        from channels.layers import get_channel_layer
+    except ImportError:
+        # Subscriptions are only served by the ASGI application, which requires
+        # channels: there is no one to notify without it.
+        return
+    channel_layer = get_channel_layer()
+    if channel_layer is not None:
+        async_to_sync(channel_layer.group_send)(
+            group, {"type": "graphql.event", "group": group, "payload": payload}
+        )
+
+
+class SubscriptionContext(object):
+    """
+    Context of the resolvers of a subscription, in place of the HTTP request.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.streams = {}
+
+    def stream(self, group):
+        """
+        Returns the observable of the events published to `group`.
+        """
+        stream = self.streams.get(group)
+        if stream is None:
+            stream = self.streams[group] = Subject()
+        return stream
+
+    def reset(self):
+        # Loaders must not serve the data of a previous event.
+        self.__dict__.pop("dataloaders", None)
@@ -0,0 +1,1464 @@
+import datetime
+import gzip
+import io
+import json
+import sys
+import tempfile
+import threading
+from contextlib import ExitStack
+from unittest import mock, skipIf
+
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import (
+    Client,
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.utils import timezone
+
+from core import db_routing, encoding, metrics, persisted_queries, response_cache
+from core.admin import EstimatedCountPaginator, iterate_in_chunks, list_dates
+from core.metrics import Histogram
+from core.gql_schema import document_backend, private_schema, schema
+from core.persisted_queries import LRUCache, hash_query
+from core.views import AsyncPrivateGraphQLView, AsyncWYEGraphQLView
+from core.warmup import warm_up
+from rooms.catalogue import get_rooms
+from rooms.models import EscapeRoomSession
+
+try:
+    from asgiref.sync import async_to_sync
+    from channels.db import database_sync_to_async
+    from channels.testing import HttpCommunicator, WebsocketCommunicator
+
+    from core.asgi import application
+except ImportError:
+    # The ASGI application requires channels, which the Pipfile does not install.
+    application = None
+
+
+class WYEDocumentCache(TestCase):
+    def setUp(self):
+        self.private_graph_url = "/private_graphql/"
+        get_user_model().objects.create_user(
+            email="romain@wye.com", pseudo="Romain", password="pass"
+        )
+
+        self.client.login(email="romain@wye.com", password="pass")
+
+    def test_parses_and_validates_a_document_once(self):
+        query = "{ whoami }"
+
+        with mock.patch.object(
+            persisted_queries, "validate", wraps=persisted_queries.validate
+        ) as validate:
+            for _ in range(3):
+                response = self.client.get(self.private_graph_url, {"query": query})
+                self.assertEqual(response.content, b'{"data":{"whoami":"I am romain@wye.com"}}')
+
+        self.assertLessEqual(validate.call_count, 1)
+        self.assertIsNotNone(document_backend.get_cache(private_schema).get(hash_query(query)))
+
+    def test_caches_validation_errors(self):
+        query = "{ unknownField }"
+
+        for _ in range(2):
+            response = self.client.get(self.private_graph_url, {"query": query})
+
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(
+                json.loads(response.content.decode())["errors"][0]["message"],
+                'Cannot query field "unknownField" on type "Query".',
+            )
+
+    def test_lru_cache_evicts_least_recently_used_documents(self):
+        documents = LRUCache(max_size=2)
+        documents.set("a", 1)
+        documents.set("b", 2)
+        documents.get("a")
+        documents.set("c", 3)
+
+        self.assertEqual(len(documents), 2)
+        self.assertIsNone(documents.get("b"))
+        self.assertEqual(documents.get("a"), 1)
+
+
+class WYEPersistedQueries(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.private_graph_url = "/private_graphql/"
+        self.query = "{ whoami }"
+        self.query_hash = hash_query(self.query)
+        get_user_model().objects.create_user(
+            email="romain@wye.com", pseudo="Romain", password="pass"
+        )
+
+        self.client.login(email="romain@wye.com", password="pass")
+
+    def get_persisted_query(self, query_hash):
+        extensions = {"persistedQuery": {"version": 1, "sha256Hash": query_hash}}
+        return self.client.get(self.private_graph_url, {"extensions": json.dumps(extensions)})
+
+    def post_persisted_query(self, query, query_hash):
+        return self.client.post(
+            self.private_graph_url,
+            json.dumps(
+                {
+                    "query": query,
+                    "extensions": {"persistedQuery": {"version": 1, "sha256Hash": query_hash}},
+                }
+            ),
+            content_type="application/json",
+        )
+
+    def test_registers_persisted_query_sent_after_a_miss(self):
+        response = self.get_persisted_query(self.query_hash)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'{"errors":[{"message":"PersistedQueryNotFound"}]}')
+
+        response = self.post_persisted_query(self.query, self.query_hash)
+        self.assertEqual(response.content, b'{"data":{"whoami":"I am romain@wye.com"}}')
+
+        response = self.get_persisted_query(self.query_hash)
+        self.assertEqual(response.content, b'{"data":{"whoami":"I am romain@wye.com"}}')
+
+    def test_does_not_register_invalid_query(self):
+        query = "{ unknownField }"
+        self.post_persisted_query(query, hash_query(query))
+
+        response = self.get_persisted_query(hash_query(query))
+        self.assertEqual(response.content, b'{"errors":[{"message":"PersistedQueryNotFound"}]}')
+
+    @override_settings(
+        GRAPHQL_PERSISTED_QUERIES_TIMEOUT=60, GRAPHQL_PERSISTED_QUERIES_MAX_LENGTH=20
+    )
+    def test_registers_queries_for_a_while_up_to_a_length(self):
+        with mock.patch.object(cache, "set", wraps=cache.set) as cache_set:
+            self.post_persisted_query(self.query, self.query_hash)
+        self.assertEqual(cache_set.call_args[1], {"timeout": 60})
+
+        query = "{ whoami %s}" % (" " * 20)
+        response = self.post_persisted_query(query, hash_query(query))
+        self.assertEqual(response.content, b'{"data":{"whoami":"I am romain@wye.com"}}')
+
+        response = self.get_persisted_query(hash_query(query))
+        self.assertEqual(response.content, b'{"errors":[{"message":"PersistedQueryNotFound"}]}')
+
+    def test_rejects_query_not_matching_its_hash(self):
+        response = self.post_persisted_query(self.query, hash_query("{ roomSessions { name } }"))
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_only_allows_registered_queries_when_configured(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".json") as manifest:
+            json.dump({self.query_hash: self.query}, manifest)
+            manifest.flush()
+
+            with override_settings(
+                GRAPHQL_PERSISTED_QUERIES_ONLY=True,
+                GRAPHQL_PERSISTED_QUERIES_MANIFEST=manifest.name,
+            ):
+                response = self.get_persisted_query(self.query_hash)
+                self.assertEqual(response.content, b'{"data":{"whoami":"I am romain@wye.com"}}')
+
+                response = self.client.get(self.private_graph_url, {"query": self.query})
+                self.assertEqual(response.status_code, 200)
+
+                response = self.client.get(
+                    self.private_graph_url, {"query": "{ roomSessions { name } }"}
+                )
+                self.assertEqual(response.status_code, 403)
+
+
+class WYEAsyncExecution(TransactionTestCase):
+    # Root fields are resolved on other threads, with database connections of their
+    # own: they would not see the data of a test wrapped in a transaction.
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.user = get_user_model().objects.create_user(
+            email="romain@wye.com", pseudo="Romain", password="pass"
+        )
+        EscapeRoomSession.objects.create(
+            name="Le Bunker",
+            played_datetime=timezone.make_aware(datetime.datetime(2019, 12, 1, 20, 0)),
+            duration_time=datetime.timedelta(minutes=50),
+            number_of_hints=2,
+            user=self.user,
+        )
+        self.private_view = AsyncPrivateGraphQLView.as_view(
+            schema=private_schema, backend=document_backend
+        )
+
+    def execute(self, view, query, **headers):
+        request = self.factory.post(
+            "/private_graphql/",
+            json.dumps({"query": query}),
+            content_type="application/json",
+            **headers
+        )
+        request.user = self.user
+        return view(request)
+
+    def test_resolves_root_fields_concurrently_in_resolver_threads(self):
+        threads = {}
+
+        def record_thread(field_name, resolve):
+            def resolver(root, info, **args):
+                threads[field_name] = threading.current_thread().name
+                return resolve(root, info, **args)
+
+            return resolver
+
+        # The schema holds the resolvers called, not the methods of the Query type.
+        fields = private_schema.get_query_type().fields
+        with ExitStack() as stack:
+            for field_name in ("whoami", "roomSessions", "roomStats"):
+                field = fields[field_name]
+                resolver = record_thread(field_name, field.resolver)
+                stack.enter_context(mock.patch.object(field, "resolver", resolver))
+            response = self.execute(
+                self.private_view,
+                "{ whoami roomSessions { name durationTime } roomStats { count } }",
+            )
+
+        self.assertEqual(
+            response.content,
+            b'{"data":{"whoami":"I am romain@wye.com",'
+            b'"roomSessions":[{"name":"Le Bunker","durationTime":3000.0}],'
+            b'"roomStats":{"count":1}}}',
+        )
+        self.assertEqual(set(threads), {"whoami", "roomSessions", "roomStats"})
+        for thread in threads.values():
+            self.assertTrue(thread.startswith("resolver"))
+
+    def test_executes_mutations_serially(self):
+        response = self.execute(
+            self.private_view,
+            'mutation { first: createRoomSession(name: "Le Loft", '
+            'playedDatetime: "2019-12-02T20:00:00+00:00", durationTime: 3600, numberOfHints: 0) '
+            "{ roomSession { name } } "
+            'second: createRoomSession(name: "La Cave", '
+            'playedDatetime: "2019-12-03T20:00:00+00:00", durationTime: 3600, numberOfHints: 0) '
+            "{ roomSession { name } } }",
+        )
+
+        self.assertEqual(
+            response.content,
+            b'{"data":{"first":{"roomSession":{"name":"Le Loft"}},'
+            b'"second":{"roomSession":{"name":"La Cave"}}}}',
+        )
+        self.assertEqual(EscapeRoomSession.objects.count(), 3)
+
+    def test_delivers_deferred_root_fields(self):
+        response = self.execute(
+            self.private_view,
+            "{ roomStats { count } ... @defer { whoami } }",
+            HTTP_ACCEPT="multipart/mixed",
+        )
+
+        self.assertEqual(
+            parse_multipart(response),
+            [
+                {"data": {"roomStats": {"count": 1}}, "hasNext": True},
+                {
+                    "incremental": [{"data": {"whoami": "I am romain@wye.com"}, "path": []}],
+                    "hasNext": False,
+                },
+            ],
+        )
+
+    def test_reports_errors_of_root_fields(self):
+        # An authenticated user without an email makes `whoami` raise.
+        self.user = mock.Mock(email=None)
+
+        response = self.execute(self.private_view, "{ whoami }")
+
+        content = json.loads(response.content.decode())
+        self.assertEqual(content["data"], {"whoami": None})
+        self.assertEqual(len(content["errors"]), 1)
+
+    @skipIf(application is None, "Requires channels.")
+    def test_asgi_application_serves_graphql(self):
+        async def post(path, body):
+            communicator = HttpCommunicator(
+                application,
+                "POST",
+                path,
+                body=json.dumps(body).encode(),
+                headers=[(b"host", b"testserver"), (b"content-type", b"application/json")],
+            )
+            return await communicator.get_response()
+
+        response = async_to_sync(post)(
+            "/graphql/",
+            {
+                "query": 'mutation { loginUser(email: "romain@wye.com", password: "wrong") '
+                "{ user { pseudo } } }"
+            },
+        )
+
+        self.assertEqual(response["status"], 200)
+        self.assertEqual(response["body"], b'{"data":{"loginUser":{"user":null}}}')
+
+
+class WYEQueryCost(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.private_graph_url = "/private_graphql/"
+        get_user_model().objects.create_user(
+            email="romain@wye.com", pseudo="Romain", password="pass"
+        )
+
+        self.client.login(email="romain@wye.com", password="pass")
+
+    def post_query(self, query, variables=None, extensions=None):
+        return self.client.post(
+            self.private_graph_url,
+            json.dumps({"query": query, "variables": variables, "extensions": extensions}),
+            content_type="application/json",
+        )
+
+    def get_error(self, response):
+        return json.loads(response.content.decode())["errors"][0]["message"]
+
+    def test_reports_cost_in_extensions_when_asked(self):
+        query = """
+            query($first: Int) {
+                roomSessionsConnection(first: $first) { edges { node { name } } }
+            }
+        """
+
+        response = self.post_query(query, {"first": 5}, {"cost": True})
+        self.assertEqual(
+            json.loads(response.content.decode())["extensions"]["cost"],
+            {
+                "requestedQueryCost": 15,
+                "maximumAvailable": 5000,
+                "throttleStatus": {
+                    "currentlyAvailable": 49985,
+                    "maximumAvailable": 50000,
+                    "restoreRate": 500,
+                },
+            },
+        )
+
+        response = self.post_query(query, {"first": 50})
+        self.assertEqual(
+            response.content, b'{"data":{"roomSessionsConnection":{"edges":[]}}}'
+        )
+
+    def test_rejects_expensive_operation_before_running_it(self):
+        query = "{ roomSessions { user { escaperoomsessionSet { user { pseudo } } } } }"
+        self.post_query("{ whoami }")
+
+        with self.assertNumQueries(0):
+            response = self.post_query(query)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get_error(response), "Query cost is 20200, the maximum is 5000.")
+
+    def test_rejects_too_deep_documents(self):
+        response = self.post_query(
+            "{ roomSessions { user { escaperoomsessionSet { user { escaperoomsessionSet {"
+            " user { escaperoomsessionSet { user { escaperoomsessionSet { user { email }"
+            " } } } } } } } } } }"
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.get_error(response), "Operation has a depth of 11, the maximum is 10.")
+
+    def test_rejects_documents_with_too_many_aliases(self):
+        fields = " ".join("whoami{}: whoami".format(index) for index in range(31))
+
+        response = self.post_query("{ " + fields + " }")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.get_error(response), "Document has 31 aliases, the maximum is 30.")
+
+    @override_settings(GRAPHQL_COST_BUDGET=(20, 0.001))
+    def test_throttles_clients_exceeding_their_budget(self):
+        query = "{ roomSessionsConnection(first: 5) { edges { node { name } } } }"
+
+        response = self.post_query(query)
+        self.assertEqual(
+            response.content, b'{"data":{"roomSessionsConnection":{"edges":[]}}}'
+        )
+
+        response = self.post_query(query)
+        self.assertEqual(
+            self.get_error(response), "Query cost budget exhausted, please retry later."
+        )
+
+
+class WYETracing(TestCase):
+    def setUp(self):
+        self.private_graph_url = "/private_graphql/"
+        get_user_model().objects.create_user(
+            email="romain@wye.com", pseudo="Romain", password="pass"
+        )
+
+        self.client.login(email="romain@wye.com", password="pass")
+
+    def post_query(self, query, extensions=None):
+        return self.client.post(
+            self.private_graph_url,
+            json.dumps({"query": query, "extensions": extensions}),
+            content_type="application/json",
+        )
+
+    def test_reports_trace_in_extensions_when_asked(self):
+        # Warms up the session and user caches.
+        self.post_query("{ whoami }")
+
+        response = self.post_query(
+            "{ whoami roomSessions { name } }", {"tracing": True}
+        )
+
+        content = json.loads(response.content.decode())
+        self.assertEqual(content["data"], {"whoami": "I am romain@wye.com", "roomSessions": []})
+        trace = content["extensions"]["tracing"]
+        self.assertEqual(trace["version"], 1)
+        self.assertEqual(trace["sql"]["count"], 1)
+        self.assertGreater(trace["execution"]["duration"], 0)
+        self.assertEqual(
+            [
+                (resolver["path"], resolver["parentType"], resolver["returnType"])
+                for resolver in trace["execution"]["resolvers"]
+            ],
+            [
+                (["whoami"], "Query", "String"),
+                (["roomSessions"], "Query", "[EscapeRoomSessionType]"),
+            ],
+        )
+        self.assertLessEqual(
+            trace["execution"]["startOffset"], trace["execution"]["resolvers"][0]["startOffset"]
+        )
+
+    def test_samples_traces_for_metrics_only(self):
+        with override_settings(GRAPHQL_TRACING_SAMPLE_RATE=1.0, METRICS_TOKEN="secret"):
+            response = self.post_query("{ whoami }")
+            self.assertEqual(response.content, b'{"data":{"whoami":"I am romain@wye.com"}}')
+
+            response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer secret")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/plain; version=0.0.4; charset=utf-8")
+        self.assertIn(
+            'graphql_resolver_duration_seconds_count{parent_type="Query",field="whoami"}',
+            response.content.decode(),
+        )
+        self.assertIn(
+            'graphql_request_duration_seconds_count{endpoint="/private_graphql/"}',
+            response.content.decode(),
+        )
+
+    def test_metrics_require_token(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 404)
+
+        with override_settings(METRICS_TOKEN="secret"):
+            response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer guess")
+            self.assertEqual(response.status_code, 401)
+
+    def test_renders_histograms_in_prometheus_format(self):
+        histogram = Histogram(
+            "test_duration_seconds", "Test.", ("phase",), buckets=(0.1, 1), registry=[]
+        )
+        histogram.observe(0.05, "parsing")
+        histogram.observe(0.5, "parsing")
+        histogram.observe(2, "parsing")
+
+        self.assertEqual(
+            list(histogram.collect()),
+            [
+                "# HELP test_duration_seconds Test.",
+                "# TYPE test_duration_seconds histogram",
+                'test_duration_seconds_bucket{phase="parsing",le="0.1"} 1',
+                'test_duration_seconds_bucket{phase="parsing",le="1"} 2',
+                'test_duration_seconds_bucket{phase="parsing",le="+Inf"} 3',
+                'test_duration_seconds_sum{phase="parsing"} 2.55',
+                'test_duration_seconds_count{phase="parsing"} 3',
+            ],
+        )
+
+    def test_renders_the_sum_of_the_histograms_of_every_process(self):
+        registries = [[], []]
+        for registry, value in zip(registries, (0.05, 0.5)):
+            histogram = Histogram(
+                "test_duration_seconds", "Test.", ("phase",), buckets=(0.1, 1), registry=registry
+            )
+            histogram.observe(value, "parsing")
+
+        with tempfile.TemporaryDirectory() as directory:
+            for pid, registry in enumerate(registries):
+                metrics.write(directory, registry, pid=pid)
+            lines = metrics.render(registries[0], directory).splitlines()
+
+        self.assertEqual(
+            lines[2:],
+            [
+                'test_duration_seconds_bucket{phase="parsing",le="0.1"} 1',
+                'test_duration_seconds_bucket{phase="parsing",le="1"} 2',
+                'test_duration_seconds_bucket{phase="parsing",le="+Inf"} 2',
+                'test_duration_seconds_sum{phase="parsing"} 0.55',
+                'test_duration_seconds_count{phase="parsing"} 2',
+            ],
+        )
+
+
+class WYEResponseCache(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.private_graph_url = "/private_graphql/"
+        self.query = "{ roomSessions { name } }"
+        self.user = get_user_model().objects.create_user(
+            email="romain@wye.com", pseudo="Romain", password="pass"
+        )
+
+        self.client.login(email="romain@wye.com", password="pass")
+
+    def create_room_session(self, name):
+        return self.client.post(
+            self.private_graph_url,
+            json.dumps(
+                {
+                    "query": 'mutation { createRoomSession(name: "%s", '
+                    'playedDatetime: "2019-12-01T20:00:00+00:00", durationTime: 3000, '
+                    "numberOfHints: 2) { roomSession { name } } }" % name
+                }
+            ),
+            content_type="application/json",
+        )
+
+    def test_serves_repeated_queries_from_the_cache(self):
+        self.create_room_session("Le Bunker")
+        response = self.client.get(self.private_graph_url, {"query": self.query})
+        self.assertEqual(response.content, b'{"data":{"roomSessions":[{"name":"Le Bunker"}]}}')
+
+        with self.assertNumQueries(0):
+            cached_response = self.client.get(self.private_graph_url, {"query": self.query})
+
+        self.assertEqual(cached_response.content, response.content)
+        self.assertEqual(cached_response["ETag"], response["ETag"])
+        self.assertEqual(cached_response["Cache-Control"], "private, no-cache")
+
+    def test_answers_not_modified_to_fresh_etags(self):
+        response = self.client.get(self.private_graph_url, {"query": self.query})
+
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                self.private_graph_url, {"query": self.query}, HTTP_IF_NONE_MATCH=response["ETag"]
+            )
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+    def test_room_session_changes_invalidate_responses(self):
+        response = self.client.get(self.private_graph_url, {"query": self.query})
+        self.assertEqual(response.content, b'{"data":{"roomSessions":[]}}')
+
+        self.create_room_session("Le Bunker")
+        response = self.client.get(
+            self.private_graph_url, {"query": self.query}, HTTP_IF_NONE_MATCH=response["ETag"]
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'{"data":{"roomSessions":[{"name":"Le Bunker"}]}}')
+
+        EscapeRoomSession.objects.update(name="Le Loft")
+        EscapeRoomSession.objects.get().save()
+        response = self.client.get(self.private_graph_url, {"query": self.query})
+        self.assertEqual(response.content, b'{"data":{"roomSessions":[{"name":"Le Loft"}]}}')
+
+    def test_caches_responses_per_user_and_variables(self):
+        query = """
+            query($first: Int) {
+                roomSessionsConnection(first: $first) { edges { node { name } } }
+            }
+        """
+        self.create_room_session("Le Bunker")
+        self.create_room_session("Le Loft")
+
+        for first in (1, 2):
+            response = self.client.get(
+                self.private_graph_url, {"query": query, "variables": json.dumps({"first": first})}
+            )
+            content = json.loads(response.content.decode())
+            self.assertEqual(len(content["data"]["roomSessionsConnection"]["edges"]), first)
+
+        get_user_model().objects.create_user(email="remi@wye.com", pseudo="Remi", password="pass")
+        self.client.login(email="remi@wye.com", password="pass")
+        response = self.client.get(self.private_graph_url, {"query": self.query})
+        self.assertEqual(response.content, b'{"data":{"roomSessions":[]}}')
+
+    def test_sessions_of_other_users_invalidate_leaderboard_responses(self):
+        query = "{ leaderboard(metric: DURATION_TIME) { top(first: 5) { pseudo } } }"
+        response = self.client.get(self.private_graph_url, {"query": query})
+        self.assertEqual(response.content, b'{"data":{"leaderboard":{"top":[]}}}')
+
+        other_user = get_user_model().objects.create_user(
+            email="remi@wye.com", pseudo="Remi", password="pass"
+        )
+        EscapeRoomSession.objects.create(
+            name="Le Bunker",
+            played_datetime=timezone.now(),
+            duration_time=datetime.timedelta(minutes=50),
+            number_of_hints=0,
+            user=other_user,
+        )
+
+        response = self.client.get(
+            self.private_graph_url, {"query": query}, HTTP_IF_NONE_MATCH=response["ETag"]
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'{"data":{"leaderboard":{"top":[{"pseudo":"Remi"}]}}}')
+
+    def test_changes_of_shared_data_keep_the_responses_of_users(self):
+        self.client.get(self.private_graph_url, {"query": self.query})
+        leaderboard_query = "{ leaderboard(metric: DURATION_TIME) { top(first: 5) { pseudo } } }"
+        self.client.get(self.private_graph_url, {"query": leaderboard_query})
+
+        response_cache.invalidate_global_responses()
+
+        with self.assertNumQueries(0):
+            self.client.get(self.private_graph_url, {"query": self.query})
+        with self.assertNumQueries(1):
+            # Only the leaderboard is read again, the session is cached.
+            self.client.get(self.private_graph_url, {"query": leaderboard_query})
+
+    def test_finds_shared_data_in_fragments_and_nested_fields(self):
+        for query, reads_shared_data in (
+            ("{ roomSessions { name } }", False),
+            ("{ roomSessions { room { name } } }", True),
+            ("{ ...Rooms } fragment Rooms on Query { searchRooms(prefix: \"B\") { name } }", True),
+        ):
+            document = document_backend.document_from_string(private_schema, query)
+            self.assertEqual(document.reads_shared_data, reads_shared_data)
+
+    def test_does_not_cache_errors(self):
+        whoami = private_schema.get_query_type().fields["whoami"]
+        with mock.patch.object(whoami, "resolver", side_effect=Exception("Unavailable")):
+            response = self.client.get(self.private_graph_url, {"query": "{ whoami }"})
+        self.assertIn(b'"errors"', response.content)
+        self.assertNotIn("ETag", response)
+
+        response = self.client.get(self.private_graph_url, {"query": "{ whoami }"})
+        self.assertEqual(response.content, b'{"data":{"whoami":"I am romain@wye.com"}}')
+
+
+@override_settings(GRAPHQL_WS_KEEPALIVE_INTERVAL=0)
+@skipIf(application is None, "Requires channels.")
+class WYESubscriptions(TransactionTestCase):
+    # Events are published once the transaction creating the session is committed.
+
+    subscription = {
+        "type": "start",
+        "id": "1",
+        "payload": {"query": "subscription { roomSessionCreated { name user { pseudo } } }"},
+    }
+
+    def setUp(self):
+        get_user_model().objects.create_user(
+            email="romain@wye.com", pseudo="Romain", password="pass"
+        )
+        get_user_model().objects.create_user(email="remi@wye.com", pseudo="Remi", password="pass")
+
+    def log_in(self, email):
+        client = Client()
+        client.login(email=email, password="pass")
+        return client
+
+    def get_communicator(self, client, origin=b"https://wyedomain.com"):
+        return WebsocketCommunicator(
+            application,
+            "/private_graphql/",
+            headers=[
+                (b"origin", origin),
+                (b"cookie", "sessionid={}".format(client.cookies["sessionid"].value).encode()),
+            ],
+            subprotocols=["graphql-ws"],
+        )
+
+    async def subscribe(self, communicator):
+        connected, subprotocol = await communicator.connect()
+        self.assertTrue(connected)
+        self.assertEqual(subprotocol, "graphql-ws")
+        await communicator.send_json_to({"type": "connection_init", "payload": {}})
+        self.assertEqual(await communicator.receive_json_from(), {"type": "connection_ack"})
+        await communicator.send_json_to(self.subscription)
+        # Lets the subscription join its group before sessions get created.
+        await communicator.receive_nothing()
+
+    async def create_room_session(self, client, name):
+        await database_sync_to_async(client.post)(
+            "/private_graphql/",
+            json.dumps(
+                {
+                    "query": 'mutation { createRoomSession(name: "%s", '
+                    'playedDatetime: "2019-12-01T20:00:00+00:00", durationTime: 3000, '
+                    "numberOfHints: 2) { roomSession { name } } }" % name
+                }
+            ),
+            content_type="application/json",
+        )
+
+    def test_notifies_every_device_of_the_user(self):
+        phone, desktop = self.log_in("romain@wye.com"), self.log_in("romain@wye.com")
+
+        async def scenario():
+            communicators = [self.get_communicator(phone), self.get_communicator(desktop)]
+            for communicator in communicators:
+                await self.subscribe(communicator)
+
+            await self.create_room_session(desktop, "Le Bunker")
+
+            for communicator in communicators:
+                self.assertEqual(
+                    await communicator.receive_json_from(),
+                    {
+                        "type": "data",
+                        "id": "1",
+                        "payload": {
+                            "data": {
+                                "roomSessionCreated": {
+                                    "name": "Le Bunker",
+                                    "user": {"pseudo": "Romain"},
+                                }
+                            }
+                        },
+                    },
+                )
+                await communicator.send_json_to({"type": "stop", "id": "1"})
+                self.assertEqual(
+                    await communicator.receive_json_from(), {"type": "complete", "id": "1"}
+                )
+                await communicator.disconnect()
+
+        async_to_sync(scenario)()
+
+    def test_does_not_notify_other_users(self):
+        romain, remi = self.log_in("romain@wye.com"), self.log_in("remi@wye.com")
+
+        async def scenario():
+            communicator = self.get_communicator(romain)
+            await self.subscribe(communicator)
+
+            await self.create_room_session(remi, "Le Loft")
+
+            self.assertTrue(await communicator.receive_nothing())
+            await communicator.disconnect()
+
+        async_to_sync(scenario)()
+
+    def test_rejects_invalid_subscriptions(self):
+        client = self.log_in("romain@wye.com")
+
+        async def scenario():
+            communicator = self.get_communicator(client)
+            await communicator.connect()
+            await communicator.send_json_to(
+                {"type": "start", "id": "1", "payload": {"query": "{ whoami }"}}
+            )
+            self.assertEqual(
+                await communicator.receive_json_from(),
+                {
+                    "type": "error",
+                    "id": "1",
+                    "payload": {"message": "Only subscriptions are served over WebSockets."},
+                },
+            )
+            await communicator.disconnect()
+
+        async_to_sync(scenario)()
+
+    def test_rejects_anonymous_and_cross_origin_connections(self):
+        client = self.log_in("romain@wye.com")
+
+        async def scenario():
+            communicator = self.get_communicator(client, origin=b"https://evil.com")
+            connected, _ = await communicator.connect()
+            self.assertFalse(connected)
+
+            anonymous = Client()
+            anonymous.cookies["sessionid"] = "unknown"
+            communicator = self.get_communicator(anonymous)
+            connected, _ = await communicator.connect()
+            self.assertFalse(connected)
+
+        async_to_sync(scenario)()
+
+
+class WYEWithoutChannels(TestCase):
+    def test_creates_room_sessions_without_channels(self):
+        get_user_model().objects.create_user(
+            email="romain@wye.com", pseudo="Romain", password="pass"
+        )
+        self.client.login(email="romain@wye.com", password="pass")
+
+        # Imports of modules set to None fail.
+        with mock.patch.dict(sys.modules, {"asgiref.sync": None, "channels.layers": None}):
+            response = self.client.post(
+                "/private_graphql/",
+                json.dumps(
+                    {
+                        "query": 'mutation { createRoomSession(name: "Le Bunker", '
+                        'playedDatetime: "2019-12-01T20:00:00+00:00", durationTime: 3000, '
+                        "numberOfHints: 2) { roomSession { name } } }"
+                    }
+                ),
+                content_type="application/json",
+            )
+
+        self.assertEqual(
+            response.content, b'{"data":{"createRoomSession":{"roomSession":{"name":"Le Bunker"}}}}'
+        )
+
+
+@override_settings(DATABASE_REPLICAS=["replica_0"])
+class WYEReadReplicas(TestCase):
+    def setUp(self):
+        # Refills the query cost budget, spent by expensive queries.
+        cache.clear()
+        self.private_graph_url = "/private_graphql/"
+        get_user_model().objects.create_user(
+            email="romain@wye.com", pseudo="Romain", password="pass"
+        )
+
+        self.client.login(email="romain@wye.com", password="pass")
+
+    def post(self, query, method="post"):
+        # Records the database each read is routed to; they all actually run on
+        # the test database.
+        databases = []
+        with mock.patch(
+            "core.db_routing.ReplicaRouter.db_for_read",
+            autospec=True,
+            side_effect=lambda router, model, **hints: databases.append(
+                db_routing.get_read_database()
+            ),
+        ):
+            if method == "get":
+                response = self.client.get(self.private_graph_url, {"query": query})
+            else:
+                response = self.client.post(
+                    self.private_graph_url,
+                    json.dumps({"query": query}),
+                    content_type="application/json",
+                )
+        self.assertNotIn(b'"errors"', response.content)
+        return response, databases
+
+    def create_room_session(self):
+        return self.post(
+            """
+            mutation {
+              createRoomSession(name: "Le Bunker", playedDatetime: "2001-01-01T12:00:00+00:00", durationTime: 1200.0, numberOfHints: 0) {
+                roomSession { name }
+              }
+            }
+            """
+        )
+
+    def test_queries_read_from_a_replica(self):
+        response, databases = self.post("{ roomSessions { name user { pseudo } } }")
+
+        self.assertIn("replica_0", databases)
+        self.assertNotIn("primary_until", response.cookies)
+
+    def test_mutations_read_from_the_primary(self):
+        response, databases = self.create_room_session()
+
+        self.assertTrue(databases)
+        self.assertEqual(set(databases), {None})
+
+    def test_clients_read_from_the_primary_after_writing(self):
+        response, _ = self.create_room_session()
+        self.assertIn("primary_until", response.cookies)
+
+        response, databases = self.post("{ roomSessions { name } }")
+
+        self.assertTrue(databases)
+        self.assertEqual(set(databases), {None})
+
+    def test_clients_read_from_replicas_again_after_the_stickiness_window(self):
+        self.create_room_session()
+        with mock.patch("core.db_routing.time.time", return_value=timezone.now().timestamp() + 11):
+            response, databases = self.post("{ roomSessions { name } }")
+
+        self.assertIn("replica_0", databases)
+
+    def test_responses_read_from_a_replica_are_not_cached(self):
+        self.post("{ roomSessions { name } }", method="get")
+
+        response, databases = self.post("{ roomSessions { name } }", method="get")
+
+        self.assertIn("replica_0", databases)
+
+    def test_responses_read_from_the_primary_are_cached(self):
+        self.create_room_session()
+        self.post("{ roomSessions { name } }", method="get")
+
+        response, databases = self.post("{ roomSessions { name } }", method="get")
+
+        self.assertEqual(databases, [])
+
+    @override_settings(
+        CACHES={
+            "default": {
+                "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+                "LOCATION": "wye_cache",
+            }
+        }
+    )
+    def test_writes_to_a_database_cache_do_not_pin_clients(self):
+        call_command("createcachetable", stdout=io.StringIO())
+
+        response, databases = self.post("{ roomSessions { name } }")
+
+        self.assertIn("replica_0", databases)
+        self.assertNotIn("primary_until", response.cookies)
+        with db_routing.read_from("replica_0"):
+            self.assertEqual(Session.objects.all().db, "default")
+
+    def test_writes_go_to_the_primary(self):
+        with db_routing.read_from("replica_0"):
+            self.assertEqual(EscapeRoomSession.objects.all().db, "replica_0")
+            session = EscapeRoomSession(name="Le Bunker")
+            session._state.db = "replica_0"
+            self.assertEqual(
+                db_routing.ReplicaRouter().db_for_write(EscapeRoomSession, instance=session),
+                "default",
+            )
+        self.assertEqual(EscapeRoomSession.objects.all().db, "default")
+
+    def test_unusable_connections_are_closed(self):
+        connection.ensure_connection()
+        # Not checked by previous requests yet.
+        with mock.patch.object(db_routing._state, "checked_at", {}, create=True):
+            with mock.patch.object(connection, "is_usable", return_value=False), mock.patch.object(
+                connection, "close"
+            ) as close:
+                db_routing.check_connections()
+        self.assertTrue(close.called)
+
+    def test_connections_are_checked_once_per_interval(self):
+        connection.ensure_connection()
+        with mock.patch.object(
+            db_routing._state, "checked_at", {}, create=True
+        ), mock.patch.object(
+            connection, "is_usable", return_value=True
+        ) as is_usable, mock.patch.object(
+            connection, "close"
+        ) as close:
+            for now in (1000, 1005, 1011):
+                with mock.patch("core.db_routing.time.monotonic", return_value=now):
+                    db_routing.check_connections()
+
+        self.assertEqual(is_usable.call_count, 2)
+        self.assertFalse(close.called)
+
+
+class WYEBenchmark(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_measures_the_scenarios_in_process(self):
+        stdout = io.StringIO()
+        with tempfile.NamedTemporaryFile("r", suffix=".json") as output:
+            call_command(
+                "benchmark",
+                yes_i_know=True,
+                users=3,
+                sessions=4,
+                requests=6,
+                warmup=1,
+                output=output.name,
+                compare=output.name,
+                stdout=stdout,
+            )
+            report = json.load(output)
+
+        self.assertEqual(report["mode"], "in-process")
+        self.assertEqual(
+            sorted(report["scenarios"]),
+            ["createRoomSession", "login", "roomSessions", "rootFields", "whoami"],
+        )
+        for name, result in report["scenarios"].items():
+            self.assertEqual(result["requests"], 6, name)
+            self.assertEqual(result["errors"], 0, result["first_error"])
+            self.assertGreater(result["requests_per_second"], 0)
+            self.assertLessEqual(result["latency_ms"]["p50"], result["latency_ms"]["p99"])
+            self.assertIsNotNone(result["sql_queries_per_request"])
+        self.assertGreater(report["scenarios"]["createRoomSession"]["sql_queries_per_request"], 0)
+        # Generated sessions, then one per request of createRoomSession and its warm up.
+        self.assertEqual(EscapeRoomSession.objects.count(), 3 * 4 + 6 + 1)
+        self.assertIn("Compared with", stdout.getvalue())
+        self.assertIn("req/s +0.0%", stdout.getvalue())
+
+    def test_tops_up_the_sessions_of_previous_runs(self):
+        options = {"yes_i_know": True, "users": 2, "requests": 1, "scenario": ["whoami"]}
+        call_command("benchmark", sessions=3, stdout=io.StringIO(), **options)
+        call_command("benchmark", sessions=5, stdout=io.StringIO(), **options)
+
+        self.assertEqual(EscapeRoomSession.objects.count(), 2 * 5)
+
+    def test_refuses_to_run_without_debug(self):
+        with self.assertRaisesMessage(CommandError, "--yes-i-know"):
+            call_command("benchmark", stdout=io.StringIO())
+
+    def test_runs_the_asgi_application_through_gunicorn_only(self):
+        with self.assertRaisesMessage(CommandError, "--gunicorn"):
+            call_command("benchmark", yes_i_know=True, asgi=True, stdout=io.StringIO())
+
+
+class WYEWarmUp(SimpleTestCase):
+    def test_warms_up_without_querying_the_database(self):
+        # Database queries fail in SimpleTestCase.
+        warm_up()
+
+        response = Client().post(
+            "/graphql/",
+            json.dumps({"query": "mutation { __typename }"}),
+            content_type="application/json",
+        )
+        self.assertEqual(response.json(), {"data": {"__typename": "Mutation"}})
+
+
+class WYEBatchedOperations(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.private_graph_url = "/private_graphql/"
+        self.user = get_user_model().objects.create_user(
+            email="romain@wye.com", pseudo="Romain", password="pass"
+        )
+
+        self.client.login(email="romain@wye.com", password="pass")
+
+    def post_batch(self, operations):
+        return self.client.post(
+            self.private_graph_url, json.dumps(operations), content_type="application/json"
+        )
+
+    def test_answers_the_results_of_operations_in_order(self):
+        response = self.post_batch(
+            [
+                {
+                    "id": "create",
+                    "query": 'mutation { createRoomSession(name: "Le Bunker", '
+                    'playedDatetime: "2019-12-01T20:00:00+00:00", durationTime: 3000, '
+                    "numberOfHints: 2) { roomSession { name } } }",
+                },
+                {"id": "list", "query": "{ whoami roomSessions { name } }"},
+            ]
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(),
+            [
+                {
+                    "data": {"createRoomSession": {"roomSession": {"name": "Le Bunker"}}},
+                    "id": "create",
+                    "status": 200,
+                },
+                {
+                    "data": {
+                        "whoami": "I am romain@wye.com",
+                        "roomSessions": [{"name": "Le Bunker"}],
+                    },
+                    "id": "list",
+                    "status": 200,
+                },
+            ],
+        )
+
+    def test_failed_operations_do_not_fail_the_batch(self):
+        response = self.post_batch(
+            [
+                {"query": "{ whoami }", "extensions": {"cost": True}},
+                {"extensions": {"persistedQuery": {"version": 1, "sha256Hash": "unknown"}}},
+                {"query": "{ unknownField }"},
+            ]
+        )
+
+        whoami, persisted_query, invalid = response.json()
+        self.assertEqual(whoami["data"], {"whoami": "I am romain@wye.com"})
+        self.assertIn("cost", whoami["extensions"])
+        self.assertEqual(
+            persisted_query,
+            {"errors": [{"message": "PersistedQueryNotFound"}], "id": None, "status": 200},
+        )
+        self.assertNotIn("extensions", persisted_query)
+        self.assertEqual(invalid["status"], 400)
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(GRAPHQL_MAX_BATCH_SIZE=2)
+    def test_limits_the_size_of_batches(self):
+        response = self.post_batch([{"query": "{ whoami }"}] * 3)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json(), {"errors": [{"message": "Batches are limited to 2 operations."}]}
+        )
+
+    def test_operations_share_the_request(self):
+        self.post_batch([{"query": "{ whoami }"}])
+
+        # One query per operation, the session and user are not loaded again.
+        with self.assertNumQueries(2):
+            self.post_batch([{"query": "{ roomSessions { name } }"}] * 2)
+
+
+def parse_multipart(response):
+    """
+    Returns the JSON parts of an incremental response.
+    """
+    content = b"".join(response.streaming_content).decode()
+    assert content.endswith("\r\n-----\r\n")
+    return [
+        json.loads(part.split("\r\n\r\n", 1)[1])
+        for part in content[: -len("\r\n-----\r\n")].split("\r\n---\r\n")[1:]
+    ]
+
+
+def merge_payloads(parts):
+    """
+    Returns the data of the parts of an incremental response, merged.
+    """
+    data = parts[0]["data"]
+    for part in parts[1:]:
+        for payload in part.get("incremental", ()):
+            if "items" in payload:
+                target = data
+                for key in payload["path"][:-1]:
+                    target = target[key]
+                target.extend(payload["items"])
+            else:
+                target = data
+                for key in payload["path"]:
+                    target = target[key]
+                target.update(payload["data"])
+    return data
+
+
+class WYEIncrementalDelivery(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.private_graph_url = "/private_graphql/"
+        self.user = get_user_model().objects.create_user(
+            email="romain@wye.com", pseudo="Romain", password="pass"
+        )
+        for index in range(5):
+            EscapeRoomSession.objects.create(
+                name="Room {}".format(index),
+                played_datetime=timezone.now(),
+                duration_time=datetime.timedelta(minutes=40 + index),
+                number_of_hints=index,
+                user=self.user,
+            )
+
+        self.client.login(email="romain@wye.com", password="pass")
+
+    def post(self, query, variables=None, accept="multipart/mixed, application/json"):
+        return self.client.post(
+            self.private_graph_url,
+            json.dumps({"query": query, "variables": variables}),
+            content_type="application/json",
+            HTTP_ACCEPT=accept,
+        )
+
+    def test_delivers_deferred_fragments_after_the_rest(self):
+        query = """
+            {
+              whoami
+              ... on Query @defer(label: "stats") { roomStats { count } }
+            }
+        """
+        response = self.post(query)
+
+        self.assertEqual(
+            response["Content-Type"], 'multipart/mixed; boundary="-"; deferSpec=20220824'
+        )
+        self.assertEqual(
+            parse_multipart(response),
+            [
+                {"data": {"whoami": "I am romain@wye.com"}, "hasNext": True},
+                {
+                    "incremental": [
+                        {"data": {"roomStats": {"count": 5}}, "path": [], "label": "stats"}
+                    ],
+                    "hasNext": False,
+                },
+            ],
+        )
+
+    @override_settings(GRAPHQL_STREAM_BATCH_SIZE=2)
+    def test_streams_the_items_of_lists(self):
+        response = self.post("{ roomSessions @stream(initialCount: 1) { name } }")
+
+        parts = parse_multipart(response)
+        self.assertEqual(
+            parts[0], {"data": {"roomSessions": [{"name": "Room 0"}]}, "hasNext": True}
+        )
+        self.assertEqual(
+            parts[1:],
+            [
+                {
+                    "incremental": [
+                        {
+                            "items": [{"name": "Room 1"}, {"name": "Room 2"}],
+                            "path": ["roomSessions", 1],
+                        }
+                    ],
+                    "hasNext": True,
+                },
+                {
+                    "incremental": [
+                        {
+                            "items": [{"name": "Room 3"}, {"name": "Room 4"}],
+                            "path": ["roomSessions", 3],
+                        }
+                    ],
+                    "hasNext": True,
+                },
+                # A full batch may be followed by more items.
+                {"hasNext": False},
+            ],
+        )
+
+    @override_settings(GRAPHQL_STREAM_BATCH_SIZE=2)
+    def test_merged_parts_are_the_complete_result(self):
+        query = """
+            query($withStats: Boolean!) {
+              roomSessions @stream(initialCount: 1) {
+                name
+                ...Details @defer(label: "details")
+              }
+              ... @defer(if: $withStats) { roomStats { count bestDurationTime } }
+            }
+            fragment Details on EscapeRoomSessionType { durationTime numberOfHints }
+        """
+        for with_stats in (True, False):
+            variables = {"withStats": with_stats}
+            complete = self.post(query, variables, accept="application/json").json()
+
+            parts = parse_multipart(self.post(query, variables))
+
+            self.assertEqual("roomStats" in parts[0]["data"], not with_stats)
+            self.assertNotIn("durationTime", parts[0]["data"]["roomSessions"][0])
+            self.assertEqual(merge_payloads(parts), complete["data"])
+
+    def test_loads_the_first_items_only_before_sending_them(self):
+        response = self.post("{ roomSessions @stream(initialCount: 2) { name } }")
+
+        with self.assertNumQueries(1):
+            parts = parse_multipart(response)
+        self.assertEqual(len(merge_payloads(parts)["roomSessions"]), 5)
+
+    def test_answers_complete_results_to_other_clients(self):
+        response = self.post(
+            "{ roomSessions @stream(initialCount: 1) { name } }", accept="application/json"
+        )
+
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertEqual(len(response.json()["data"]["roomSessions"]), 5)
+
+
+class WYEResponseEncoding(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.private_graph_url = "/private_graphql/"
+        self.query = "{ roomSessions { name numberOfHints } }"
+        self.user = get_user_model().objects.create_user(
+            email="romain@wye.com", pseudo="Romain", password="pass"
+        )
+        rooms = get_rooms(["Room {}".format(index) for index in range(100)])
+        EscapeRoomSession.objects.bulk_create(
+            EscapeRoomSession(
+                name="Room {}".format(index),
+                room=rooms["Room {}".format(index)],
+                played_datetime=timezone.now(),
+                duration_time=datetime.timedelta(minutes=40),
+                number_of_hints=index % 3,
+                user=self.user,
+            )
+            for index in range(100)
+        )
+
+        self.client.login(email="romain@wye.com", password="pass")
+
+    def post(self, body, **extra):
+        return self.client.post(
+            self.private_graph_url, json.dumps(body), content_type="application/json", **extra
+        )
+
+    def test_encoders_give_the_same_results(self):
+        results = []
+        for name in ("json", "auto"):
+            with override_settings(GRAPHQL_JSON_ENCODER=name):
+                results.append(self.post({"query": self.query}).json())
+
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(len(results[0]["data"]["roomSessions"]), 100)
+
+    def test_unknown_encoders_are_rejected(self):
+        with self.assertRaises(ImproperlyConfigured):
+            encoding.get_encoder("simplejson")
+
+    def test_compresses_large_responses(self):
+        plain = self.post({"query": self.query})
+        response = self.post({"query": self.query}, HTTP_ACCEPT_ENCODING="gzip, deflate")
+
+        self.assertNotIn("Content-Encoding", plain)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertLess(len(response.content), len(plain.content) / 5)
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+
+    def test_sends_small_responses_as_is(self):
+        response = self.post({"query": "{ whoami }"}, HTTP_ACCEPT_ENCODING="gzip")
+
+        self.assertNotIn("Content-Encoding", response)
+        self.assertEqual(response.json(), {"data": {"whoami": "I am romain@wye.com"}})
+
+    def test_negotiates_the_content_encoding(self):
+        preferred = "gzip" if encoding.brotli is None else "br"
+        for accept_encoding, expected in (
+            ("", None),
+            ("identity", None),
+            ("gzip;q=0, deflate", None),
+            ("deflate, gzip;q=0.5", "gzip"),
+            ("gzip;q=0.5, br", preferred),
+            ("*", preferred),
+            ("br;q=0, *;q=0.1", "gzip"),
+        ):
+            self.assertEqual(
+                encoding.negotiate_content_encoding(accept_encoding), expected, accept_encoding
+            )
+
+    def test_compressed_cached_responses_have_weak_etags(self):
+        response = self.client.get(
+            self.private_graph_url,
+            {"query": self.query},
+            HTTP_ACCEPT="application/json",
+            HTTP_ACCEPT_ENCODING="gzip",
+        )
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertTrue(response["ETag"].startswith('W/"'))
+
+        response = self.client.get(
+            self.private_graph_url,
+            {"query": self.query},
+            HTTP_ACCEPT="application/json",
+            HTTP_IF_NONE_MATCH=response["ETag"],
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_encodes_lists_of_objects_as_columns(self):
+        response = self.post({"query": self.query, "extensions": {"columnarLists": True}})
+
+        room_sessions = response.json()["data"]["roomSessions"]
+        self.assertEqual(room_sessions["columns"], ["name", "numberOfHints"])
+        self.assertEqual(room_sessions["rows"][:2], [["Room 0", 0], ["Room 1", 1]])
+        self.assertEqual(len(room_sessions["rows"]), 100)
+
+    def test_only_encodes_lists_of_objects_with_the_same_fields(self):
+        self.assertEqual(
+            encoding.encode_columns(
+                {
+                    "empty": [],
+                    "scalars": [1, 2],
+                    "union": [{"a": 1}, {"b": 2}],
+                    "nested": [{"a": [{"b": 1}, {"b": 2}]}, {"a": []}],
+                }
+            ),
+            {
+                "empty": [],
+                "scalars": [1, 2],
+                "union": [{"a": 1}, {"b": 2}],
+                "nested": {
+                    "columns": ["a"],
+                    "rows": [[{"columns": ["b"], "rows": [[1], [2]]}], [[]]],
+                },
+            },
+        )
+
+    def test_benchmark_measures_each_encoding(self):
+        with tempfile.NamedTemporaryFile("r", suffix=".json") as output:
+            call_command(
+                "benchmark_encoding", sessions=20, repeat=2, output=output.name, stdout=io.StringIO()
+            )
+            report = json.load(output)
+
+        results = {(result["encoder"], result["layout"]): result for result in report["results"]}
+        self.assertIn(("json", "objects"), results)
+        self.assertIn(("json", "columns"), results)
+        objects, columns = results["json", "objects"], results["json", "columns"]
+        self.assertLess(columns["bytes"]["identity"], objects["bytes"]["identity"])
+        self.assertLess(objects["bytes"]["gzip"], objects["bytes"]["identity"])
+
+
+class WYEBigTableAdmin(TestCase):
+    def setUp(self):
+        for index in range(3):
+            get_user_model().objects.create_user(
+                email="user{}@wye.com".format(index), pseudo="User", password="pass"
+            )
+
+    def test_counts_are_exact_without_estimates(self):
+        # Estimates are read from PostgreSQL only.
+        paginator = EstimatedCountPaginator(get_user_model().objects.order_by("pk"), 2)
+
+        self.assertEqual(paginator.count, 3)
+        self.assertFalse(paginator.estimated)
+
+    @override_settings(ADMIN_EXACT_COUNT_LIMIT=100)
+    def test_counts_are_estimated_above_the_limit(self):
+        with mock.patch("core.admin.estimate_count", return_value=100):
+            paginator = EstimatedCountPaginator(get_user_model().objects.order_by("pk"), 2)
+            with self.assertNumQueries(0):
+                self.assertEqual(paginator.count, 100)
+        self.assertTrue(paginator.estimated)
+        self.assertEqual(paginator.num_pages, 50)
+
+        with mock.patch("core.admin.estimate_count", return_value=99):
+            paginator = EstimatedCountPaginator(get_user_model().objects.order_by("pk"), 2)
+            self.assertEqual(paginator.count, 3)
+        self.assertFalse(paginator.estimated)
+
+    def test_primary_keys_are_iterated_in_chunks(self):
+        pks = list(get_user_model().objects.order_by("pk").values_list("pk", flat=True))
+
+        with self.assertNumQueries(3):
+            chunks = list(iterate_in_chunks(get_user_model().objects.order_by("-pk"), 2))
+
+        self.assertEqual(chunks, [pks[:2], pks[2:]])
+
+    def test_date_hierarchy_lists_months_between_bounds(self):
+        queryset = get_user_model().objects.all()
+        queryset.update(date_joined=datetime.datetime(2001, 11, 5, tzinfo=timezone.utc))
+        get_user_model().objects.filter(email="user0@wye.com").update(
+            date_joined=datetime.datetime(2002, 2, 5, tzinfo=timezone.utc)
+        )
+
+        self.assertEqual(
+            list_dates(queryset, "date_joined", "month", "DESC"),
+            [
+                datetime.date(2002, 2, 1),
+                datetime.date(2002, 1, 1),
+                datetime.date(2001, 12, 1),
+                datetime.date(2001, 11, 1),
+            ],
+        )
+        self.assertEqual(
+            list_dates(queryset, "date_joined", "year"),
+            [datetime.date(2001, 1, 1), datetime.date(2002, 1, 1)],
+        )
+        self.assertEqual(list_dates(queryset.none(), "date_joined", "year"), [])
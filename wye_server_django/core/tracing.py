@@ -0,0 +1,183 @@
+import asyncio
+import datetime
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+from django.utils import timezone
+
+from promise import Promise
+
+from core.metrics import Histogram
+
+RESOLVER_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+SQL_QUERIES_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+request_duration = Histogram(
+    "graphql_request_duration_seconds", "Duration of GraphQL requests.", ("endpoint",)
+)
+phase_duration = Histogram(
+    "graphql_phase_duration_seconds",
+    "Duration of the phases of sampled GraphQL requests.",
+    ("phase",),
+    buckets=RESOLVER_BUCKETS + (0.5, 1, 2.5),
+)
+resolver_duration = Histogram(
+    "graphql_resolver_duration_seconds",
+    "Duration of field resolvers in sampled GraphQL requests.",
+    ("parent_type", "field"),
+    buckets=RESOLVER_BUCKETS,
+)
+sql_queries = Histogram(
+    "graphql_sql_queries", "SQL queries per sampled GraphQL request.", buckets=SQL_QUERIES_BUCKETS
+)
+sql_duration = Histogram(
+    "graphql_sql_duration_seconds", "Time spent in SQL per sampled GraphQL request."
+)
+
+_local = threading.local()
+
+
+def perf_counter_ns():
+    # time.perf_counter_ns() needs Python 3.7.
+    return int(time.perf_counter() * 1e9)
+
+
+def get_current_trace():
+    return getattr(_local, "trace", None)
+
+
+@contextmanager
+def phase(name):
+    """
+    Times a phase of the GraphQL request traced on this thread, if any.
+    """
+    trace = get_current_trace()
+    if trace is None:
+        yield
+        return
+
+    start = perf_counter_ns()
+    try:
+        yield
+    finally:
+        trace.phases[name] = (start, perf_counter_ns())
+
+
+class Trace(object):
+    """
+    Timings of a GraphQL request, reported in the Apollo tracing format.
+    """
+
+    def __init__(self):
+        self.start_time = timezone.now()
+        self.start = perf_counter_ns()
+        self.end = None
+        self.phases = {}
+        self.resolvers = []
+        self.sql_count = 0
+        self.sql_duration = 0
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def activate(self):
+        _local.trace = self
+        try:
+            with self.capture_sql():
+                yield
+        finally:
+            _local.trace = None
+            self.end = perf_counter_ns()
+
+    def capture_sql(self):
+        # Connections are per thread: this must be entered on every thread that
+        # runs queries for the request.
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(self.record_sql))
+        return stack
+
+    def record_sql(self, execute, sql, params, many, context):
+        start = perf_counter_ns()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = perf_counter_ns() - start
+            with self.lock:
+                self.sql_count += 1
+                self.sql_duration += duration
+
+    def record_resolver(self, info, start):
+        end = perf_counter_ns()
+        # Appending to a list is atomic, resolvers may run on other threads.
+        self.resolvers.append(
+            (info.path, info.parent_type, info.field_name, info.return_type, start, end)
+        )
+
+    def observe(self):
+        for name, (start, end) in self.phases.items():
+            phase_duration.observe((end - start) / 1e9, name)
+        for _, parent_type, field_name, _, start, end in self.resolvers:
+            resolver_duration.observe((end - start) / 1e9, parent_type.name, field_name)
+        sql_queries.observe(self.sql_count)
+        sql_duration.observe(self.sql_duration / 1e9)
+
+    def format_phase(self, name):
+        start, end = self.phases.get(name, (self.start, self.start))
+        return {"startOffset": start - self.start, "duration": end - start}
+
+    def as_dict(self):
+        end_time = self.start_time + datetime.timedelta(microseconds=(self.end - self.start) // 1000)
+        return {
+            "version": 1,
+            "startTime": self.start_time.isoformat(),
+            "endTime": end_time.isoformat(),
+            "duration": self.end - self.start,
+            "parsing": self.format_phase("parsing"),
+            "validation": self.format_phase("validation"),
+            "execution": dict(
+                self.format_phase("execution"),
+                resolvers=[
+                    {
+                        "path": list(path),
+                        "parentType": str(parent_type),
+                        "fieldName": field_name,
+                        "returnType": str(return_type),
+                        "startOffset": start - self.start,
+                        "duration": end - start,
+                    }
+                    for path, parent_type, field_name, return_type, start, end in self.resolvers
+                ],
+            ),
+            "sql": {"count": self.sql_count, "duration": self.sql_duration},
+        }
+
+
+class TracingMiddleware(object):
+    """
+    Times the resolvers of traced requests.
+
+    Requests which are not traced only pay for one attribute lookup per field.
+    """
+
+    def resolve(self, next, root, info, **args):
+        trace = getattr(info.context, "graphql_trace", None)
+        if trace is None:
+            return next(root, info, **args)
+
+        start = perf_counter_ns()
+        result = next(root, info, **args)
+        if isinstance(result, Promise):
+            # The resolver loads its value in a batch, e.g. with a DataLoader.
+            def record(value):
+                trace.record_resolver(info, start)
+                return value
+
+            return result.then(record)
+        if isinstance(result, asyncio.Future):
+            result.add_done_callback(lambda future: trace.record_resolver(info, start))
+            return result
+
+        trace.record_resolver(info, start)
+        return result
@@ -1,14 +1,33 @@
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path
 from django.views.decorators.csrf import csrf_exempt
 
-from graphene_django.views import GraphQLView
+from core.gql_schema import document_backend, middleware, schema, private_schema
+from core.views import (
+    AsyncPrivateGraphQLView,
+    AsyncWYEGraphQLView,
+    MetricsView,
+    PrivateGraphQLView,
+    WYEGraphQLView,
+)
+from rooms.views import RoomSessionExportView, RoomSessionImportView
 
-from core.gql_schema import schema, private_schema
-from core.views import PrivateGraphQLView
+if settings.GRAPHQL_ASYNC_EXECUTION:
+    WYEGraphQLView, PrivateGraphQLView = AsyncWYEGraphQLView, AsyncPrivateGraphQLView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('graphql/', csrf_exempt(GraphQLView.as_view(graphiql=True, schema=schema))),
-    path('private_graphql/', PrivateGraphQLView.as_view(graphiql=True, schema=private_schema)),
+    path('graphql/', csrf_exempt(WYEGraphQLView.as_view(
+        graphiql=True, schema=schema, backend=document_backend, middleware=middleware
+    ))),
+    path('private_graphql/', PrivateGraphQLView.as_view(
+        graphiql=True,
+        schema=private_schema,
+        backend=document_backend,
+        middleware=middleware,
+    )),
+    path('room_sessions/import/', RoomSessionImportView.as_view()),
+    path('room_sessions/export/', RoomSessionExportView.as_view()),
+    path('metrics', MetricsView.as_view()),
 ]
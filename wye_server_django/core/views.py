@@ -1,6 +1,40 @@
-from django.http import HttpResponse
+import json
+import random
+import time
+from functools import lru_cache
 
-from graphene_django.views import GraphQLView
+from django.conf import settings
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseBadRequest,
+    HttpResponseForbidden,
+    HttpResponseNotModified,
+    StreamingHttpResponse,
+)
+from django.utils.cache import patch_vary_headers
+from django.utils.crypto import constant_time_compare
+from django.utils.http import parse_etags
+from django.views import View
+
+from graphene_django.views import GraphQLView, HttpError
+from graphql import GraphQLError
+from graphql.execution.middleware import MiddlewareManager
+
+from core import db_routing, encoding, metrics, response_cache, tracing
+from core.incremental import IncrementalExecutionResult
+from core.executors import RequestAsyncioExecutor, ThreadedRootResolverMiddleware
+from core.persisted_queries import PersistedQueryStore, hash_query
+
+threaded_root_resolver_middleware = ThreadedRootResolverMiddleware()
+
+
+@lru_cache(maxsize=32)
+def get_middleware_manager(middleware):
+    # Managers cache the chain of middleware of each resolver, they are shared by
+    # requests. Resolver results are not wrapped in promises, which would cost
+    # more than the middleware themselves on every field.
+    return MiddlewareManager(*middleware, wrap_in_promise=False)
 
 
 class AuthenticationRequiredMixin(object):
@@ -10,5 +44,428 @@ class AuthenticationRequiredMixin(object):
         return super().dispatch(request, *args, **kwargs)
 
 
-class PrivateGraphQLView(AuthenticationRequiredMixin, GraphQLView):
+def get_extensions(request, data):
+    extensions = request.GET.get("extensions") or data.get("extensions") or {}
+    if isinstance(extensions, str):
+        try:
+            extensions = json.loads(extensions)
+        except ValueError:
+            raise HttpError(HttpResponseBadRequest("Extensions are invalid JSON."))
+    return extensions
+
+
+def accepts_incremental_delivery(request):
+    return "multipart/mixed" in request.META.get("HTTP_ACCEPT", "")
+
+
+class ResponseExtensionsMixin(object):
+    """
+    Adds the extensions of the execution result the client asks for, e.g. with
+    `extensions: {"cost": true}`, to the response.
+    """
+
+    response_extensions = None
+
+    def get_response(self, request, data, *args, **kwargs):
+        # Operations of a batch get their own extensions.
+        self.response_extensions = None
+        return super().get_response(request, data, *args, **kwargs)
+
+    def execute_graphql_request(self, request, data, *args, **kwargs):
+        result = super().execute_graphql_request(request, data, *args, **kwargs)
+        if result is not None and result.extensions:
+            requested = get_extensions(request, data)
+            self.response_extensions = {
+                name: value for name, value in result.extensions.items() if requested.get(name)
+            }
+        return result
+
+    def json_encode(self, request, d, pretty=False):
+        if self.response_extensions:
+            d = dict(d, extensions=self.response_extensions)
+        return super().json_encode(request, d, pretty)
+
+
+class ResponseCacheMixin(object):
+    """
+    Caches the responses of queries sent with GET, per user, and answers
+    conditional requests with strong ETags.
+
+    Cached responses are served without executing the query nor touching the
+    database. They are dropped when the data of the user changes, or data shared
+    by every user, see `core.response_cache.invalidate_user_responses()` and
+    `invalidate_global_responses()`.
+    """
+
+    cacheable = False
+
+    def get_response_cache_key(self, request):
+        if request.method != "GET" or self.request_wants_html(request):
+            return None
+        # Parts of incremental responses are only computed while sent.
+        if accepts_incremental_delivery(request):
+            return None
+        try:
+            extensions = get_extensions(request, {})
+            variables = json.loads(request.GET.get("variables") or "null")
+        except (HttpError, ValueError):
+            return None
+        # Traces and costs are specific to each execution.
+        if set(extensions) - {"persistedQuery"}:
+            return None
+
+        query = request.GET.get("query")
+        query_hash = (extensions.get("persistedQuery") or {}).get("sha256Hash")
+        if query_hash is None and query:
+            query_hash = hash_query(query)
+        if query_hash is None:
+            return None
+
+        if not query:
+            query = self.persisted_queries.get(query_hash)
+            if query is None:
+                return None
+        try:
+            # Parsed once, the document is then executed from the backend cache.
+            document = self.get_backend(request).document_from_string(self.schema, query)
+        except GraphQLError:
+            return None
+
+        return response_cache.get_response_key(
+            request.path,
+            request.user.pk,
+            query_hash,
+            request.GET.get("operationName"),
+            variables,
+            shared=getattr(document, "reads_shared_data", True),
+        )
+
+    def execute_graphql_request(self, request, *args, **kwargs):
+        result = super().execute_graphql_request(request, *args, **kwargs)
+        # A lagging replica may return data older than the last invalidation,
+        # which would then be cached as fresh.
+        self.cacheable = result is not None and not result.errors and not db_routing.used_replica()
+        return result
+
+    def dispatch(self, request, *args, **kwargs):
+        key = self.get_response_cache_key(request)
+        if key is None:
+            return super().dispatch(request, *args, **kwargs)
+
+        cached = response_cache.get_cached_response(key)
+        if cached is None:
+            response = super().dispatch(request, *args, **kwargs)
+            if response.status_code != 200 or not self.cacheable:
+                return response
+            cached = response_cache.cache_response(key, response.content)
+
+        etag, content = cached
+        # Compared weakly, the ETags of compressed responses are weak.
+        etags = parse_etags(request.META.get("HTTP_IF_NONE_MATCH", ""))
+        if etag in [tag[2:] if tag.startswith("W/") else tag for tag in etags]:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(content, content_type="application/json")
+        response["ETag"] = etag
+        # Clients may keep the response, but must check it is still fresh.
+        response["Cache-Control"] = "private, no-cache"
+        return response
+
+
+class ResponseEncodingMixin(object):
+    """
+    Encodes responses with the JSON encoder of GRAPHQL_JSON_ENCODER. Clients
+    sending `extensions: {"columnarLists": true}` get the lists of objects of
+    their results as columns, see `core.encoding.encode_columns()`.
+    """
+
+    columnar_lists = False
+
+    def get_response(self, request, data, *args, **kwargs):
+        self.columnar_lists = bool(get_extensions(request, data).get("columnarLists"))
+        return super().get_response(request, data, *args, **kwargs)
+
+    def json_encode(self, request, d, pretty=False):
+        if self.columnar_lists and d.get("data") is not None:
+            d = dict(d, data=encoding.encode_columns(d["data"]))
+        pretty = bool(self.pretty or pretty or request.GET.get("pretty"))
+        return encoding.get_encoder()(d, pretty)
+
+
+class CompressionMixin(object):
+    """
+    Compresses the responses of at least GRAPHQL_COMPRESSION_MIN_SIZE bytes with
+    the content encoding the client prefers, brotli or gzip. Streamed responses
+    are sent as is, so that their parts are not held back.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        response = super().dispatch(request, *args, **kwargs)
+        if response.streaming or response.has_header("Content-Encoding"):
+            return response
+        if len(response.content) < settings.GRAPHQL_COMPRESSION_MIN_SIZE:
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        content_encoding = encoding.negotiate_content_encoding(
+            request.META.get("HTTP_ACCEPT_ENCODING", "")
+        )
+        if content_encoding is None:
+            return response
+        content = encoding.compress(response.content, content_encoding)
+        if len(content) >= len(response.content):
+            return response
+
+        response.content = content
+        response["Content-Length"] = str(len(content))
+        response["Content-Encoding"] = content_encoding
+        # The compressed response is equivalent, but not byte for byte.
+        if response.has_header("ETag") and not response["ETag"].startswith("W/"):
+            response["ETag"] = "W/" + response["ETag"]
+        return response
+
+
+class TracingMixin(object):
+    """
+    Traces the requests asking for it with `extensions: {"tracing": true}`, and a
+    sample of GRAPHQL_TRACING_SAMPLE_RATE of the others, for the metrics.
+    """
+
+    def get_middleware(self, request):
+        return get_middleware_manager(tuple(self.middleware or ()))
+
+    def execute_graphql_request(self, request, data, *args, **kwargs):
+        start = time.perf_counter()
+        trace = None
+        if (
+            get_extensions(request, data).get("tracing")
+            or random.random() < settings.GRAPHQL_TRACING_SAMPLE_RATE
+        ):
+            trace = request.graphql_trace = tracing.Trace()
+
+        if trace is None:
+            result = super().execute_graphql_request(request, data, *args, **kwargs)
+        else:
+            with trace.activate():
+                result = super().execute_graphql_request(request, data, *args, **kwargs)
+            trace.observe()
+            if result is not None:
+                result.extensions["tracing"] = trace.as_dict()
+
+        tracing.request_duration.observe(time.perf_counter() - start, request.path)
+        return result
+
+
+class PersistedQueryMixin(object):
+    """
+    Resolves queries sent as a SHA-256 hash, following the Automatic Persisted
+    Queries protocol used by Apollo clients.
+    """
+
+    persisted_queries = PersistedQueryStore()
+    persisted_query_hash = None
+
+    def get_graphql_params(self, request, data):
+        query, variables, operation_name, id = super().get_graphql_params(request, data)
+        persisted_query = get_extensions(request, data).get("persistedQuery")
+        self.persisted_query_hash = None
+
+        query_hash = None
+        if persisted_query:
+            if persisted_query.get("version") != 1:
+                raise HttpError(HttpResponseBadRequest("Unsupported persisted query version."))
+            query_hash = persisted_query.get("sha256Hash")
+            if not query_hash:
+                raise HttpError(HttpResponseBadRequest("Missing persisted query sha256Hash."))
+
+            if not query:
+                query = self.persisted_queries.get(query_hash)
+                if query is None:
+                    # Clients retry with the full query on this error, it is not a failure.
+                    raise HttpError(HttpResponse(status=200), "PersistedQueryNotFound")
+            elif hash_query(query) != query_hash:
+                raise HttpError(HttpResponseBadRequest("Provided sha256Hash does not match query."))
+            else:
+                # Registered once parsed and validated, see execute_graphql_request().
+                self.persisted_query_hash = query_hash
+
+        if query and self.persisted_queries.registered_only:
+            if self.persisted_queries.get(query_hash or hash_query(query)) is None:
+                raise HttpError(HttpResponseForbidden("Only registered queries are allowed."))
+
+        return query, variables, operation_name, id
+
+    def execute_graphql_request(self, request, data, query, *args, **kwargs):
+        result = super().execute_graphql_request(request, data, query, *args, **kwargs)
+        if (
+            self.persisted_query_hash is not None
+            and result is not None
+            and not getattr(result, "invalid", False)
+        ):
+            self.persisted_queries.register(self.persisted_query_hash, query)
+        return result
+
+
+class BatchMixin(object):
+    """
+    Executes the operations sent as a JSON array in one request one after the
+    other, and answers the array of their results. Operations of a batch share
+    the request, with its session, user and DataLoaders.
+    """
+
+    def parse_body(self, request):
+        if self.get_content_type(request) == "application/json":
+            self.batch = request.body.lstrip()[:1] == b"["
+        data = super().parse_body(request)
+        if self.batch:
+            if len(data) > settings.GRAPHQL_MAX_BATCH_SIZE:
+                raise HttpError(
+                    HttpResponseBadRequest(
+                        "Batches are limited to {} operations.".format(
+                            settings.GRAPHQL_MAX_BATCH_SIZE
+                        )
+                    )
+                )
+            if not all(isinstance(entry, dict) for entry in data):
+                raise HttpError(HttpResponseBadRequest("Batched operations must be JSON objects."))
+        return data
+
+    def get_response(self, request, data, *args, **kwargs):
+        if not self.batch:
+            return super().get_response(request, data, *args, **kwargs)
+        try:
+            return super().get_response(request, data, *args, **kwargs)
+        except HttpError as e:
+            # Only fails this operation, e.g. a persisted query to send again.
+            status_code = e.response.status_code
+            response = {
+                "errors": [self.format_error(e)],
+                "id": data.get("id"),
+                "status": status_code,
+            }
+            return self.json_encode(request, response), status_code
+
+    def execute_graphql_request(self, request, data, query, variables, operation_name, *args):
+        result = super().execute_graphql_request(
+            request, data, query, variables, operation_name, *args
+        )
+        if self.batch and result is not None and not result.invalid:
+            document = self.get_backend(request).document_from_string(self.schema, query)
+            if document.get_operation_type(operation_name) == "mutation":
+                # Next operations must not get objects loaded before they changed.
+                request.__dict__.pop("dataloaders", None)
+        return result
+
+
+class IncrementalDeliveryMixin(object):
+    """
+    Sends the results of operations using @defer or @stream as the parts of a
+    multipart/mixed response to the clients accepting it: the first part is
+    sent before the deferred fragments and streamed items are executed, see
+    `core.incremental`.
+    """
+
+    incremental_result = None
+
+    def execute_graphql_request(self, request, *args, **kwargs):
+        # Batched operations and columnar lists get complete results.
+        request.graphql_incremental = (
+            not self.batch and not self.columnar_lists and accepts_incremental_delivery(request)
+        )
+        result = super().execute_graphql_request(request, *args, **kwargs)
+        if isinstance(result, IncrementalExecutionResult):
+            self.incremental_result = result
+        return result
+
+    def json_encode(self, request, d, pretty=False):
+        if self.incremental_result is not None:
+            d = dict(d, hasNext=True)
+        return super().json_encode(request, d, pretty)
+
+    def dispatch(self, request, *args, **kwargs):
+        response = super().dispatch(request, *args, **kwargs)
+        if self.incremental_result is None or response.status_code != 200:
+            return response
+        return StreamingHttpResponse(
+            self.get_parts(response.content),
+            content_type='multipart/mixed; boundary="-"; deferSpec=20220824',
+        )
+
+    def get_parts(self, initial):
+        yield self.get_part(initial)
+        for payload in self.incremental_result.subsequent_payloads:
+            for item in payload.get("incremental", ()):
+                if "errors" in item:
+                    item["errors"] = [self.format_error(error) for error in item["errors"]]
+            yield self.get_part(encoding.get_encoder()(payload).encode())
+        yield b"\r\n-----\r\n"
+
+    def get_part(self, content):
+        return b"\r\n---\r\nContent-Type: application/json; charset=utf-8\r\n\r\n" + content
+
+
+class AsyncExecutionMixin(object):
+    """
+    Executes documents on an asyncio event loop, resolving the root fields of
+    queries concurrently in the resolver thread pool.
+    """
+
+    def get_middleware(self, request):
+        return get_middleware_manager(
+            tuple(self.middleware or ()) + (threaded_root_resolver_middleware,)
+        )
+
+    def execute_graphql_request(self, request, *args, **kwargs):
+        self.executor = RequestAsyncioExecutor()
+        request.graphql_event_loop = self.executor.loop
+        try:
+            return super().execute_graphql_request(request, *args, **kwargs)
+        finally:
+            self.executor.close()
+            self.executor = None
+
+
+class WYEGraphQLView(
+    CompressionMixin,
+    IncrementalDeliveryMixin,
+    BatchMixin,
+    ResponseCacheMixin,
+    ResponseExtensionsMixin,
+    TracingMixin,
+    PersistedQueryMixin,
+    ResponseEncodingMixin,
+    GraphQLView,
+):
     pass
+
+
+class PrivateGraphQLView(AuthenticationRequiredMixin, WYEGraphQLView):
+    pass
+
+
+class AsyncWYEGraphQLView(AsyncExecutionMixin, WYEGraphQLView):
+    pass
+
+
+class AsyncPrivateGraphQLView(AuthenticationRequiredMixin, AsyncWYEGraphQLView):
+    pass
+
+
+class MetricsView(View):
+    """
+    Exposes the metrics of this process, or of every process with METRICS_DIR,
+    to Prometheus.
+
+    Requests must carry the `METRICS_TOKEN` bearer token. Without a token
+    configured, metrics are only exposed in debug mode.
+    """
+
+    def get(self, request):
+        if settings.METRICS_TOKEN:
+            authorization = request.META.get("HTTP_AUTHORIZATION", "")
+            if not constant_time_compare(authorization, "Bearer " + settings.METRICS_TOKEN):
+                return HttpResponse("Unauthorized", status=401)
+        elif not settings.DEBUG:
+            raise Http404
+
+        return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
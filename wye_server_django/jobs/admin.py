@@ -0,0 +1,12 @@
+from django.contrib import admin
+
+from jobs.models import Job
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("task", "status", "attempts", "run_at", "created_at", "finished_at")
+    list_filter = ("status", "task")
+    search_fields = ("idempotency_key",)
+
+
+admin.site.register(Job, JobAdmin)
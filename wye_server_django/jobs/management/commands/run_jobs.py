@@ -0,0 +1,64 @@
+import logging
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from jobs.worker import run_pending_jobs
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs the background jobs as they become due, in threads each holding a "
+        "database connection. Stops after the running jobs on SIGTERM or SIGINT."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=settings.JOBS_CONCURRENCY,
+            help="Number of jobs run at once.",
+        )
+        parser.add_argument(
+            "--once", action="store_true", help="Run the jobs due, then exit."
+        )
+
+    def work(self, stop):
+        try:
+            while not stop.is_set():
+                try:
+                    run_pending_jobs(stop)
+                except Exception:
+                    # E.g. the database is unavailable, jobs are claimed again later.
+                    logger.exception("Could not run jobs")
+                close_old_connections()
+                stop.wait(settings.JOBS_POLL_INTERVAL)
+        finally:
+            close_old_connections()
+
+    def handle(self, *args, **options):
+        if options["once"]:
+            count = run_pending_jobs()
+            self.stdout.write("Ran {} jobs.".format(count))
+            return
+
+        stop = threading.Event()
+        for signal_number in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signal_number, lambda *args: stop.set())
+
+        threads = [
+            threading.Thread(target=self.work, args=(stop,), name="jobs-{}".format(index))
+            for index in range(options["concurrency"])
+        ]
+        for thread in threads:
+            thread.start()
+        self.stdout.write("Running jobs in {} threads.".format(len(threads)))
+        # Signals are handled by the main thread while it waits.
+        while any(thread.is_alive() for thread in threads):
+            for thread in threads:
+                thread.join(timeout=1)
@@ -0,0 +1,45 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Job(models.Model):
+    """
+    A task to run in the background by `manage.py run_jobs`, see jobs.queue.
+    """
+
+    PENDING = "pending"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    STATUSES = (
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (SUCCEEDED, "Succeeded"),
+        (FAILED, "Failed"),
+    )
+
+    task = models.CharField(max_length=255)
+    # Keyword arguments of the task, in JSON.
+    arguments = models.TextField(default="{}")
+    # Jobs enqueued again with the same key are only run once.
+    idempotency_key = models.CharField(max_length=255, null=True, blank=True, unique=True)
+    status = models.CharField(max_length=16, choices=STATUSES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField()
+    # Date from which a pending job may run, pushed back after each failure.
+    run_at = models.DateTimeField(default=timezone.now)
+    # A running job whose worker did not report back by then is run again.
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Workers look up the next pending job, and the lost running ones.
+            models.Index(fields=["status", "run_at"], name="job_status_run_at_idx"),
+            models.Index(fields=["status", "locked_until"], name="job_status_locked_idx"),
+        ]
+
+    def __str__(self):
+        return "{} ({})".format(self.task, self.status)
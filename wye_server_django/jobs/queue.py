@@ -0,0 +1,75 @@
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+
+from jobs.models import Job
+
+tasks = {}
+
+
+class Task(object):
+    """
+    A function run in the background by the workers of `manage.py run_jobs`.
+
+    Tasks may run more than once, e.g. when a worker is lost while running
+    them: they must be safe to retry. Their arguments are serialized to JSON,
+    pass identifiers rather than model instances.
+    """
+
+    def __init__(self, function, name, max_attempts=None):
+        self.function = function
+        self.name = name
+        self.max_attempts = max_attempts
+
+    def __call__(self, **kwargs):
+        return self.function(**kwargs)
+
+    def enqueue(self, idempotency_key=None, run_at=None, **kwargs):
+        """
+        Adds a job running the task with `kwargs`, and returns it. A job already
+        enqueued with the same `idempotency_key` is returned instead.
+        """
+        job = Job(
+            task=self.name,
+            arguments=json.dumps(kwargs, cls=DjangoJSONEncoder),
+            idempotency_key=idempotency_key,
+            max_attempts=self.max_attempts or settings.JOBS_MAX_ATTEMPTS,
+        )
+        if run_at is not None:
+            job.run_at = run_at
+        if idempotency_key is None:
+            job.save()
+            return job
+        try:
+            with transaction.atomic():
+                job.save()
+        except IntegrityError:
+            return Job.objects.get(idempotency_key=idempotency_key)
+        return job
+
+    def enqueue_on_commit(self, idempotency_key=None, run_at=None, **kwargs):
+        """
+        Enqueues the job once the current transaction is committed, so that it
+        never runs for changes rolled back, nor before they are visible.
+        """
+        transaction.on_commit(
+            lambda: self.enqueue(idempotency_key=idempotency_key, run_at=run_at, **kwargs)
+        )
+
+
+def task(function=None, max_attempts=None):
+    """
+    Registers a function as a task, named after its module and name. Used as
+    `@task` or `@task(max_attempts=...)`.
+    """
+
+    def register(function):
+        name = "{}.{}".format(function.__module__, function.__name__)
+        tasks[name] = Task(function, name, max_attempts)
+        return tasks[name]
+
+    if function is None:
+        return register
+    return register(function)
@@ -0,0 +1,160 @@
+import datetime
+import io
+import json
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from jobs.models import Job
+from jobs.queue import task
+from jobs.worker import claim_job, run_job, run_pending_jobs
+
+calls = []
+
+
+@task
+def record(value):
+    calls.append(value)
+
+
+@task(max_attempts=2)
+def fail(value):
+    calls.append(value)
+    raise ValueError("Failed on {}".format(value))
+
+
+class WYEJobs(TestCase):
+    def setUp(self):
+        del calls[:]
+
+    def test_runs_enqueued_jobs(self):
+        job = record.enqueue(value=1)
+
+        self.assertEqual(run_pending_jobs(), 1)
+
+        self.assertEqual(calls, [1])
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.SUCCEEDED)
+        self.assertEqual(job.attempts, 1)
+
+    def test_jobs_run_in_order_once_due(self):
+        record.enqueue(value=2, run_at=timezone.now() - datetime.timedelta(seconds=1))
+        record.enqueue(value=1, run_at=timezone.now() - datetime.timedelta(seconds=2))
+        record.enqueue(value=3, run_at=timezone.now() + datetime.timedelta(hours=1))
+
+        run_pending_jobs()
+
+        self.assertEqual(calls, [1, 2])
+
+    def test_jobs_with_the_same_idempotency_key_run_once(self):
+        first = record.enqueue(value=1, idempotency_key="key")
+        second = record.enqueue(value=2, idempotency_key="key")
+
+        run_pending_jobs()
+
+        self.assertEqual(first, second)
+        self.assertEqual(calls, [1])
+
+    def test_failed_jobs_are_retried_later(self):
+        job = fail.enqueue(value=1)
+
+        run_pending_jobs()
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.PENDING)
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIn("ValueError: Failed on 1", job.last_error)
+        # Not due yet.
+        self.assertEqual(run_pending_jobs(), 0)
+
+        Job.objects.update(run_at=timezone.now())
+        run_pending_jobs()
+
+        job.refresh_from_db()
+        self.assertEqual(calls, [1, 1])
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.attempts, 2)
+
+    def test_jobs_are_claimed_by_a_single_worker(self):
+        record.enqueue(value=1)
+
+        self.assertIsNotNone(claim_job())
+        self.assertIsNone(claim_job())
+
+    def test_jobs_of_lost_workers_run_again(self):
+        job = record.enqueue(value=1)
+        claim_job()
+        Job.objects.update(locked_until=timezone.now() - datetime.timedelta(seconds=1))
+
+        run_pending_jobs()
+
+        job.refresh_from_db()
+        self.assertEqual(calls, [1])
+        self.assertEqual(job.status, Job.SUCCEEDED)
+        self.assertEqual(job.attempts, 2)
+
+    def test_attempts_of_lost_workers_do_not_overwrite_the_next_ones(self):
+        job = record.enqueue(value=1)
+        lost_job = claim_job()
+        Job.objects.update(locked_until=timezone.now() - datetime.timedelta(seconds=1))
+        claim_job()
+
+        run_job(lost_job)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.RUNNING)
+        self.assertEqual(job.attempts, 2)
+        self.assertIsNotNone(job.locked_until)
+
+    def test_command_runs_due_jobs(self):
+        record.enqueue(value=1)
+        stdout = io.StringIO()
+
+        call_command("run_jobs", once=True, stdout=stdout)
+
+        self.assertEqual(calls, [1])
+        self.assertEqual(stdout.getvalue(), "Ran 1 jobs.\n")
+
+
+class WYEJobsOnCommit(TransactionTestCase):
+    def test_jobs_are_enqueued_once_committed(self):
+        with transaction.atomic():
+            record.enqueue_on_commit(value=1)
+            self.assertFalse(Job.objects.exists())
+
+        self.assertEqual(json.loads(Job.objects.get().arguments), {"value": 1})
+
+    def test_jobs_are_not_enqueued_when_rolled_back(self):
+        try:
+            with transaction.atomic():
+                record.enqueue_on_commit(value=1)
+                raise ValueError()
+        except ValueError:
+            pass
+
+        self.assertFalse(Job.objects.exists())
+
+    def test_new_users_get_a_welcome_email(self):
+        mutation = """
+            mutation {
+              createUser(email: "romain@wye.com", pseudo: "Romain", password: "pass") {
+                user { pseudo }
+              }
+            }
+        """
+        self.client.post("/graphql/", {"query": mutation})
+        self.assertEqual(len(mail.outbox), 0)
+
+        run_pending_jobs()
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["romain@wye.com"])
+        self.assertIn("Hi Romain", mail.outbox[0].body)
+        self.assertEqual(
+            Job.objects.get().idempotency_key,
+            "welcome_email:{}".format(get_user_model().objects.get().pk),
+        )
@@ -0,0 +1,109 @@
+import datetime
+import json
+import logging
+import random
+import traceback
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from jobs.models import Job
+from jobs.queue import tasks
+
+logger = logging.getLogger(__name__)
+
+
+def get_retry_delay(attempts):
+    """
+    Returns the delay before the next attempt of a job which failed `attempts`
+    times: doubled after each failure, with some jitter so that jobs failing
+    together are not retried together.
+    """
+    delay = min(settings.JOBS_MAX_RETRY_DELAY, settings.JOBS_RETRY_DELAY * 2 ** (attempts - 1))
+    return datetime.timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def claim_job():
+    """
+    Marks the next job due as running and returns it, or None when no job is
+    due. Jobs locked by other workers are skipped.
+    """
+    now = timezone.now()
+    due_jobs = (
+        Job.objects.filter(status=Job.PENDING, run_at__lte=now).order_by("run_at"),
+        # Jobs of workers lost while running them.
+        Job.objects.filter(status=Job.RUNNING, locked_until__lt=now).order_by("locked_until"),
+    )
+    # Without row locks, e.g. on SQLite, the update only succeeds for one worker.
+    # A transaction would then fail to upgrade its read lock instead of waiting.
+    locking = connection.features.has_select_for_update
+    for jobs in due_jobs:
+        with transaction.atomic() if locking else ExitStack():
+            job = jobs.select_for_update(skip_locked=True).first()
+            if job is None:
+                continue
+            claimed = Job.objects.filter(
+                pk=job.pk, status=job.status, attempts=job.attempts
+            ).update(
+                status=Job.RUNNING,
+                attempts=job.attempts + 1,
+                locked_until=now + datetime.timedelta(seconds=settings.JOBS_LEASE),
+            )
+            if claimed:
+                job.refresh_from_db()
+                return job
+    return None
+
+
+def run_job(job):
+    """
+    Runs a claimed job, then records its success, or schedules its next attempt.
+    Nothing is recorded when the job was claimed again in the meantime, e.g.
+    after its lease expired, the latest attempt records its own outcome.
+    """
+    try:
+        if job.attempts > job.max_attempts:
+            raise RuntimeError("Lost by the workers after {} attempts.".format(job.max_attempts))
+        tasks[job.task](**json.loads(job.arguments))
+    except Exception:
+        job.last_error = traceback.format_exc()
+        if job.attempts >= job.max_attempts:
+            logger.error("Job %s (%s) failed", job.pk, job.task, exc_info=True)
+            job.status = Job.FAILED
+            job.finished_at = timezone.now()
+        else:
+            logger.warning("Job %s (%s) failed, will retry", job.pk, job.task, exc_info=True)
+            job.status = Job.PENDING
+            job.run_at = timezone.now() + get_retry_delay(job.attempts)
+    else:
+        job.status = Job.SUCCEEDED
+        job.finished_at = timezone.now()
+    job.locked_until = None
+    recorded = Job.objects.filter(pk=job.pk, status=Job.RUNNING, attempts=job.attempts).update(
+        status=job.status,
+        run_at=job.run_at,
+        locked_until=None,
+        last_error=job.last_error,
+        finished_at=job.finished_at,
+    )
+    if not recorded:
+        logger.warning(
+            "Job %s (%s) was claimed again, attempt %s ignored", job.pk, job.task, job.attempts
+        )
+
+
+def run_pending_jobs(stop=None):
+    """
+    Runs jobs until none is due, or `stop` (a threading.Event) is set, and
+    returns the number of jobs run.
+    """
+    count = 0
+    while stop is None or not stop.is_set():
+        job = claim_job()
+        if job is None:
+            break
+        run_job(job)
+        count += 1
+    return count
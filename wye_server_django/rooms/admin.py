@@ -1,10 +1,55 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.db import transaction
 
-from rooms.models import EscapeRoomSession
+from core.admin import BigTableAdmin, iterate_in_chunks
+from core.response_cache import invalidate_user_responses
+from rooms import leaderboards, stats
+from rooms.models import EscapeRoom, EscapeRoomSession
 
 
-class EscapeRoomSessionAdmin(admin.ModelAdmin):
-    pass
+def delete_room_sessions(pks):
+    # Raw deletes do not send model signals, statistics and leaderboards are
+    # updated by hand, as by imports.
+    with transaction.atomic():
+        room_sessions = list(EscapeRoomSession.objects.filter(pk__in=pks))
+        queryset = EscapeRoomSession.objects.filter(pk__in=pks)
+        queryset._raw_delete(queryset.db)
+        stats.remove_sessions(room_sessions)
+        leaderboards.remove_sessions(room_sessions)
+        for user_id in {room_session.user_id for room_session in room_sessions}:
+            invalidate_user_responses(user_id)
+    return len(room_sessions)
 
 
+class EscapeRoomAdmin(admin.ModelAdmin):
+    list_display = ("name", "normalized_name")
+    search_fields = ("normalized_name",)
+
+
+class EscapeRoomSessionAdmin(BigTableAdmin):
+    list_display = ("name", "user", "room", "played_datetime", "duration_time", "number_of_hints")
+    list_select_related = ("user", "room")
+    autocomplete_fields = ("user", "room")
+    date_hierarchy = "played_datetime"
+    actions = ["delete_room_sessions"]
+
+    def delete_room_sessions(self, request, queryset):
+        response = self.confirm_action(
+            request,
+            queryset,
+            "delete_room_sessions",
+            "Delete room sessions",
+            "Delete the {count} selected room sessions? Statistics and leaderboards "
+            "are updated along.",
+        )
+        if response is not None:
+            return response
+        count = sum(delete_room_sessions(pks) for pks in iterate_in_chunks(queryset))
+        self.message_user(request, "Deleted {} room sessions.".format(count), messages.SUCCESS)
+
+    delete_room_sessions.short_description = "Delete selected room sessions"
+    delete_room_sessions.allowed_permissions = ("delete",)
+
+
+admin.site.register(EscapeRoom, EscapeRoomAdmin)
 admin.site.register(EscapeRoomSession, EscapeRoomSessionAdmin)
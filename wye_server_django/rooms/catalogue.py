@@ -0,0 +1,178 @@
+import bisect
+import re
+import threading
+import unicodedata
+
+from django.db import connections
+from django.db.models import CharField
+from django.db.models.expressions import RawSQL
+
+from core.response_cache import invalidate_global_responses
+from rooms.models import EscapeRoom
+
+# Words after the first one are only searched from this length on, shorter
+# prefixes would match too many rooms to be useful.
+MIN_WORD_PREFIX_LENGTH = 3
+
+
+def normalize_name(name):
+    """
+    Returns the key shared by the spellings of a room name, ignoring accents,
+    case, punctuation and extra spaces: "L'Évasion " becomes "l evasion".
+    """
+    name = unicodedata.normalize("NFKD", name)
+    name = "".join(character for character in name if not unicodedata.combining(character))
+    return " ".join(re.findall(r"[^\W_]+", name.casefold()))
+
+
+def get_rooms(names):
+    """
+    Returns the rooms of `names` keyed by name, adding the missing ones to the
+    catalogue.
+    """
+    normalized_names = {name: normalize_name(name) for name in names}
+    rooms = {
+        room.normalized_name: room
+        for room in EscapeRoom.objects.filter(normalized_name__in=set(normalized_names.values()))
+    }
+
+    missing = {}
+    for name, normalized_name in normalized_names.items():
+        if normalized_name not in rooms:
+            missing.setdefault(normalized_name, name)
+    if missing:
+        # Rooms added concurrently are left as they are, then read back.
+        EscapeRoom.objects.bulk_create(
+            [
+                EscapeRoom(name=name, normalized_name=normalized_name)
+                for normalized_name, name in missing.items()
+            ],
+            ignore_conflicts=True,
+        )
+        # bulk_create() does not send model signals.
+        invalidate_global_responses()
+        rooms.update(
+            (room.normalized_name, room)
+            for room in EscapeRoom.objects.filter(normalized_name__in=list(missing))
+        )
+
+    return {name: rooms[normalized_name] for name, normalized_name in normalized_names.items()}
+
+
+def assign_rooms(sessions):
+    rooms = get_rooms({session.name for session in sessions})
+    for session in sessions:
+        session.room = rooms[session.name]
+
+
+def search_rooms(prefix, count):
+    """
+    Returns up to `count` rooms whose name starts with `prefix`, in alphabetical
+    order, then rooms with another word starting with it.
+    """
+    prefix = normalize_name(prefix)
+    if not prefix or count <= 0:
+        return []
+    if connections[EscapeRoom.objects.db].vendor == "postgresql":
+        return _search_database(prefix, count)
+    return room_index.search(prefix, count)
+
+
+def _search_database(prefix, count):
+    # Compared byte by byte, names match the index of the search migration,
+    # which is walked in order from the prefix.
+    rooms = EscapeRoom.objects.annotate(
+        byte_name=RawSQL(
+            '"rooms_escaperoom"."normalized_name" COLLATE "C"', (), output_field=CharField()
+        )
+    )
+    rooms = list(rooms.filter(byte_name__startswith=prefix).order_by("byte_name")[:count])
+    if len(rooms) < count and len(prefix) >= MIN_WORD_PREFIX_LENGTH:
+        # The trigram index finds the other words but cannot return them in
+        # order: the first matches found are sorted.
+        others = EscapeRoom.objects.filter(normalized_name__contains=" " + prefix).exclude(
+            normalized_name__startswith=prefix
+        )[: count - len(rooms)]
+        rooms += sorted(others, key=lambda room: room.normalized_name)
+    return rooms
+
+
+class RoomIndex(object):
+    """
+    In-memory index of room names, for databases without trigram indexes, e.g.
+    SQLite in development and tests.
+
+    Names and the words after their first one are kept in sorted lists, a
+    prefix is looked up with a binary search. Rooms added to the catalogue are
+    loaded on the next search; renamed or deleted rooms only leave the index of
+    the processes that changed them.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def clear(self):
+        with self.lock:
+            self.reset()
+
+    def reset(self):
+        self.rooms = {}
+        self.names = []
+        self.words = []
+        self.last_id = 0
+
+    def refresh(self):
+        rooms = list(EscapeRoom.objects.filter(pk__gt=self.last_id).order_by("pk"))
+        if not rooms:
+            return
+
+        names, words = [], []
+        for room in rooms:
+            self.rooms[room.pk] = room
+            names.append((room.normalized_name, room.pk))
+            # Each entry runs from a word to the end of the name, so that a
+            # prefix can span several words.
+            starts = [match.start() for match in re.finditer(r" ", room.normalized_name)]
+            words.extend((room.normalized_name[start + 1:], room.pk) for start in starts)
+        for entries, new_entries in ((self.names, names), (self.words, words)):
+            if entries:
+                # Only a few rooms are added between two searches.
+                for entry in new_entries:
+                    bisect.insort(entries, entry)
+            else:
+                entries.extend(sorted(new_entries))
+        self.last_id = rooms[-1].pk
+
+    @staticmethod
+    def find(entries, prefix):
+        index = bisect.bisect_left(entries, (prefix,))
+        while index < len(entries) and entries[index][0].startswith(prefix):
+            yield entries[index][1]
+            index += 1
+
+    def search(self, prefix, count):
+        with self.lock:
+            self.refresh()
+            room_ids = []
+            for room_id in self.find(self.names, prefix):
+                if len(room_ids) == count:
+                    break
+                room_ids.append(room_id)
+
+            others = []
+            if len(room_ids) < count and len(prefix) >= MIN_WORD_PREFIX_LENGTH:
+                for room_id in self.find(self.words, prefix):
+                    if len(room_ids) + len(others) == count:
+                        break
+                    name = self.rooms[room_id].normalized_name
+                    if not name.startswith(prefix) and room_id not in others:
+                        others.append(room_id)
+
+            rooms = [self.rooms[room_id] for room_id in room_ids]
+            return rooms + sorted(
+                (self.rooms[room_id] for room_id in others), key=lambda room: room.normalized_name
+            )
+
+
+room_index = RoomIndex()
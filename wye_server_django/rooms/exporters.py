@@ -0,0 +1,55 @@
+import csv
+import json
+
+from django.conf import settings
+
+from rooms.importers import FIELDS
+
+
+class Echo(object):
+    # File-like object handing back what is written, so that csv.writer
+    # formats rows without buffering them.
+    def write(self, value):
+        return value
+
+
+def _rows(queryset):
+    rows = (
+        queryset.order_by("played_datetime", "pk")
+        .values_list(*FIELDS)
+        .iterator(chunk_size=settings.ROOM_SESSIONS_EXPORT_CHUNK_SIZE)
+    )
+    for name, played_datetime, duration_time, number_of_hints in rows:
+        yield name, played_datetime.isoformat(), duration_time.total_seconds(), number_of_hints
+
+
+def _chunked(lines):
+    # Lines are sent grouped, one write per row would dominate the export time.
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= settings.ROOM_SESSIONS_EXPORT_CHUNK_SIZE:
+            yield "".join(chunk)
+            chunk = []
+    if chunk:
+        yield "".join(chunk)
+
+
+def _csv_lines(queryset):
+    writer = csv.writer(Echo())
+    yield writer.writerow(FIELDS)
+    for row in _rows(queryset):
+        yield writer.writerow(row)
+
+
+def _json_lines(queryset):
+    for row in _rows(queryset):
+        yield json.dumps(dict(zip(FIELDS, row))) + "\n"
+
+
+def export_csv(queryset):
+    return _chunked(_csv_lines(queryset))
+
+
+def export_json_lines(queryset):
+    return _chunked(_json_lines(queryset))
@@ -0,0 +1,144 @@
+import csv
+import datetime
+import json
+import time
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.response_cache import invalidate_user_responses
+from rooms import catalogue, leaderboards, stats
+from rooms.models import EscapeRoomSession
+
+FIELDS = ["name", "played_datetime", "duration_time", "number_of_hints"]
+
+
+def _parse_played_datetime(value):
+    if isinstance(value, datetime.datetime):
+        played_datetime = value
+    else:
+        try:
+            played_datetime = parse_datetime(str(value))
+        except ValueError:
+            played_datetime = None
+        if played_datetime is None:
+            raise ValidationError({"played_datetime": ["Enter a valid ISO 8601 date/time."]})
+
+    if timezone.is_naive(played_datetime):
+        played_datetime = timezone.make_aware(played_datetime)
+    return played_datetime
+
+
+def _parse_duration_time(value):
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        raise ValidationError({"duration_time": ["Enter a number of seconds."]})
+    if not 0 <= seconds < datetime.timedelta.max.total_seconds():
+        raise ValidationError({"duration_time": ["Enter a positive number of seconds."]})
+    return datetime.timedelta(seconds=seconds)
+
+
+def build_room_session(user, values):
+    missing = [field for field in FIELDS if values.get(field) in (None, "")]
+    if missing:
+        raise ValidationError({field: ["This field is required."] for field in missing})
+
+    room_session = EscapeRoomSession(
+        name=values["name"],
+        played_datetime=_parse_played_datetime(values["played_datetime"]),
+        duration_time=_parse_duration_time(values["duration_time"]),
+        number_of_hints=values["number_of_hints"],
+        user=user,
+    )
+    # The user is already known to exist, checking it would cost one query per row.
+    room_session.full_clean(exclude=["user"])
+    if room_session.number_of_hints < 0:
+        raise ValidationError({"number_of_hints": ["Enter a positive number of hints."]})
+
+    return room_session
+
+
+def save_room_sessions(room_sessions):
+    # bulk_create() does not send model signals, rooms, statistics and leaderboards
+    # are updated by hand.
+    with transaction.atomic():
+        catalogue.assign_rooms(room_sessions)
+        EscapeRoomSession.objects.bulk_create(room_sessions)
+        stats.add_sessions(room_sessions)
+        leaderboards.add_sessions(room_sessions)
+        for user_id in {room_session.user_id for room_session in room_sessions}:
+            invalidate_user_responses(user_id)
+
+
+def read_csv_rows(lines):
+    return csv.DictReader(lines)
+
+
+def read_json_lines(lines):
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        if not isinstance(row, dict):
+            yield ValidationError("Line is not a valid JSON object.")
+        else:
+            yield row
+
+
+class ImportReport(object):
+    def __init__(self):
+        self.created = 0
+        self.error_count = 0
+        self.errors = []
+        self.started_at = time.monotonic()
+        self.duration = 0
+
+    def add_error(self, row_number, error):
+        self.error_count += 1
+        # Only the first errors are kept, a broken file must not fill up the memory.
+        if len(self.errors) < settings.ROOM_SESSIONS_IMPORT_MAX_REPORTED_ERRORS:
+            messages = error.message_dict if hasattr(error, "error_dict") else error.messages
+            self.errors.append({"row": row_number, "errors": messages})
+
+    def as_dict(self):
+        rows = self.created + self.error_count
+        return {
+            "created": self.created,
+            "errorCount": self.error_count,
+            "errors": self.errors,
+            "duration": self.duration,
+            "rowsPerSecond": rows / self.duration if self.duration else None,
+        }
+
+
+def import_room_sessions(user, rows, batch_size=None):
+    batch_size = batch_size or settings.ROOM_SESSIONS_IMPORT_BATCH_SIZE
+    report = ImportReport()
+    batch = []
+
+    for row_number, row in enumerate(rows, start=1):
+        try:
+            if isinstance(row, ValidationError):
+                raise row
+            batch.append(build_room_session(user, row))
+        except ValidationError as e:
+            report.add_error(row_number, e)
+
+        if len(batch) >= batch_size:
+            save_room_sessions(batch)
+            report.created += len(batch)
+            batch = []
+
+    if batch:
+        save_room_sessions(batch)
+        report.created += len(batch)
+
+    report.duration = time.monotonic() - report.started_at
+    return report
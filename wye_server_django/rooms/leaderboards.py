@@ -0,0 +1,444 @@
+from collections import OrderedDict, defaultdict
+from functools import reduce
+from operator import or_
+
+from django.db import IntegrityError, transaction
+from django.db.models import (
+    BigIntegerField,
+    Case,
+    Count,
+    ExpressionWrapper,
+    F,
+    IntegerField,
+    Q,
+    Value,
+    When,
+)
+
+from core.response_cache import invalidate_global_responses
+from rooms.models import EscapeRoomSession, LeaderboardEntry, LeaderboardScoreCount
+
+# Ranks are counted from a histogram of the scores of each leaderboard: one
+# bucket per second of duration, one per number of hints, the last bucket holding
+# every higher score. The histogram is stored as a Fenwick tree: the row of node
+# `n` counts the entries of the buckets `n - lowbit(n)` to `n - 1`, so that
+# counting the entries before a bucket reads, and moving an entry writes, at most
+# log2(BUCKET_COUNTS) rows whatever the number of players.
+BUCKET_SIZES = {
+    LeaderboardEntry.DURATION_TIME: 10 ** 6,
+    LeaderboardEntry.NUMBER_OF_HINTS: 1,
+}
+BUCKET_COUNTS = {
+    LeaderboardEntry.DURATION_TIME: 2 ** 20,
+    LeaderboardEntry.NUMBER_OF_HINTS: 2 ** 10,
+}
+
+# The best session of a user on each kind of leaderboard.
+SESSION_ORDERINGS = {
+    LeaderboardEntry.DURATION_TIME: ("duration_time", "number_of_hints", "played_datetime"),
+    LeaderboardEntry.NUMBER_OF_HINTS: ("number_of_hints", "duration_time", "played_datetime"),
+}
+
+ENTRY_ORDERING = ("score", "played_datetime", "user_id")
+
+
+def get_score(metric, session):
+    if metric == LeaderboardEntry.DURATION_TIME:
+        duration = session.duration_time
+        return (duration.days * 86400 + duration.seconds) * 10 ** 6 + duration.microseconds
+    return session.number_of_hints
+
+
+def get_bucket(metric, score):
+    return min(score // BUCKET_SIZES[metric], BUCKET_COUNTS[metric] - 1)
+
+
+def get_update_nodes(metric, bucket):
+    """
+    Returns the nodes of the tree counting the entries of `bucket`.
+    """
+    node = bucket + 1
+    # The root would only count every entry, it is never read.
+    while node < BUCKET_COUNTS[metric]:
+        yield node
+        node += node & -node
+
+
+def get_prefix_nodes(bucket):
+    """
+    Returns the nodes of the tree counting, together, the entries of the buckets
+    before `bucket`.
+    """
+    node = bucket
+    while node > 0:
+        yield node
+        node -= node & -node
+
+
+def build_tree(bucket_counts):
+    """
+    Returns the counts of the nodes of the trees of the buckets of
+    `bucket_counts`, both keyed by (metric, room, bucket or node).
+    """
+    nodes = defaultdict(int)
+    for (metric, room, bucket), count in bucket_counts.items():
+        for node in get_update_nodes(metric, bucket):
+            nodes[metric, room, node] += count
+    return nodes
+
+
+def _get_sort_key(key):
+    # Keys of the leaderboards of every room, with a null room, sort first.
+    metric, room_id, *rest = key
+    return (metric, room_id or 0, *rest)
+
+
+def _get_session_key(metric, session):
+    # Entries carry the fields of their session, they are compared the same way.
+    return tuple(getattr(session, field) for field in SESSION_ORDERINGS[metric])
+
+
+def _collect_best_sessions(sessions):
+    # The best session of each entry touched: (metric, None, user_id) is the
+    # entry of a user on the leaderboard of every room, (metric, room_id, user_id)
+    # the one on the leaderboard of a room.
+    best = {}
+    for session in sessions:
+        for metric in SESSION_ORDERINGS:
+            for room in (None, session.room_id):
+                key = (metric, room, session.user_id)
+                if key not in best or _get_session_key(metric, session) < _get_session_key(
+                    metric, best[key]
+                ):
+                    best[key] = session
+    # Rows are always locked in the same order so that concurrent writers
+    # cannot deadlock on each other.
+    return OrderedDict(sorted(best.items(), key=lambda item: _get_sort_key(item[0])))
+
+
+def _filter_rooms(queryset, rooms):
+    rooms = set(rooms)
+    condition = Q(room_id__in=rooms - {None})
+    if None in rooms:
+        condition |= Q(room=None)
+    return queryset.filter(condition)
+
+
+def _lock_entries(keys):
+    metrics, rooms, user_ids = (set(values) for values in zip(*keys)) if keys else ((), (), ())
+    entries = _filter_rooms(
+        LeaderboardEntry.objects.select_for_update().filter(
+            metric__in=metrics, user_id__in=user_ids
+        ),
+        rooms,
+    ).order_by("metric", "room", "user_id")
+    return {(entry.metric, entry.room_id, entry.user_id): entry for entry in entries}
+
+
+def _copy_session(entry, session):
+    entry.score = get_score(entry.metric, session)
+    entry.played_datetime = session.played_datetime
+    entry.duration_time = session.duration_time
+    entry.number_of_hints = session.number_of_hints
+
+
+def _update_score_counts(deltas):
+    # Rows are updated with one query per leaderboard, in the same order by
+    # every writer so that they cannot deadlock on each other.
+    leaderboards = defaultdict(dict)
+    for (metric, room, node), delta in build_tree(deltas).items():
+        if delta:
+            leaderboards[metric, room][node] = delta
+
+    for metric, room in sorted(leaderboards, key=_get_sort_key):
+        node_deltas = leaderboards[metric, room]
+        counts = LeaderboardScoreCount.objects.filter(
+            metric=metric, room_id=room, bucket__in=sorted(node_deltas)
+        )
+        updated = counts.update(
+            count=F("count")
+            + Case(
+                *[When(bucket=node, then=Value(delta)) for node, delta in node_deltas.items()],
+                output_field=IntegerField()
+            )
+        )
+        if updated == len(node_deltas):
+            continue
+        existing = set(counts.values_list("bucket", flat=True))
+        for node, delta in sorted(node_deltas.items()):
+            if node in existing or delta < 0:
+                continue
+            try:
+                with transaction.atomic():
+                    LeaderboardScoreCount.objects.create(
+                        metric=metric, room_id=room, bucket=node, count=delta
+                    )
+            except IntegrityError:
+                # Created by a concurrent writer in the meantime.
+                LeaderboardScoreCount.objects.filter(
+                    metric=metric, room_id=room, bucket=node
+                ).update(count=F("count") + delta)
+
+
+def _create_entry(metric, room, user_id, session):
+    # Returns None when the entry already exists.
+    entry = LeaderboardEntry(metric=metric, room_id=room, user_id=user_id)
+    _copy_session(entry, session)
+    try:
+        with transaction.atomic():
+            entry.save(force_insert=True)
+    except IntegrityError:
+        return None
+    return entry
+
+
+def add_sessions(sessions):
+    with transaction.atomic():
+        best_sessions = _collect_best_sessions(sessions)
+        entries = _lock_entries(list(best_sessions))
+        deltas = defaultdict(int)
+        changed = False
+
+        for (metric, room, user_id), session in best_sessions.items():
+            entry = entries.get((metric, room, user_id))
+            if entry is None:
+                entry = _create_entry(metric, room, user_id, session)
+                if entry is not None:
+                    deltas[metric, room, get_bucket(metric, entry.score)] += 1
+                    changed = True
+                    continue
+                # Created by a concurrent writer in the meantime.
+                entry = LeaderboardEntry.objects.select_for_update().get(
+                    metric=metric, room_id=room, user_id=user_id
+                )
+            if _get_session_key(metric, entry) <= _get_session_key(metric, session):
+                continue
+
+            deltas[metric, room, get_bucket(metric, entry.score)] -= 1
+            _copy_session(entry, session)
+            entry.save()
+            deltas[metric, room, get_bucket(metric, entry.score)] += 1
+            changed = True
+
+        _update_score_counts(deltas)
+        if changed:
+            invalidate_global_responses()
+
+
+def remove_sessions(sessions):
+    """
+    Must be called once the sessions are deleted or updated in database, so that
+    the best session of each entry can be looked up again among the remaining ones.
+    """
+    removed = defaultdict(set)
+    for session in sessions:
+        for metric in SESSION_ORDERINGS:
+            for room in (None, session.room_id):
+                removed[metric, room, session.user_id].add(_get_session_key(metric, session))
+
+    with transaction.atomic():
+        entries = _lock_entries(list(removed))
+        deltas = defaultdict(int)
+        changed = False
+
+        for (metric, room, user_id), session_keys in sorted(
+            removed.items(), key=lambda item: _get_sort_key(item[0])
+        ):
+            # Entries are never created here: they may be on their way out along
+            # with the user being deleted.
+            entry = entries.get((metric, room, user_id))
+            if entry is None or _get_session_key(metric, entry) not in session_keys:
+                continue
+
+            remaining = EscapeRoomSession.objects.filter(user_id=user_id)
+            if room is not None:
+                remaining = remaining.filter(room_id=room)
+            best = remaining.order_by(*SESSION_ORDERINGS[metric]).first()
+
+            deltas[metric, room, get_bucket(metric, entry.score)] -= 1
+            changed = True
+            if best is None:
+                entry.delete()
+                continue
+            _copy_session(entry, best)
+            entry.save()
+            deltas[metric, room, get_bucket(metric, entry.score)] += 1
+
+        _update_score_counts(deltas)
+        if changed:
+            invalidate_global_responses()
+
+
+def remove_user(user_id):
+    """
+    Drops the entries of a user, before the user is deleted.
+    """
+    with transaction.atomic():
+        entries = LeaderboardEntry.objects.filter(user_id=user_id)
+        deltas = defaultdict(int)
+        for entry in entries.select_for_update().order_by("metric", "room"):
+            deltas[entry.metric, entry.room_id, get_bucket(entry.metric, entry.score)] -= 1
+        entries.delete()
+        _update_score_counts(deltas)
+        if deltas:
+            invalidate_global_responses()
+
+
+def rebuild_entries(user_ids):
+    sessions = EscapeRoomSession.objects.filter(user_id__in=user_ids).only(
+        "room_id", "played_datetime", "duration_time", "number_of_hints", "user_id"
+    )
+
+    with transaction.atomic():
+        deltas = defaultdict(int)
+        entries = LeaderboardEntry.objects.filter(user_id__in=user_ids)
+        for entry in entries.select_for_update().order_by("metric", "room", "user_id"):
+            deltas[entry.metric, entry.room_id, get_bucket(entry.metric, entry.score)] -= 1
+        entries.delete()
+
+        new_entries = []
+        for (metric, room, user_id), session in _collect_best_sessions(
+            sessions.iterator()
+        ).items():
+            entry = LeaderboardEntry(metric=metric, room_id=room, user_id=user_id)
+            _copy_session(entry, session)
+            new_entries.append(entry)
+            deltas[metric, room, get_bucket(metric, entry.score)] += 1
+        LeaderboardEntry.objects.bulk_create(new_entries)
+
+        _update_score_counts(deltas)
+        invalidate_global_responses()
+
+
+def recount_scores():
+    """
+    Counts the scores of every leaderboard from scratch.
+    """
+    with transaction.atomic():
+        LeaderboardScoreCount.objects.all().delete()
+        bucket_counts = defaultdict(int)
+        for metric, bucket_size in BUCKET_SIZES.items():
+            rows = (
+                LeaderboardEntry.objects.filter(metric=metric)
+                .annotate(
+                    bucket=ExpressionWrapper(
+                        F("score") / bucket_size, output_field=BigIntegerField()
+                    )
+                )
+                .values("room", "bucket")
+                .annotate(count=Count("id"))
+                .order_by()
+            )
+            for row in rows:
+                bucket = min(row["bucket"], BUCKET_COUNTS[metric] - 1)
+                bucket_counts[metric, row["room"], bucket] += row["count"]
+        LeaderboardScoreCount.objects.bulk_create(
+            LeaderboardScoreCount(metric=metric, room_id=room, bucket=node, count=count)
+            for (metric, room, node), count in build_tree(bucket_counts).items()
+            if count
+        )
+
+
+class Leaderboard(object):
+    """
+    Ranking of the best session of each user, in a room or in every room.
+
+    Entries are ordered by score, then by date of their session. Entries with
+    the same score share the same rank, e.g. 1, 2, 2, 4.
+    """
+
+    def __init__(self, metric, room_id=None):
+        self.metric = metric
+        self.room_id = room_id
+        self.entries = LeaderboardEntry.objects.filter(metric=metric, room_id=room_id)
+
+    def get_ranks(self, scores):
+        """
+        Returns the rank of each score of `scores`, with two queries whatever
+        their number.
+        """
+        buckets = {score: get_bucket(self.metric, score) for score in set(scores)}
+        nodes = {score: list(get_prefix_nodes(bucket)) for score, bucket in buckets.items()}
+        counts = dict(
+            LeaderboardScoreCount.objects.filter(
+                metric=self.metric,
+                room_id=self.room_id,
+                bucket__in={node for score_nodes in nodes.values() for node in score_nodes},
+            ).values_list("bucket", "count")
+        )
+
+        # Entries with a lower score in the bucket of each score.
+        ranges = {}
+        for score, bucket in buckets.items():
+            bucket_start = bucket * BUCKET_SIZES[self.metric]
+            if score > bucket_start:
+                ranges[score] = Q(score__gte=bucket_start, score__lt=score)
+        before = {}
+        if ranges:
+            aggregates = self.entries.filter(reduce(or_, ranges.values())).aggregate(
+                **{
+                    "before_{}".format(score): Count("id", filter=score_range)
+                    for score, score_range in ranges.items()
+                }
+            )
+            before = {score: aggregates["before_{}".format(score)] for score in ranges}
+
+        return {
+            score: 1
+            + sum(counts.get(node, 0) for node in nodes[score])
+            + before.get(score, 0)
+            for score in buckets
+        }
+
+    def get_rank(self, score):
+        return self.get_ranks([score])[score]
+
+    def rank_entries(self, entries):
+        ranks = self.get_ranks(entry.score for entry in entries)
+        for entry in entries:
+            entry.rank = ranks[entry.score]
+        return entries
+
+    def top(self, count):
+        entries = list(self.entries.select_related("user").order_by(*ENTRY_ORDERING)[:count])
+        # Ranks of the top entries follow from their positions.
+        for position, entry in enumerate(entries):
+            if position and entry.score == entries[position - 1].score:
+                entry.rank = entries[position - 1].rank
+            else:
+                entry.rank = position + 1
+        return entries
+
+    def get_entry(self, user_id):
+        entry = self.entries.select_related("user").filter(user_id=user_id).first()
+        if entry is None:
+            return None
+        return self.rank_entries([entry])[0]
+
+    def around(self, entry, count):
+        """
+        Returns `entry` along with up to `count` entries before and after it.
+        """
+        entries = self.entries.select_related("user")
+        # Each query seeks the index from the position of the entry.
+        tied = entries.filter(score=entry.score)
+        before = list(
+            tied.filter(played_datetime__lte=entry.played_datetime)
+            .exclude(played_datetime=entry.played_datetime, user_id__gte=entry.user_id)
+            .order_by("-played_datetime", "-user_id")[:count]
+        )
+        if len(before) < count:
+            before += entries.filter(score__lt=entry.score).order_by(
+                "-score", "-played_datetime", "-user_id"
+            )[: count - len(before)]
+        after = list(
+            tied.filter(played_datetime__gte=entry.played_datetime)
+            .exclude(played_datetime=entry.played_datetime, user_id__lte=entry.user_id)
+            .order_by(*ENTRY_ORDERING[1:])[:count]
+        )
+        if len(after) < count:
+            after += entries.filter(score__gt=entry.score).order_by(*ENTRY_ORDERING)[
+                : count - len(after)
+            ]
+
+        return self.rank_entries(before[::-1] + [entry] + after)
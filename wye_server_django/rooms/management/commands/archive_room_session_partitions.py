@@ -0,0 +1,45 @@
+import argparse
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from rooms import partitions
+
+
+def parse_month(value):
+    try:
+        return datetime.datetime.strptime(value, "%Y-%m").date()
+    except ValueError:
+        raise argparse.ArgumentTypeError("Months are written YYYY-MM, e.g. 2019-01.")
+
+
+class Command(BaseCommand):
+    help = (
+        "Detaches the monthly partitions of room sessions played before a month, on "
+        "PostgreSQL. Their sessions are left in tables of their own, to dump and drop."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--before", type=parse_month, required=True, help="YYYY-MM")
+        parser.add_argument(
+            "--drop", action="store_true", help="Drop the detached partitions."
+        )
+
+    def handle(self, *args, **options):
+        if not partitions.is_partitioned(connection):
+            self.stdout.write("Room sessions are not partitioned on this database.")
+            return
+
+        months = [
+            month for month in partitions.list_partitions(connection) if month < options["before"]
+        ]
+        for month in months:
+            partitions.detach_partition(connection, month, drop=options["drop"])
+            self.stdout.write(
+                "{} {}.".format(
+                    "Dropped" if options["drop"] else "Detached",
+                    partitions.get_partition_name(month),
+                )
+            )
+        self.stdout.write("Archived {} partitions.".format(len(months)))
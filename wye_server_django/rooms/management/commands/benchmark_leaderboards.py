@@ -0,0 +1,136 @@
+import datetime
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from rooms.catalogue import get_rooms
+from rooms.leaderboards import Leaderboard
+from rooms.models import EscapeRoom, EscapeRoomSession, LeaderboardEntry
+
+EMAIL_TEMPLATE = "leaderboard-benchmark-{}@wye.com"
+
+
+def percentile(durations, ratio):
+    durations = sorted(durations)
+    return durations[min(len(durations) - 1, int(len(durations) * ratio))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Fills the database with generated room sessions, then measures the leaderboard "
+        "queries and updates. Run it against a throwaway database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sessions", type=int, default=10 ** 7)
+        parser.add_argument("--users", type=int, default=10 ** 6)
+        parser.add_argument("--rooms", type=int, default=200)
+        parser.add_argument(
+            "--samples", type=int, default=200, help="Number of measures of each operation."
+        )
+        parser.add_argument(
+            "--skip-populate",
+            action="store_true",
+            help="Reuse the sessions generated by a previous run.",
+        )
+
+    def populate(self, users, sessions, rooms, batch_size=10000):
+        User = get_user_model()
+        for start in range(0, users, batch_size):
+            User.objects.bulk_create(
+                User(
+                    email=EMAIL_TEMPLATE.format(index),
+                    pseudo="Player {}".format(index),
+                    password="!",
+                )
+                for index in range(start, min(users, start + batch_size))
+            )
+        user_ids = list(
+            User.objects.filter(email__startswith="leaderboard-benchmark-").values_list(
+                "pk", flat=True
+            )
+        )
+
+        rooms = list(get_rooms(["Room {}".format(index) for index in range(rooms)]).values())
+        now = timezone.now()
+        for start in range(0, sessions, batch_size):
+            EscapeRoomSession.objects.bulk_create(
+                EscapeRoomSession(
+                    name=room.name,
+                    room=room,
+                    played_datetime=now - datetime.timedelta(minutes=random.randrange(10 ** 6)),
+                    duration_time=datetime.timedelta(seconds=random.uniform(1200, 5400)),
+                    number_of_hints=random.randrange(10),
+                    user_id=random.choice(user_ids),
+                )
+                for room in random.choices(rooms, k=min(batch_size, sessions - start))
+            )
+            self.stdout.write("\r{} sessions".format(start + batch_size), ending="")
+        self.stdout.write("")
+        return user_ids
+
+    def measure(self, label, operation, samples):
+        durations = []
+        for _ in range(samples):
+            started_at = time.perf_counter()
+            operation()
+            durations.append(time.perf_counter() - started_at)
+        self.stdout.write(
+            "{:<48} p50 {:7.2f} ms   p99 {:7.2f} ms".format(
+                label, percentile(durations, 0.5) * 1000, percentile(durations, 0.99) * 1000
+            )
+        )
+
+    def handle(self, *args, **options):
+        samples = options["samples"]
+        if options["skip_populate"]:
+            user_ids = list(
+                get_user_model()
+                .objects.filter(email__startswith="leaderboard-benchmark-")
+                .values_list("pk", flat=True)
+            )
+        else:
+            user_ids = self.populate(options["users"], options["sessions"], options["rooms"])
+
+            started_at = time.perf_counter()
+            call_command("rebuild_leaderboards", stdout=self.stdout)
+            self.stdout.write("Rebuilt in {:.1f} s".format(time.perf_counter() - started_at))
+
+        self.stdout.write(
+            "{} entries for {} sessions".format(
+                LeaderboardEntry.objects.count(), EscapeRoomSession.objects.count()
+            )
+        )
+
+        for metric in (LeaderboardEntry.DURATION_TIME, LeaderboardEntry.NUMBER_OF_HINTS):
+            for room in (None, EscapeRoom.objects.filter(name="Room 0").first()):
+                leaderboard = Leaderboard(metric, room and room.pk)
+                label = "{} {}".format(metric, room or "(all rooms)")
+                entries = list(leaderboard.entries.values_list("user_id", flat=True)[:10000])
+
+                def rank_and_neighbours():
+                    entry = leaderboard.get_entry(random.choice(entries))
+                    leaderboard.around(entry, 5)
+
+                self.measure(label + ": top 10", lambda: leaderboard.top(10), samples)
+                self.measure(
+                    label + ": my rank",
+                    lambda: leaderboard.get_entry(random.choice(entries)),
+                    samples,
+                )
+                self.measure(label + ": rank and neighbours", rank_and_neighbours, samples)
+
+        def create_session():
+            EscapeRoomSession.objects.create(
+                name="Room {}".format(random.randrange(options["rooms"])),
+                played_datetime=timezone.now(),
+                duration_time=datetime.timedelta(seconds=random.uniform(1200, 5400)),
+                number_of_hints=random.randrange(10),
+                user_id=random.choice(user_ids),
+            )
+
+        self.measure("create a session", create_session, samples)
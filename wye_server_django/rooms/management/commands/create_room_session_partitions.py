@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from rooms import partitions
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates the monthly partitions of room sessions ahead of time, on PostgreSQL. "
+        "Run it at least once a month."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--months-ahead",
+            type=int,
+            default=partitions.MONTHS_AHEAD,
+            help="Number of months after the current one to create partitions for.",
+        )
+
+    def handle(self, *args, **options):
+        if not partitions.is_partitioned(connection):
+            self.stdout.write("Room sessions are not partitioned on this database.")
+            return
+
+        months = partitions.create_future_partitions(connection, options["months_ahead"])
+        for month in months:
+            self.stdout.write("Created {}.".format(partitions.get_partition_name(month)))
+        self.stdout.write("Created {} partitions.".format(len(months)))
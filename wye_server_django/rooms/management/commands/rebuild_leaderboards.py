@@ -0,0 +1,35 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from rooms.leaderboards import rebuild_entries, recount_scores
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the leaderboards from the room sessions of every user."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of users whose entries are rebuilt in one transaction.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        user_ids = get_user_model().objects.order_by("pk").values_list("pk", flat=True)
+
+        rebuilt = 0
+        last_user_id = 0
+        while True:
+            batch = list(user_ids.filter(pk__gt=last_user_id)[:batch_size])
+            if not batch:
+                break
+            rebuild_entries(batch)
+            rebuilt += len(batch)
+            last_user_id = batch[-1]
+
+        # Entries were rebuilt, counts of scores may still be off.
+        recount_scores()
+
+        self.stdout.write("Rebuilt leaderboards of {} users.".format(rebuilt))
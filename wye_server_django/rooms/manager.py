@@ -0,0 +1,53 @@
+import datetime
+
+from django.db import models
+from django.utils import timezone
+
+
+class EscapeRoomSessionQuerySet(models.QuerySet):
+    """
+    Sessions are partitioned by month of `played_datetime` on PostgreSQL (see
+    rooms.partitions). Only comparisons of `played_datetime` with values limit
+    a query to some partitions: other lookups of it, e.g. `__month` or
+    `__date`, wrap the column in a function and read every partition.
+    """
+
+    def played_between(self, start=None, end=None):
+        queryset = self
+        if start is not None:
+            queryset = queryset.filter(played_datetime__gte=start)
+        if end is not None:
+            queryset = queryset.filter(played_datetime__lt=end)
+        return queryset
+
+    def played_in_month(self, month):
+        """
+        Sessions played during `month`, a date, in the current time zone.
+        """
+        start = datetime.datetime.combine(month.replace(day=1), datetime.time.min)
+        end = (start + datetime.timedelta(days=32)).replace(day=1)
+        return self.played_between(timezone.make_aware(start), timezone.make_aware(end))
+
+    def with_key(self, pk, played_datetime):
+        """
+        The session `pk`, looked up in the partition of its `played_datetime`
+        only.
+        """
+        return self.filter(pk=pk, played_datetime=played_datetime)
+
+    def filter_by(self, played_after=None, played_before=None, name_prefix=None, room=None,
+                  min_number_of_hints=None, max_number_of_hints=None):
+        queryset = self.played_between(played_after, played_before)
+        if name_prefix:
+            queryset = queryset.filter(name__istartswith=name_prefix)
+        if room is not None:
+            queryset = queryset.filter(room_id=room)
+        if min_number_of_hints is not None:
+            queryset = queryset.filter(number_of_hints__gte=min_number_of_hints)
+        if max_number_of_hints is not None:
+            queryset = queryset.filter(number_of_hints__lte=max_number_of_hints)
+        return queryset
+
+
+class EscapeRoomSessionManager(models.Manager.from_queryset(EscapeRoomSessionQuerySet)):
+    pass
@@ -0,0 +1,17 @@
+# Generated by Django 2.2.8 on 2026-10-18 08:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rooms', '0004_auto_20191108_1333'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='escaperoomsession',
+            index=models.Index(fields=['user', 'played_datetime', 'id'], name='room_session_user_played_idx'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 2.2.8 on 2026-10-18 08:57
+
+import datetime
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('rooms', '0005_escaperoomsession_user_played_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoomSessionStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total_duration_time', models.DurationField(default=datetime.timedelta(0))),
+                ('best_duration_time', models.DurationField(null=True)),
+                ('total_number_of_hints', models.BigIntegerField(default=0)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='room_session_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='RoomSessionMonthlyStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total_duration_time', models.DurationField(default=datetime.timedelta(0))),
+                ('best_duration_time', models.DurationField(null=True)),
+                ('total_number_of_hints', models.BigIntegerField(default=0)),
+                ('month', models.DateField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='room_session_monthly_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'month')},
+            },
+        ),
+    ]
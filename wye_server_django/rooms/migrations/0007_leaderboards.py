@@ -0,0 +1,50 @@
+# Generated by Django 2.2.8 on 2026-10-18 09:31
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('rooms', '0006_room_session_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardScoreCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metric', models.CharField(choices=[('duration_time', 'Fastest duration'), ('number_of_hints', 'Fewest hints')], max_length=20)),
+                ('room', models.CharField(blank=True, max_length=255)),
+                ('bucket', models.BigIntegerField()),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('metric', 'room', 'bucket')},
+            },
+        ),
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metric', models.CharField(choices=[('duration_time', 'Fastest duration'), ('number_of_hints', 'Fewest hints')], max_length=20)),
+                ('room', models.CharField(blank=True, max_length=255)),
+                ('score', models.BigIntegerField()),
+                ('played_datetime', models.DateTimeField()),
+                ('duration_time', models.DurationField()),
+                ('number_of_hints', models.IntegerField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='leaderboardentry',
+            index=models.Index(fields=['metric', 'room', 'score', 'played_datetime', 'user'], name='leaderboard_rank_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='leaderboardentry',
+            unique_together={('metric', 'room', 'user')},
+        ),
+    ]
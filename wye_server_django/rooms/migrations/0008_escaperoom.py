@@ -0,0 +1,51 @@
+# Generated by Django 2.2.8 on 2026-10-18 09:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_search_indexes(apps, schema_editor):
+    # Only on PostgreSQL, other databases use the in-memory index of rooms.catalogue.
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    # Byte order both matches prefixes and returns names in order.
+    schema_editor.execute(
+        'CREATE INDEX rooms_escaperoom_name_prefix ON rooms_escaperoom (normalized_name COLLATE "C")'
+    )
+    # Finds the words after the first one.
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(
+        "CREATE INDEX rooms_escaperoom_name_trgm ON rooms_escaperoom "
+        "USING gin (normalized_name gin_trgm_ops)"
+    )
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS rooms_escaperoom_name_trgm")
+    schema_editor.execute("DROP INDEX IF EXISTS rooms_escaperoom_name_prefix")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rooms', '0007_leaderboards'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EscapeRoom',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('normalized_name', models.CharField(max_length=255, unique=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='escaperoomsession',
+            name='room',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='sessions', to='rooms.EscapeRoom'),
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,81 @@
+import re
+import unicodedata
+
+from django.db import migrations
+from django.db.models import Case, Count, IntegerField, Value, When
+
+# Spellings linked to their room per query: well under the 65535 parameters of
+# PostgreSQL, and the 999 of older SQLite versions.
+POSTGRESQL_BATCH_SIZE = 5000
+BATCH_SIZE = 300
+
+
+def normalize_name(name):
+    # As of this migration, see rooms.catalogue.
+    name = unicodedata.normalize("NFKD", name)
+    name = "".join(character for character in name if not unicodedata.combining(character))
+    return " ".join(re.findall(r"[^\W_]+", name.casefold()))
+
+
+def link_sessions(schema_editor, EscapeRoomSession, room_ids):
+    # Sessions are scanned once per batch of spellings, not once per spelling.
+    names = sorted(room_ids)
+    if schema_editor.connection.vendor == "postgresql":
+        table = schema_editor.quote_name(EscapeRoomSession._meta.db_table)
+        for start in range(0, len(names), POSTGRESQL_BATCH_SIZE):
+            batch = names[start : start + POSTGRESQL_BATCH_SIZE]
+            schema_editor.execute(
+                "UPDATE {table} SET room_id = spellings.room_id "
+                "FROM (VALUES {values}) AS spellings (name, room_id) "
+                "WHERE {table}.name = spellings.name".format(
+                    table=table, values=", ".join(["(%s, %s)"] * len(batch))
+                ),
+                [value for name in batch for value in (name, room_ids[name])],
+            )
+        return
+
+    for start in range(0, len(names), BATCH_SIZE):
+        batch = names[start : start + BATCH_SIZE]
+        EscapeRoomSession.objects.filter(name__in=batch).update(
+            room_id=Case(
+                *[When(name=name, then=Value(room_ids[name])) for name in batch],
+                output_field=IntegerField()
+            )
+        )
+
+
+def build_catalogue(apps, schema_editor):
+    EscapeRoom = apps.get_model("rooms", "EscapeRoom")
+    EscapeRoomSession = apps.get_model("rooms", "EscapeRoomSession")
+
+    spellings = {}
+    names = EscapeRoomSession.objects.values("name").annotate(count=Count("id")).order_by()
+    for row in names:
+        spellings.setdefault(normalize_name(row["name"]), []).append((row["count"], row["name"]))
+
+    # The most common spelling names the room.
+    EscapeRoom.objects.bulk_create(
+        EscapeRoom(name=max(names)[1], normalized_name=normalized_name)
+        for normalized_name, names in spellings.items()
+    )
+    rooms = dict(EscapeRoom.objects.values_list("normalized_name", "pk"))
+    link_sessions(
+        schema_editor,
+        EscapeRoomSession,
+        {
+            name: rooms[normalized_name]
+            for normalized_name, names in spellings.items()
+            for _, name in names
+        },
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rooms', '0008_escaperoom'),
+    ]
+
+    operations = [
+        migrations.RunPython(build_catalogue, migrations.RunPython.noop),
+    ]
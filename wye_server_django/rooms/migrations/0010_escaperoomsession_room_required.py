@@ -0,0 +1,17 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rooms', '0009_escaperoom_catalogue'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='escaperoomsession',
+            name='room',
+            field=models.ForeignKey(editable=False, on_delete=django.db.models.deletion.PROTECT, related_name='sessions', to='rooms.EscapeRoom'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations
+
+from rooms import partitions
+
+
+def partition_room_sessions(apps, schema_editor):
+    # Only on PostgreSQL, other databases keep a single table.
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    partitions.partition_table(schema_editor.connection)
+
+
+def unpartition_room_sessions(apps, schema_editor):
+    if not partitions.is_partitioned(schema_editor.connection):
+        return
+    partitions.unpartition_table(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rooms', '0010_escaperoomsession_room_required'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_room_sessions, unpartition_room_sessions),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 2.2.8 on 2026-10-18 14:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rooms', '0011_partition_room_sessions'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='escaperoomsession',
+            index=models.Index(fields=['played_datetime'], name='room_session_played_idx'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+from collections import defaultdict
+
+from django.db import migrations
+
+# As of this migration, see rooms.leaderboards.
+BUCKET_SIZES = {"duration_time": 10 ** 6, "number_of_hints": 1}
+BUCKET_COUNTS = {"duration_time": 2 ** 20, "number_of_hints": 2 ** 10}
+
+
+def count_buckets(apps):
+    LeaderboardEntry = apps.get_model("rooms", "LeaderboardEntry")
+
+    counts = defaultdict(int)
+    entries = LeaderboardEntry.objects.values_list("metric", "room", "score")
+    for metric, room, score in entries.iterator():
+        bucket = min(score // BUCKET_SIZES[metric], BUCKET_COUNTS[metric] - 1)
+        counts[metric, room, bucket] += 1
+    return counts
+
+
+def save_counts(apps, counts):
+    LeaderboardScoreCount = apps.get_model("rooms", "LeaderboardScoreCount")
+
+    LeaderboardScoreCount.objects.all().delete()
+    LeaderboardScoreCount.objects.bulk_create(
+        (
+            LeaderboardScoreCount(metric=metric, room=room, bucket=bucket, count=count)
+            for (metric, room, bucket), count in counts.items()
+            if count
+        ),
+        batch_size=1000,
+    )
+
+
+def build_score_trees(apps, schema_editor):
+    nodes = defaultdict(int)
+    for (metric, room, bucket), count in count_buckets(apps).items():
+        node = bucket + 1
+        while node < BUCKET_COUNTS[metric]:
+            nodes[metric, room, node] += count
+            node += node & -node
+    save_counts(apps, nodes)
+
+
+def build_score_histograms(apps, schema_editor):
+    save_counts(apps, count_buckets(apps))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rooms', '0012_escaperoomsession_played_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(build_score_trees, build_score_histograms),
+    ]
@@ -0,0 +1,94 @@
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+
+def link_rooms(apps, schema_editor):
+    EscapeRoom = apps.get_model("rooms", "EscapeRoom")
+    room_ids = EscapeRoom.objects.filter(normalized_name=OuterRef("room")).values("pk")
+
+    for model_name in ("LeaderboardEntry", "LeaderboardScoreCount"):
+        rows = apps.get_model("rooms", model_name).objects.exclude(room="")
+        rows.update(escape_room=Subquery(room_ids[:1]))
+        # Names without a room cannot be ranked anymore.
+        rows.filter(escape_room=None).delete()
+
+
+def unlink_rooms(apps, schema_editor):
+    EscapeRoom = apps.get_model("rooms", "EscapeRoom")
+    names = EscapeRoom.objects.filter(pk=OuterRef("escape_room")).values("normalized_name")
+
+    for model_name in ("LeaderboardEntry", "LeaderboardScoreCount"):
+        rows = apps.get_model("rooms", model_name).objects.exclude(escape_room=None)
+        rows.update(room=Subquery(names[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rooms', '0013_leaderboard_score_tree'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='leaderboardentry',
+            unique_together=set(),
+        ),
+        migrations.AlterUniqueTogether(
+            name='leaderboardscorecount',
+            unique_together=set(),
+        ),
+        migrations.RemoveIndex(
+            model_name='leaderboardentry',
+            name='leaderboard_rank_idx',
+        ),
+        migrations.AddField(
+            model_name='leaderboardentry',
+            name='escape_room',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='rooms.EscapeRoom'),
+        ),
+        migrations.AddField(
+            model_name='leaderboardscorecount',
+            name='escape_room',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='rooms.EscapeRoom'),
+        ),
+        migrations.RunPython(link_rooms, unlink_rooms),
+        migrations.RemoveField(
+            model_name='leaderboardentry',
+            name='room',
+        ),
+        migrations.RemoveField(
+            model_name='leaderboardscorecount',
+            name='room',
+        ),
+        migrations.RenameField(
+            model_name='leaderboardentry',
+            old_name='escape_room',
+            new_name='room',
+        ),
+        migrations.RenameField(
+            model_name='leaderboardscorecount',
+            old_name='escape_room',
+            new_name='room',
+        ),
+        migrations.AddIndex(
+            model_name='leaderboardentry',
+            index=models.Index(fields=['metric', 'room', 'score', 'played_datetime', 'user'], name='leaderboard_rank_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='leaderboardentry',
+            constraint=models.UniqueConstraint(fields=('metric', 'room', 'user'), name='leaderboard_entry_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='leaderboardentry',
+            constraint=models.UniqueConstraint(condition=models.Q(room=None), fields=('metric', 'user'), name='leaderboard_entry_all_rooms_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='leaderboardscorecount',
+            constraint=models.UniqueConstraint(fields=('metric', 'room', 'bucket'), name='leaderboard_score_count_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='leaderboardscorecount',
+            constraint=models.UniqueConstraint(condition=models.Q(room=None), fields=('metric', 'bucket'), name='leaderboard_score_count_all_rooms_unique'),
+        ),
+    ]
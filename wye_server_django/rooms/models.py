@@ -1,9 +1,152 @@
+import datetime
+
 from django.db import models
 
+from rooms import manager
+
+
 # Create your models here.
+class EscapeRoom(models.Model):
+    """
+    Room of the catalogue, shared by the sessions whose names only differ by
+    accents, case, punctuation or spaces.
+    """
+
+    # Most common spelling of the name.
+    name = models.CharField(max_length=255)
+    normalized_name = models.CharField(max_length=255, unique=True)
+
+    def __str__(self):
+        return self.name
+
+
 class EscapeRoomSession(models.Model):
     name = models.CharField(max_length=255)
+    # Set from the name when the session is saved.
+    room = models.ForeignKey(
+        EscapeRoom, on_delete=models.PROTECT, related_name="sessions", editable=False
+    )
     played_datetime = models.DateTimeField()
     duration_time = models.DurationField()
     number_of_hints = models.IntegerField()
     user = models.ForeignKey("account.WYEUser", on_delete=models.CASCADE)
+
+    objects = manager.EscapeRoomSessionManager()
+
+    class Meta:
+        indexes = [
+            # Keyset pagination of a user's sessions walks this index, so every
+            # page costs the same whatever the depth of the cursor.
+            models.Index(
+                fields=["user", "played_datetime", "id"],
+                name="room_session_user_played_idx",
+            ),
+            # Bounds of the date hierarchy of the admin.
+            models.Index(fields=["played_datetime"], name="room_session_played_idx"),
+        ]
+
+
+class RoomSessionStatsBase(models.Model):
+    count = models.PositiveIntegerField(default=0)
+    total_duration_time = models.DurationField(default=datetime.timedelta(0))
+    best_duration_time = models.DurationField(null=True)
+    total_number_of_hints = models.BigIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+    @property
+    def average_duration_time(self):
+        if not self.count:
+            return None
+        return self.total_duration_time / self.count
+
+    @property
+    def average_number_of_hints(self):
+        if not self.count:
+            return None
+        return self.total_number_of_hints / self.count
+
+
+class RoomSessionStats(RoomSessionStatsBase):
+    user = models.OneToOneField(
+        "account.WYEUser", on_delete=models.CASCADE, related_name="room_session_stats"
+    )
+
+
+class RoomSessionMonthlyStats(RoomSessionStatsBase):
+    user = models.ForeignKey(
+        "account.WYEUser",
+        on_delete=models.CASCADE,
+        related_name="room_session_monthly_stats",
+    )
+    month = models.DateField()
+
+    class Meta:
+        unique_together = ("user", "month")
+
+
+class LeaderboardEntry(models.Model):
+    """
+    Best session of a user on a leaderboard, the lower the score the better.
+
+    Session fields are copied so that leaderboards are read without joining the
+    sessions table.
+    """
+
+    DURATION_TIME = "duration_time"
+    NUMBER_OF_HINTS = "number_of_hints"
+    METRICS = ((DURATION_TIME, "Fastest duration"), (NUMBER_OF_HINTS, "Fewest hints"))
+
+    metric = models.CharField(max_length=20, choices=METRICS)
+    # Null on the leaderboards of every room.
+    room = models.ForeignKey(EscapeRoom, on_delete=models.CASCADE, null=True, related_name="+")
+    user = models.ForeignKey("account.WYEUser", on_delete=models.CASCADE, related_name="+")
+    score = models.BigIntegerField()
+    played_datetime = models.DateTimeField()
+    duration_time = models.DurationField()
+    number_of_hints = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["metric", "room", "user"], name="leaderboard_entry_unique"
+            ),
+            # Nulls are distinct in unique constraints.
+            models.UniqueConstraint(
+                fields=["metric", "user"],
+                condition=models.Q(room=None),
+                name="leaderboard_entry_all_rooms_unique",
+            ),
+        ]
+        indexes = [
+            # Top entries and the neighbours of an entry are read from this index.
+            models.Index(
+                fields=["metric", "room", "score", "played_datetime", "user"],
+                name="leaderboard_rank_idx",
+            )
+        ]
+
+
+class LeaderboardScoreCount(models.Model):
+    """
+    Number of entries of a leaderboard in a range of buckets of scores, the node
+    `bucket` of a Fenwick tree over its buckets.
+    """
+
+    metric = models.CharField(max_length=20, choices=LeaderboardEntry.METRICS)
+    room = models.ForeignKey(EscapeRoom, on_delete=models.CASCADE, null=True, related_name="+")
+    bucket = models.BigIntegerField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["metric", "room", "bucket"], name="leaderboard_score_count_unique"
+            ),
+            models.UniqueConstraint(
+                fields=["metric", "bucket"],
+                condition=models.Q(room=None),
+                name="leaderboard_score_count_all_rooms_unique",
+            ),
+        ]
@@ -0,0 +1,220 @@
+import datetime
+import re
+
+from django.db import transaction
+from django.utils import timezone
+
+# Room sessions are partitioned by month of `played_datetime` on PostgreSQL, in
+# UTC: one table per month, named after it, and a default partition for the
+# months without one. Other databases keep a single table.
+TABLE = "rooms_escaperoomsession"
+DEFAULT_PARTITION = TABLE + "_default"
+# Partitions are created this number of months in advance.
+MONTHS_AHEAD = 3
+PARTITION_NAME_RE = re.compile(r"^{}_p(\d{{4}})_(\d{{2}})$".format(TABLE))
+
+
+def get_partition_name(month):
+    return "{}_p{:%Y_%m}".format(TABLE, month)
+
+
+def get_partition_bounds(month):
+    start = datetime.datetime(month.year, month.month, 1, tzinfo=datetime.timezone.utc)
+    return start, (start + datetime.timedelta(days=32)).replace(day=1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def is_partitioned(connection):
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s))",
+            [TABLE],
+        )
+        return cursor.fetchone()[0]
+
+
+def list_partitions(connection):
+    """
+    Returns the months of the partitions attached to the table, in order.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(%s)",
+            [TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    months = []
+    for name in names:
+        match = PARTITION_NAME_RE.match(name)
+        if match:
+            months.append(datetime.date(int(match.group(1)), int(match.group(2)), 1))
+    return sorted(months)
+
+
+def create_partition(connection, month):
+    """
+    Creates the partition of `month` unless it exists, and returns whether it
+    was created.
+    """
+    name = get_partition_name(month)
+    start, end = get_partition_bounds(month)
+    range_condition = "played_datetime >= '{}' AND played_datetime < '{}'".format(
+        start.isoformat(), end.isoformat()
+    )
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [name])
+        if cursor.fetchone()[0]:
+            return False
+
+        # Sessions of the month may have been saved to the default partition
+        # before, they are moved to the new one.
+        cursor.execute(
+            "SELECT EXISTS (SELECT 1 FROM {} WHERE {})".format(DEFAULT_PARTITION, range_condition)
+        )
+        misplaced = cursor.fetchone()[0]
+        if misplaced:
+            cursor.execute("ALTER TABLE {} DETACH PARTITION {}".format(TABLE, DEFAULT_PARTITION))
+        cursor.execute(
+            "CREATE TABLE {} PARTITION OF {} FOR VALUES FROM ('{}') TO ('{}')".format(
+                name, TABLE, start.isoformat(), end.isoformat()
+            )
+        )
+        if misplaced:
+            cursor.execute(
+                "INSERT INTO {} SELECT * FROM {} WHERE {}".format(
+                    name, DEFAULT_PARTITION, range_condition
+                )
+            )
+            cursor.execute("DELETE FROM {} WHERE {}".format(DEFAULT_PARTITION, range_condition))
+            cursor.execute(
+                "ALTER TABLE {} ATTACH PARTITION {} DEFAULT".format(TABLE, DEFAULT_PARTITION)
+            )
+    return True
+
+
+def create_future_partitions(connection, months_ahead):
+    """
+    Creates the partitions of the current month and of the `months_ahead` next
+    ones, and returns the months of those created.
+    """
+    month = timezone.now().date().replace(day=1)
+    months = [add_months(month, count) for count in range(months_ahead + 1)]
+    return [month for month in months if create_partition(connection, month)]
+
+
+def detach_partition(connection, month, drop=False):
+    """
+    Detaches the partition of `month` from the table: its sessions are left in
+    a table of their own, to archive, or dropped.
+    """
+    name = get_partition_name(month)
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute("ALTER TABLE {} DETACH PARTITION {}".format(TABLE, name))
+        if drop:
+            cursor.execute("DROP TABLE {}".format(name))
+
+
+def _get_table_definition(cursor, table):
+    # Indexes and foreign keys are dropped and created again along with the
+    # table, under the same names.
+    cursor.execute(
+        "SELECT conname FROM pg_constraint WHERE confrelid = to_regclass(%s)", [table]
+    )
+    references = [row[0] for row in cursor.fetchall()]
+    if references:
+        raise RuntimeError(
+            "Foreign keys reference {}: {}. Declare them with db_constraint=False, "
+            "partitioned tables cannot be referenced before PostgreSQL 12.".format(
+                table, ", ".join(references)
+            )
+        )
+
+    cursor.execute(
+        "SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype = 'p'",
+        [table],
+    )
+    primary_key = cursor.fetchone()[0]
+    cursor.execute(
+        "SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s AND indexname <> %s",
+        [table, primary_key],
+    )
+    indexes = cursor.fetchall()
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = to_regclass(%s) AND contype = 'f'",
+        [table],
+    )
+    foreign_keys = cursor.fetchall()
+    cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [table])
+    sequence = cursor.fetchone()[0]
+    return primary_key, indexes, foreign_keys, sequence
+
+
+def _rebuild_table(connection, partitioned):
+    # The table is renamed, created again in its new form, then filled with the
+    # rows of the former one. Sessions are locked out meanwhile.
+    former = TABLE + "_former"
+    with connection.cursor() as cursor:
+        primary_key, indexes, foreign_keys, sequence = _get_table_definition(cursor, TABLE)
+        cursor.execute("ALTER TABLE {} RENAME TO {}".format(TABLE, former))
+        cursor.execute("ALTER INDEX {} RENAME TO {}_pkey".format(primary_key, former))
+        for name, _ in indexes:
+            cursor.execute("DROP INDEX {}".format(name))
+        for name, _ in foreign_keys:
+            cursor.execute("ALTER TABLE {} DROP CONSTRAINT {}".format(former, name))
+
+        cursor.execute(
+            "CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS INCLUDING CONSTRAINTS){}".format(
+                TABLE, former, " PARTITION BY RANGE (played_datetime)" if partitioned else ""
+            )
+        )
+        # Primary keys of partitioned tables must include the partitioning column.
+        cursor.execute(
+            "ALTER TABLE {} ADD CONSTRAINT {} PRIMARY KEY ({})".format(
+                TABLE, primary_key, "id, played_datetime" if partitioned else "id"
+            )
+        )
+        # The sequence would be dropped along with the former table.
+        cursor.execute("ALTER SEQUENCE {} OWNED BY {}.id".format(sequence, TABLE))
+
+        if partitioned:
+            cursor.execute(
+                "CREATE TABLE {} PARTITION OF {} DEFAULT".format(DEFAULT_PARTITION, TABLE)
+            )
+            cursor.execute(
+                "SELECT DISTINCT date_trunc('month', played_datetime AT TIME ZONE 'UTC')::date "
+                "FROM {}".format(former)
+            )
+            for (month,) in cursor.fetchall():
+                create_partition(connection, month)
+            create_future_partitions(connection, MONTHS_AHEAD)
+
+        cursor.execute("INSERT INTO {} SELECT * FROM {}".format(TABLE, former))
+        # Attached partitions, if any, are dropped along with the former table.
+        cursor.execute("DROP TABLE {}".format(former))
+
+        # Built once the rows are copied, which is faster. Definitions were read
+        # before the former table was renamed, they apply to the new one.
+        for _, definition in indexes:
+            cursor.execute(definition)
+        for name, definition in foreign_keys:
+            cursor.execute("ALTER TABLE {} ADD CONSTRAINT {} {}".format(TABLE, name, definition))
+
+
+def partition_table(connection):
+    _rebuild_table(connection, partitioned=True)
+
+
+def unpartition_table(connection):
+    """
+    Merges the attached partitions back into a single table. Detached ones are
+    left as they are.
+    """
+    _rebuild_table(connection, partitioned=False)
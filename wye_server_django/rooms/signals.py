@@ -0,0 +1,61 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from core.response_cache import invalidate_global_responses, invalidate_user_responses
+from rooms import catalogue, leaderboards, stats
+from rooms.models import EscapeRoom, EscapeRoomSession
+
+
+@receiver(pre_save, sender=EscapeRoomSession)
+def remember_previous_session(sender, instance, raw, **kwargs):
+    instance._previous_session = None
+    if instance.pk is not None and not raw:
+        instance._previous_session = sender.objects.filter(pk=instance.pk).first()
+
+
+@receiver(pre_save, sender=EscapeRoomSession)
+def assign_room(sender, instance, raw, **kwargs):
+    if raw:
+        return
+    if instance.room_id is None or (
+        catalogue.normalize_name(instance.name) != instance.room.normalized_name
+    ):
+        catalogue.assign_rooms([instance])
+
+
+@receiver(post_save, sender=EscapeRoom)
+@receiver(post_delete, sender=EscapeRoom)
+def clear_room_index(sender, created=False, **kwargs):
+    invalidate_global_responses()
+    # Added rooms are loaded on the next search, changed ones need a new index.
+    if not created:
+        catalogue.room_index.clear()
+
+
+@receiver(post_save, sender=EscapeRoomSession)
+def update_stats_on_save(sender, instance, raw, **kwargs):
+    if raw:
+        return
+    previous_session = getattr(instance, "_previous_session", None)
+    if previous_session is not None:
+        stats.remove_sessions([previous_session])
+        leaderboards.remove_sessions([previous_session])
+        invalidate_user_responses(previous_session.user_id)
+    stats.add_sessions([instance])
+    leaderboards.add_sessions([instance])
+    invalidate_user_responses(instance.user_id)
+
+
+@receiver(post_delete, sender=EscapeRoomSession)
+def update_stats_on_delete(sender, instance, **kwargs):
+    stats.remove_sessions([instance])
+    leaderboards.remove_sessions([instance])
+    invalidate_user_responses(instance.user_id)
+
+
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def remove_leaderboard_entries(sender, instance, **kwargs):
+    # Entries would otherwise be deleted in cascade, without updating the counts
+    # of scores.
+    leaderboards.remove_user(instance.pk)
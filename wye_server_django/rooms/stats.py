@@ -0,0 +1,136 @@
+import datetime
+from collections import OrderedDict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Min, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from rooms.models import EscapeRoomSession, RoomSessionMonthlyStats, RoomSessionStats
+
+
+def get_month(played_datetime):
+    return timezone.localtime(played_datetime).date().replace(day=1)
+
+
+def _collect_deltas(sessions):
+    # One delta per stats row touched: (user_id, None) is the overall row of a
+    # user, (user_id, month) one of its monthly buckets.
+    deltas = {}
+    for session in sessions:
+        for month in (None, get_month(session.played_datetime)):
+            key = (session.user_id, month)
+            count, duration, best, hints = deltas.get(key, (0, datetime.timedelta(0), None, 0))
+            deltas[key] = (
+                count + 1,
+                duration + session.duration_time,
+                session.duration_time if best is None else min(best, session.duration_time),
+                hints + session.number_of_hints,
+            )
+
+    # Rows are always locked in the same order so that concurrent writers
+    # cannot deadlock on each other.
+    return OrderedDict(
+        sorted(deltas.items(), key=lambda item: (item[0][0], item[0][1] or datetime.date.min))
+    )
+
+
+def _get_stats_queryset(user_id, month):
+    if month is None:
+        return RoomSessionStats.objects.filter(user_id=user_id)
+    return RoomSessionMonthlyStats.objects.filter(user_id=user_id, month=month)
+
+
+def _lock_or_create_stats(user_id, month):
+    stats = _get_stats_queryset(user_id, month).select_for_update()
+    row = stats.first()
+    if row is not None:
+        return row
+    try:
+        with transaction.atomic():
+            if month is None:
+                return RoomSessionStats.objects.create(user_id=user_id)
+            return RoomSessionMonthlyStats.objects.create(user_id=user_id, month=month)
+    except IntegrityError:
+        # Created by a concurrent writer in the meantime.
+        return stats.get()
+
+
+def add_sessions(sessions):
+    with transaction.atomic():
+        for (user_id, month), (count, duration, best, hints) in _collect_deltas(sessions).items():
+            stats = _lock_or_create_stats(user_id, month)
+            stats.count += count
+            stats.total_duration_time += duration
+            stats.total_number_of_hints += hints
+            if stats.best_duration_time is None or best < stats.best_duration_time:
+                stats.best_duration_time = best
+            stats.save()
+
+
+def remove_sessions(sessions):
+    """
+    Must be called once the sessions are deleted or updated in database, so that
+    the best duration can be looked up again among the remaining sessions.
+    """
+    with transaction.atomic():
+        for (user_id, month), (count, duration, best, hints) in _collect_deltas(sessions).items():
+            # Rows are never created here: they may be on their way out along
+            # with the user being deleted.
+            stats = _get_stats_queryset(user_id, month).select_for_update().first()
+            if stats is None:
+                continue
+
+            stats.count -= count
+            if month is not None and stats.count <= 0:
+                stats.delete()
+                continue
+
+            stats.total_duration_time -= duration
+            stats.total_number_of_hints -= hints
+            if stats.best_duration_time is not None and best <= stats.best_duration_time:
+                remaining = EscapeRoomSession.objects.filter(user_id=user_id)
+                if month is not None:
+                    remaining = remaining.played_in_month(month)
+                stats.best_duration_time = remaining.aggregate(best=Min("duration_time"))["best"]
+            stats.save()
+
+
+def _stats_values(row):
+    return {
+        "count": row["count"],
+        "total_duration_time": row["total_duration_time"],
+        "best_duration_time": row["best_duration_time"],
+        "total_number_of_hints": row["total_number_of_hints"],
+    }
+
+
+def rebuild_stats(user_ids):
+    aggregates = {
+        "count": Count("id"),
+        "total_duration_time": Sum("duration_time"),
+        "best_duration_time": Min("duration_time"),
+        "total_number_of_hints": Sum("number_of_hints"),
+    }
+    sessions = EscapeRoomSession.objects.filter(user_id__in=user_ids).order_by()
+
+    with transaction.atomic():
+        RoomSessionStats.objects.filter(user_id__in=user_ids).delete()
+        RoomSessionMonthlyStats.objects.filter(user_id__in=user_ids).delete()
+
+        totals = sessions.values("user_id").annotate(**aggregates)
+        RoomSessionStats.objects.bulk_create(
+            RoomSessionStats(user_id=row["user_id"], **_stats_values(row)) for row in totals
+        )
+
+        months = (
+            sessions.annotate(month=TruncMonth("played_datetime"))
+            .values("user_id", "month")
+            .annotate(**aggregates)
+        )
+        RoomSessionMonthlyStats.objects.bulk_create(
+            RoomSessionMonthlyStats(
+                user_id=row["user_id"], month=row["month"].date(), **_stats_values(row)
+            )
+            for row in months
+        )
@@ -1,11 +1,35 @@
 import datetime
+import gzip
+import importlib
+import io
+import json
 import pytz
+from unittest import mock
 
+from django.apps import apps
+from django.contrib.admin import site
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Value
+from django.db.models.functions import Coalesce
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 
+from core.flat_lists import FlatListPlan
 from core.test_helpers import AssertMixin
-from rooms.models import EscapeRoomSession
+from rooms import leaderboards, partitions
+from rooms import stats as room_stats
+from rooms.catalogue import assign_rooms, normalize_name, room_index
+from rooms.models import (
+    EscapeRoom,
+    EscapeRoomSession,
+    LeaderboardEntry,
+    LeaderboardScoreCount,
+    RoomSessionMonthlyStats,
+    RoomSessionStats,
+)
 
 # Create your tests here.
 class WYEEscapeRoomSessions(AssertMixin, TestCase):
@@ -118,3 +142,1340 @@ class WYEEscapeRoomSessions(AssertMixin, TestCase):
                 user=self.user,
             ).exists()
         )
+
+
+class WYEEscapeRoomSessionsConnection(AssertMixin, TestCase):
+    def setUp(self):
+        self.private_graph_url = "/private_graphql/"
+        self.user = get_user_model().objects.create_user(
+            email="romain@wye.com", pseudo="Romain", password="pass"
+        )
+        for day in range(1, 6):
+            EscapeRoomSession.objects.create(
+                name="Escape Room {}".format(day),
+                played_datetime=datetime.datetime(2001, 1, day, 12, 0, 0, tzinfo=pytz.UTC),
+                duration_time=datetime.timedelta(minutes=40 + day),
+                number_of_hints=day,
+                user=self.user,
+            )
+
+        self.client.login(email="romain@wye.com", password="pass")
+
+    def query_connection(self, arguments):
+        query = """
+            {
+                roomSessionsConnection(%s) {
+                  pageInfo {
+                    hasNextPage
+                    hasPreviousPage
+                    startCursor
+                    endCursor
+                  }
+                  edges {
+                    node {
+                      name
+                    }
+                  }
+                }
+            }
+        """ % arguments
+
+        response = self.client.get(self.private_graph_url, {"query": query})
+
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content.decode())
+
+    def get_names(self, content):
+        edges = content["data"]["roomSessionsConnection"]["edges"]
+        return [edge["node"]["name"] for edge in edges]
+
+    def test_returns_most_recent_sessions_first(self):
+        content = self.query_connection("first: 2")
+
+        self.assertEqual(self.get_names(content), ["Escape Room 5", "Escape Room 4"])
+        page_info = content["data"]["roomSessionsConnection"]["pageInfo"]
+        self.assertTrue(page_info["hasNextPage"])
+        self.assertFalse(page_info["hasPreviousPage"])
+
+    def test_paginates_forward_with_after_cursor(self):
+        content = self.query_connection("first: 2")
+        end_cursor = content["data"]["roomSessionsConnection"]["pageInfo"]["endCursor"]
+
+        content = self.query_connection('first: 2, after: "{}"'.format(end_cursor))
+        self.assertEqual(self.get_names(content), ["Escape Room 3", "Escape Room 2"])
+
+        end_cursor = content["data"]["roomSessionsConnection"]["pageInfo"]["endCursor"]
+        content = self.query_connection('first: 2, after: "{}"'.format(end_cursor))
+        self.assertEqual(self.get_names(content), ["Escape Room 1"])
+        page_info = content["data"]["roomSessionsConnection"]["pageInfo"]
+        self.assertFalse(page_info["hasNextPage"])
+        self.assertTrue(page_info["hasPreviousPage"])
+
+    def test_paginates_backward_with_before_cursor(self):
+        content = self.query_connection("last: 2")
+        self.assertEqual(self.get_names(content), ["Escape Room 2", "Escape Room 1"])
+
+        start_cursor = content["data"]["roomSessionsConnection"]["pageInfo"]["startCursor"]
+        content = self.query_connection('last: 2, before: "{}"'.format(start_cursor))
+        self.assertEqual(self.get_names(content), ["Escape Room 4", "Escape Room 3"])
+        self.assertTrue(
+            content["data"]["roomSessionsConnection"]["pageInfo"]["hasPreviousPage"]
+        )
+
+    def test_cursor_breaks_ties_on_identical_played_datetime(self):
+        EscapeRoomSession.objects.update(
+            played_datetime=datetime.datetime(2001, 1, 1, 12, 0, 0, tzinfo=pytz.UTC)
+        )
+
+        content = self.query_connection("first: 3")
+        end_cursor = content["data"]["roomSessionsConnection"]["pageInfo"]["endCursor"]
+        first_page = self.get_names(content)
+        content = self.query_connection('first: 3, after: "{}"'.format(end_cursor))
+
+        self.assertEqual(
+            sorted(first_page + self.get_names(content)),
+            ["Escape Room {}".format(day) for day in range(1, 6)],
+        )
+
+    def test_filters_and_orders_sessions(self):
+        content = self.query_connection(
+            'playedAfter: "2001-01-02T00:00:00+00:00", '
+            'playedBefore: "2001-01-05T00:00:00+00:00", '
+            "maxNumberOfHints: 3, orderBy: DURATION_TIME_ASC"
+        )
+        self.assertEqual(self.get_names(content), ["Escape Room 2", "Escape Room 3"])
+
+        content = self.query_connection('namePrefix: "escape room 4"')
+        self.assertEqual(self.get_names(content), ["Escape Room 4"])
+
+    def test_does_not_return_room_sessions_for_a_different_user(self):
+        self.client.logout()
+        get_user_model().objects.create_user(
+            email="new-user@wye.com", pseudo="NewUser", password="NewUser"
+        )
+        self.client.login(email="new-user@wye.com", password="NewUser")
+
+        content = self.query_connection("first: 10")
+
+        self.assertEqual(self.get_names(content), [])
+
+    def test_cursor_bounds_the_index_range(self):
+        content = self.query_connection("first: 2")
+        end_cursor = content["data"]["roomSessionsConnection"]["pageInfo"]["endCursor"]
+
+        with CaptureQueriesContext(connection) as queries:
+            self.query_connection('first: 2, after: "{}"'.format(end_cursor))
+
+        sql = next(query["sql"] for query in queries if "ORDER BY" in query["sql"])
+        self.assertIn('"played_datetime" <= ', sql)
+
+    def test_rejects_invalid_cursor(self):
+        content = self.query_connection('first: 2, after: "not-a-cursor"')
+
+        self.assertEqual(content["errors"][0]["message"], 'Invalid cursor "not-a-cursor".')
+
+
+class WYEEscapeRoomStats(AssertMixin, TestCase):
+    def setUp(self):
+        self.private_graph_url = "/private_graphql/"
+        self.user = get_user_model().objects.create_user(
+            email="romain@wye.com", pseudo="Romain", password="pass"
+        )
+
+        self.client.login(email="romain@wye.com", password="pass")
+
+    def create_session(self, month, minutes, number_of_hints):
+        return EscapeRoomSession.objects.create(
+            name="Escape Room Toulouse",
+            played_datetime=datetime.datetime(2001, month, 1, 12, 0, 0, tzinfo=pytz.UTC),
+            duration_time=datetime.timedelta(minutes=minutes),
+            number_of_hints=number_of_hints,
+            user=self.user,
+        )
+
+    def query_stats(self):
+        query = """
+            {
+                roomStats {
+                  count
+                  totalDurationTime
+                  averageDurationTime
+                  bestDurationTime
+                  averageNumberOfHints
+                  months {
+                    month
+                    count
+                    bestDurationTime
+                  }
+                }
+            }
+        """
+
+        response = self.client.get(self.private_graph_url, {"query": query})
+
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content.decode())["data"]["roomStats"]
+
+    def test_returns_empty_stats_if_no_escape_rooms(self):
+        self.assertEqual(
+            self.query_stats(),
+            {
+                "count": 0,
+                "totalDurationTime": 0.0,
+                "averageDurationTime": None,
+                "bestDurationTime": None,
+                "averageNumberOfHints": None,
+                "months": [],
+            },
+        )
+
+    def test_returns_stats_of_user_sessions(self):
+        self.create_session(month=1, minutes=50, number_of_hints=2)
+        self.create_session(month=1, minutes=40, number_of_hints=1)
+        self.create_session(month=3, minutes=60, number_of_hints=0)
+
+        self.assertEqual(
+            self.query_stats(),
+            {
+                "count": 3,
+                "totalDurationTime": 9000.0,
+                "averageDurationTime": 3000.0,
+                "bestDurationTime": 2400.0,
+                "averageNumberOfHints": 1.0,
+                "months": [
+                    {"month": "2001-01-01", "count": 2, "bestDurationTime": 2400.0},
+                    {"month": "2001-03-01", "count": 1, "bestDurationTime": 3600.0},
+                ],
+            },
+        )
+
+    def test_stats_follow_updated_and_deleted_sessions(self):
+        self.create_session(month=1, minutes=50, number_of_hints=2)
+        best_session = self.create_session(month=1, minutes=40, number_of_hints=1)
+        moved_session = self.create_session(month=3, minutes=60, number_of_hints=0)
+
+        best_session.delete()
+        moved_session.played_datetime = datetime.datetime(2001, 1, 2, tzinfo=pytz.UTC)
+        moved_session.save()
+
+        stats = self.query_stats()
+        self.assertEqual(stats["count"], 2)
+        self.assertEqual(stats["bestDurationTime"], 3000.0)
+        self.assertEqual(
+            stats["months"], [{"month": "2001-01-01", "count": 2, "bestDurationTime": 3000.0}]
+        )
+
+    def test_stats_rows_created_concurrently_are_updated(self):
+        self.create_session(month=1, minutes=50, number_of_hints=2)
+        session = EscapeRoomSession(
+            name="Escape Room Toulouse",
+            played_datetime=datetime.datetime(2001, 1, 2, 12, 0, 0, tzinfo=pytz.UTC),
+            duration_time=datetime.timedelta(minutes=40),
+            number_of_hints=1,
+            user=self.user,
+        )
+
+        # Rows look missing, as when created by another transaction after the lookup.
+        with mock.patch("django.db.models.QuerySet.first", return_value=None):
+            room_stats.add_sessions([session])
+
+        stats = self.query_stats()
+        self.assertEqual(stats["count"], 2)
+        self.assertEqual(stats["bestDurationTime"], 2400.0)
+        self.assertEqual(
+            stats["months"], [{"month": "2001-01-01", "count": 2, "bestDurationTime": 2400.0}]
+        )
+
+    def test_create_room_session_mutation_updates_stats(self):
+        mutation = """
+            mutation {
+              createRoomSession(name: "Escape room Youkidea", playedDatetime:"2012-11-23T13:32:00+00:00", durationTime:1200.0, numberOfHints:0) {
+                roomSession {
+                  name
+                }
+              }
+            }
+        """
+
+        self.client.post(self.private_graph_url, {"query": mutation})
+
+        stats = self.query_stats()
+        self.assertEqual(stats["count"], 1)
+        self.assertEqual(stats["bestDurationTime"], 1200.0)
+
+    def test_rebuild_command_matches_incremental_stats(self):
+        self.create_session(month=1, minutes=50, number_of_hints=2)
+        self.create_session(month=1, minutes=40, number_of_hints=1)
+        self.create_session(month=3, minutes=60, number_of_hints=0)
+        incremental_stats = self.query_stats()
+
+        RoomSessionStats.objects.all().delete()
+        RoomSessionMonthlyStats.objects.all().delete()
+        call_command("rebuild_room_stats", stdout=io.StringIO())
+
+        self.assertEqual(self.query_stats(), incremental_stats)
+
+
+class WYELeaderboards(AssertMixin, TestCase):
+    def setUp(self):
+        self.private_graph_url = "/private_graphql/"
+        self.users = {
+            pseudo: get_user_model().objects.create_user(
+                email="{}@wye.com".format(pseudo.lower()), pseudo=pseudo, password="pass"
+            )
+            for pseudo in ("Romain", "Remi", "Alice", "Bob", "Carol")
+        }
+
+        self.client.login(email="romain@wye.com", password="pass")
+
+    def create_session(self, pseudo, seconds, number_of_hints=0, name="Le Bunker", day=1):
+        return EscapeRoomSession.objects.create(
+            name=name,
+            played_datetime=datetime.datetime(2001, 1, day, 12, 0, 0, tzinfo=pytz.UTC),
+            duration_time=datetime.timedelta(seconds=seconds),
+            number_of_hints=number_of_hints,
+            user=self.users[pseudo],
+        )
+
+    def query_leaderboard(self, arguments, fields):
+        query = "{ leaderboard(%s) { %s } }" % (arguments, fields)
+
+        response = self.client.post(
+            self.private_graph_url, json.dumps({"query": query}), content_type="application/json"
+        )
+
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content.decode())["data"]["leaderboard"]
+
+    def test_ranks_best_session_of_each_user(self):
+        self.create_session("Romain", 3000)
+        self.create_session("Romain", 2400)
+        self.create_session("Remi", 2400, day=2)
+        self.create_session("Alice", 2400.5)
+        self.create_session("Bob", 1800)
+
+        leaderboard = self.query_leaderboard(
+            "metric: DURATION_TIME", "top(first: 3) { rank pseudo durationTime }"
+        )
+
+        self.assertEqual(
+            leaderboard["top"],
+            [
+                {"rank": 1, "pseudo": "Bob", "durationTime": 1800.0},
+                {"rank": 2, "pseudo": "Romain", "durationTime": 2400.0},
+                {"rank": 2, "pseudo": "Remi", "durationTime": 2400.0},
+            ],
+        )
+
+    def test_returns_rank_and_neighbours_of_user(self):
+        self.create_session("Bob", 1800, number_of_hints=3)
+        self.create_session("Alice", 2400.5, number_of_hints=1)
+        self.create_session("Remi", 2400.25, number_of_hints=0)
+        self.create_session("Romain", 2400.75, number_of_hints=1)
+        self.create_session("Carol", 3000, number_of_hints=1, day=2)
+
+        leaderboard = self.query_leaderboard(
+            "metric: DURATION_TIME",
+            "me { rank pseudo } aroundMe(count: 1) { rank pseudo }",
+        )
+        self.assertEqual(leaderboard["me"], {"rank": 4, "pseudo": "Romain"})
+        self.assertEqual(
+            leaderboard["aroundMe"],
+            [
+                {"rank": 3, "pseudo": "Alice"},
+                {"rank": 4, "pseudo": "Romain"},
+                {"rank": 5, "pseudo": "Carol"},
+            ],
+        )
+
+        leaderboard = self.query_leaderboard(
+            "metric: NUMBER_OF_HINTS",
+            "me { rank numberOfHints } aroundMe(count: 5) { rank pseudo }",
+        )
+        self.assertEqual(leaderboard["me"], {"rank": 2, "numberOfHints": 1})
+        self.assertEqual(
+            leaderboard["aroundMe"],
+            [
+                {"rank": 1, "pseudo": "Remi"},
+                # Ties are ordered by date, then by user.
+                {"rank": 2, "pseudo": "Romain"},
+                {"rank": 2, "pseudo": "Alice"},
+                {"rank": 2, "pseudo": "Carol"},
+                {"rank": 5, "pseudo": "Bob"},
+            ],
+        )
+
+    def test_ranks_users_within_a_room(self):
+        session = self.create_session("Romain", 3000, name="Le Bunker")
+        self.create_session("Remi", 2400, name="Le Loft")
+        self.create_session("Alice", 3600, name="le bunker !")
+
+        leaderboard = self.query_leaderboard(
+            'metric: DURATION_TIME, room: "{}"'.format(session.room_id),
+            "top { rank pseudo } me { rank }",
+        )
+
+        self.assertEqual(
+            leaderboard,
+            {
+                "top": [{"rank": 1, "pseudo": "Romain"}, {"rank": 2, "pseudo": "Alice"}],
+                "me": {"rank": 1},
+            },
+        )
+
+    def test_returns_no_rank_to_users_without_sessions(self):
+        self.create_session("Remi", 2400)
+
+        leaderboard = self.query_leaderboard(
+            "metric: DURATION_TIME", "me { rank } aroundMe { rank }"
+        )
+
+        self.assertEqual(leaderboard, {"me": None, "aroundMe": []})
+
+    def get_leaderboards(self):
+        # Named after their room, empty on the leaderboards of every room.
+        room_name = Coalesce("room__name", Value(""))
+        entries = LeaderboardEntry.objects.annotate(room_name=room_name).values_list(
+            "metric", "room_name", "user__pseudo", "score", "played_datetime"
+        )
+        counts = (
+            LeaderboardScoreCount.objects.filter(count__gt=0)
+            .annotate(room_name=room_name)
+            .values_list("metric", "room_name", "bucket", "count")
+        )
+        return sorted(entries), sorted(counts)
+
+    def test_leaderboards_follow_sessions_and_users(self):
+        session = self.create_session("Romain", 3000, number_of_hints=2)
+        best_session = self.create_session("Romain", 2400, number_of_hints=1)
+        moved_session = self.create_session("Remi", 2000, number_of_hints=4, name="Le Loft")
+        self.create_session("Alice", 1800)
+        self.create_session("Bob", 2500)
+
+        best_session.delete()
+        moved_session.name = "Le Bunker"
+        moved_session.duration_time = datetime.timedelta(seconds=3500)
+        moved_session.save()
+        self.users["Bob"].delete()
+
+        incremental_leaderboards = self.get_leaderboards()
+        self.assertIn(
+            (LeaderboardEntry.DURATION_TIME, "", "Romain", 3000 * 10 ** 6, session.played_datetime),
+            incremental_leaderboards[0],
+        )
+        self.assertNotIn("Bob", [entry[2] for entry in incremental_leaderboards[0]])
+        self.assertNotIn("Le Loft", [entry[1] for entry in incremental_leaderboards[0]])
+
+        LeaderboardEntry.objects.all().delete()
+        LeaderboardScoreCount.objects.all().delete()
+        call_command("rebuild_leaderboards", stdout=io.StringIO())
+
+        self.assertEqual(self.get_leaderboards(), incremental_leaderboards)
+
+    def test_entries_created_concurrently_are_updated(self):
+        self.create_session("Romain", 3000, number_of_hints=2)
+        session = EscapeRoomSession(
+            name="Le Bunker",
+            played_datetime=datetime.datetime(2001, 1, 2, 12, 0, 0, tzinfo=pytz.UTC),
+            duration_time=datetime.timedelta(seconds=2400),
+            number_of_hints=3,
+            user=self.users["Romain"],
+        )
+        assign_rooms([session])
+        EscapeRoomSession.objects.bulk_create([session])
+
+        # Entries look missing, as when created by another transaction after the lookup.
+        with mock.patch("rooms.leaderboards._lock_entries", return_value={}):
+            leaderboards.add_sessions([session])
+
+        incremental_leaderboards = self.get_leaderboards()
+        self.assertIn(
+            (LeaderboardEntry.DURATION_TIME, "", "Romain", 2400 * 10 ** 6, session.played_datetime),
+            incremental_leaderboards[0],
+        )
+        call_command("rebuild_leaderboards", stdout=io.StringIO())
+        self.assertEqual(self.get_leaderboards(), incremental_leaderboards)
+
+    def test_import_updates_leaderboards(self):
+        mutation = """
+            mutation {
+              createRoomSessions(roomSessions: [
+                {name: "Le Bunker", playedDatetime: "2001-01-01T12:00:00+00:00", durationTime: 2400, numberOfHints: 1},
+                {name: "Le Bunker", playedDatetime: "2001-01-02T12:00:00+00:00", durationTime: 1800, numberOfHints: 2}
+              ]) {
+                count
+              }
+            }
+        """
+        self.client.post(self.private_graph_url, {"query": mutation})
+        self.create_session("Remi", 2000, number_of_hints=1)
+
+        leaderboard = self.query_leaderboard(
+            "metric: NUMBER_OF_HINTS", "top { rank pseudo durationTime numberOfHints }"
+        )
+
+        self.assertEqual(
+            leaderboard["top"],
+            [
+                {"rank": 1, "pseudo": "Romain", "durationTime": 2400.0, "numberOfHints": 1},
+                {"rank": 1, "pseudo": "Remi", "durationTime": 2000.0, "numberOfHints": 1},
+            ],
+        )
+
+    def test_rank_runs_in_constant_queries(self):
+        for index, pseudo in enumerate(self.users):
+            self.create_session(pseudo, 2400.5 - index / 10)
+
+        with self.assertNumQueries(4):
+            # User, entry, then the counts of lower buckets and of its own bucket.
+            self.query_leaderboard("metric: DURATION_TIME", "me { rank }")
+
+    def test_ranks_neighbours_with_the_same_queries(self):
+        # Scores in distinct buckets, in the same one, and past the last bucket.
+        for pseudo, seconds in zip(self.users, (10 ** 7, 3000.5, 3000, 1800, 2 ** 21)):
+            self.create_session(pseudo, seconds)
+
+        with self.assertNumQueries(10):
+            # User, entry and its rank, the 4 queries of neighbours, then their ranks
+            # with one query per kind of count.
+            leaderboard = self.query_leaderboard(
+                "metric: DURATION_TIME", "aroundMe(count: 5) { rank pseudo }"
+            )
+
+        self.assertEqual(
+            leaderboard["aroundMe"],
+            [
+                {"rank": 1, "pseudo": "Bob"},
+                {"rank": 2, "pseudo": "Alice"},
+                {"rank": 3, "pseudo": "Remi"},
+                {"rank": 4, "pseudo": "Carol"},
+                {"rank": 5, "pseudo": "Romain"},
+            ],
+        )
+
+
+class WYEEscapeRoomCatalogue(AssertMixin, TestCase):
+    def setUp(self):
+        # Rooms of previous tests were rolled back, their ids get reused.
+        room_index.clear()
+        self.private_graph_url = "/private_graphql/"
+        self.user = get_user_model().objects.create_user(
+            email="romain@wye.com", pseudo="Romain", password="pass"
+        )
+
+        self.client.login(email="romain@wye.com", password="pass")
+
+    def create_session(self, name):
+        return EscapeRoomSession.objects.create(
+            name=name,
+            played_datetime=datetime.datetime(2001, 1, 1, 12, 0, 0, tzinfo=pytz.UTC),
+            duration_time=datetime.timedelta(minutes=60),
+            number_of_hints=0,
+            user=self.user,
+        )
+
+    def search_rooms(self, prefix, first=10):
+        query = """
+            query ($prefix: String!, $first: Int) {
+              searchRooms(prefix: $prefix, first: $first) { name }
+            }
+        """
+
+        response = self.client.post(
+            self.private_graph_url,
+            json.dumps({"query": query, "variables": {"prefix": prefix, "first": first}}),
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        rooms = json.loads(response.content.decode())["data"]["searchRooms"]
+        return [room["name"] for room in rooms]
+
+    def test_normalizes_names(self):
+        self.assertEqual(normalize_name("  L'Évasion   du BUNKER!"), "l evasion du bunker")
+        self.assertEqual(normalize_name("Le_Bunker"), "le bunker")
+
+    def test_sessions_with_different_spellings_share_a_room(self):
+        sessions = [
+            self.create_session(name)
+            for name in ("Le Bunker", "le bunker", "LE  BUNKER !", "Le Loft")
+        ]
+
+        self.assertEqual(len({session.room_id for session in sessions[:3]}), 1)
+        self.assertNotEqual(sessions[0].room_id, sessions[3].room_id)
+        self.assertEqual(sessions[0].room.name, "Le Bunker")
+
+        sessions[3].name = "Le bunker"
+        sessions[3].save()
+        self.assertEqual(sessions[3].room_id, sessions[0].room_id)
+
+    def test_imported_sessions_share_rooms(self):
+        mutation = """
+            mutation {
+              createRoomSessions(roomSessions: [
+                {name: "La Crypte", playedDatetime: "2001-01-01T12:00:00+00:00", durationTime: 2400, numberOfHints: 1},
+                {name: "la crypte", playedDatetime: "2001-01-02T12:00:00+00:00", durationTime: 1800, numberOfHints: 2}
+              ]) {
+                count
+              }
+            }
+        """
+        self.client.post(self.private_graph_url, {"query": mutation})
+        room = self.create_session("LA CRYPTE").room
+
+        self.assertEqual(EscapeRoom.objects.count(), 1)
+        self.assertEqual(room.sessions.count(), 3)
+
+    def test_filters_sessions_by_room(self):
+        room = self.create_session("Le Bunker").room
+        self.create_session("le bunker")
+        self.create_session("Le Loft")
+        query = """
+            query ($room: ID) {
+              roomSessionsConnection(room: $room) { edges { node { name } } }
+            }
+        """
+
+        response = self.client.post(
+            self.private_graph_url,
+            json.dumps({"query": query, "variables": {"room": room.pk}}),
+            content_type="application/json",
+        )
+
+        edges = json.loads(response.content.decode())["data"]["roomSessionsConnection"]["edges"]
+        self.assertEqual(sorted(edge["node"]["name"] for edge in edges), ["Le Bunker", "le bunker"])
+
+    def test_searches_rooms_by_prefix_of_their_words(self):
+        for name in ("Le Bunker", "Le Loft", "Bunker Hill", "Évasion", "Les Évadés", "Labo"):
+            self.create_session(name)
+
+        self.assertEqual(self.search_rooms("le"), ["Le Bunker", "Le Loft", "Les Évadés"])
+        self.assertEqual(self.search_rooms("BUNK"), ["Bunker Hill", "Le Bunker"])
+        self.assertEqual(self.search_rooms("eva"), ["Évasion", "Les Évadés"])
+        self.assertEqual(self.search_rooms("le b"), ["Le Bunker"])
+        self.assertEqual(self.search_rooms("le", first=2), ["Le Bunker", "Le Loft"])
+        # Short prefixes only match the start of names.
+        self.assertEqual(self.search_rooms("l"), ["Labo", "Le Bunker", "Le Loft", "Les Évadés"])
+        self.assertEqual(self.search_rooms("!"), [])
+
+    def test_search_finds_added_and_renamed_rooms(self):
+        self.create_session("Le Bunker")
+        self.assertEqual(self.search_rooms("bunker"), ["Le Bunker"])
+
+        room = self.create_session("Le Loft").room
+        self.assertEqual(self.search_rooms("loft"), ["Le Loft"])
+
+        room.name, room.normalized_name = "Le Grenier", "le grenier"
+        room.save()
+        self.assertEqual(self.search_rooms("loft"), [])
+        self.assertEqual(self.search_rooms("gren"), ["Le Grenier"])
+
+    def test_migration_deduplicates_names(self):
+        migration = importlib.import_module("rooms.migrations.0009_escaperoom_catalogue")
+        sessions = [
+            self.create_session(name)
+            for name in ("Le Bunker", "le bunker", "le bunker", "Le Loft")
+        ]
+        placeholder = EscapeRoom.objects.create(name="-", normalized_name="-")
+        EscapeRoomSession.objects.update(room=placeholder)
+        EscapeRoom.objects.exclude(pk=placeholder.pk).delete()
+
+        migration.build_catalogue(apps, mock.Mock(connection=connection))
+
+        rooms = {
+            session.name: session.room.name
+            for session in EscapeRoomSession.objects.select_related("room")
+        }
+        self.assertEqual(
+            rooms, {"Le Bunker": "le bunker", "le bunker": "le bunker", "Le Loft": "Le Loft"}
+        )
+        self.assertEqual(len(sessions), EscapeRoomSession.objects.count())
+
+
+class WYEEscapeRoomSessionsImport(AssertMixin, TestCase):
+    def setUp(self):
+        self.private_graph_url = "/private_graphql/"
+        self.import_url = "/room_sessions/import/"
+        self.user = get_user_model().objects.create_user(
+            email="romain@wye.com", pseudo="Romain", password="pass"
+        )
+
+        self.client.login(email="romain@wye.com", password="pass")
+
+    def test_can_create_room_sessions(self):
+        mutation = """
+            mutation {
+              createRoomSessions(roomSessions: [
+                {name: "Escape room Youkidea", playedDatetime:"2012-11-23T13:32:00+00:00", durationTime:1200.0, numberOfHints:0},
+                {name: "Escape room Toulouse", playedDatetime:"2012-12-23T13:32:00+00:00", durationTime:2400.0, numberOfHints:3}
+              ]) {
+                count
+              }
+            }
+        """
+
+        response = self.client.post(self.private_graph_url, {"query": mutation})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'{"data":{"createRoomSessions":{"count":2}}}')
+        self.assertTrue(
+            EscapeRoomSession.objects.filter(
+                name="Escape room Toulouse",
+                played_datetime=datetime.datetime(2012, 12, 23, 13, 32, tzinfo=pytz.UTC),
+                duration_time=datetime.timedelta(seconds=2400),
+                number_of_hints=3,
+                user=self.user,
+            ).exists()
+        )
+        self.assertEqual(RoomSessionStats.objects.get(user=self.user).count, 2)
+
+    def test_create_room_sessions_creates_nothing_if_a_session_is_invalid(self):
+        mutation = """
+            mutation {
+              createRoomSessions(roomSessions: [
+                {name: "Escape room Youkidea", playedDatetime:"2012-11-23T13:32:00+00:00", durationTime:1200.0, numberOfHints:0},
+                {name: "Escape room Toulouse", playedDatetime:"2012-12-23T13:32:00+00:00", durationTime:-1, numberOfHints:3}
+              ]) {
+                count
+              }
+            }
+        """
+
+        response = self.client.post(self.private_graph_url, {"query": mutation})
+
+        content = json.loads(response.content.decode())
+        self.assertTrue(
+            content["errors"][0]["message"].startswith("Invalid room session at index 1")
+        )
+        self.assertFalse(EscapeRoomSession.objects.exists())
+
+    def test_imports_csv_file_and_reports_invalid_rows(self):
+        body = (
+            "name,played_datetime,duration_time,number_of_hints\n"
+            "Escape room Youkidea,2012-11-23T13:32:00+00:00,1200,0\n"
+            "Escape room Toulouse,not a date,1200,0\n"
+            "Escape room Paris,2012-11-24T13:32:00+00:00,1500.5,2\n"
+        )
+
+        response = self.client.post(self.import_url, body, content_type="text/csv")
+
+        self.assertEqual(response.status_code, 200)
+        report = json.loads(response.content.decode())
+        self.assertEqual(report["created"], 2)
+        self.assertEqual(report["errorCount"], 1)
+        self.assertEqual(
+            report["errors"],
+            [{"row": 2, "errors": {"played_datetime": ["Enter a valid ISO 8601 date/time."]}}],
+        )
+        self.assertEqual(
+            EscapeRoomSession.objects.get(name="Escape room Paris").duration_time,
+            datetime.timedelta(seconds=1500.5),
+        )
+
+    def test_imports_json_lines_file(self):
+        body = (
+            '{"name": "Escape room Youkidea", "played_datetime": "2012-11-23T13:32:00+00:00", '
+            '"duration_time": 1200, "number_of_hints": 0}\n'
+            "not json\n"
+            "\n"
+            '{"name": "Escape room Paris", "played_datetime": "2012-11-24T13:32:00+00:00"}\n'
+        )
+
+        response = self.client.post(self.import_url, body, content_type="application/x-ndjson")
+
+        report = json.loads(response.content.decode())
+        self.assertEqual(report["created"], 1)
+        self.assertEqual(
+            report["errors"],
+            [
+                {"row": 2, "errors": ["Line is not a valid JSON object."]},
+                {
+                    "row": 3,
+                    "errors": {
+                        "duration_time": ["This field is required."],
+                        "number_of_hints": ["This field is required."],
+                    },
+                },
+            ],
+        )
+
+    @override_settings(ROOM_SESSIONS_IMPORT_BATCH_SIZE=100)
+    def test_imports_large_file_in_batches(self):
+        lines = ["name,played_datetime,duration_time,number_of_hints"]
+        for index in range(1050):
+            lines.append("Escape room {},2012-11-23T13:32:00+00:00,1200,1".format(index))
+
+        response = self.client.post(self.import_url, "\n".join(lines), content_type="text/csv")
+
+        self.assertEqual(json.loads(response.content.decode())["created"], 1050)
+        self.assertEqual(EscapeRoomSession.objects.filter(user=self.user).count(), 1050)
+        self.assertEqual(RoomSessionStats.objects.get(user=self.user).total_number_of_hints, 1050)
+
+    def test_rejects_unknown_content_type(self):
+        response = self.client.post(self.import_url, "{}", content_type="application/json")
+
+        self.assertEqual(response.status_code, 415)
+
+    def test_returns_401_if_user_is_anonymous(self):
+        self.client.logout()
+
+        response = self.client.post(self.import_url, "", content_type="text/csv")
+
+        self.assertEqual(response.status_code, 401)
+
+
+class WYEEscapeRoomSessionsExport(AssertMixin, TestCase):
+    def setUp(self):
+        self.export_url = "/room_sessions/export/"
+        self.user = get_user_model().objects.create_user(
+            email="romain@wye.com", pseudo="Romain", password="pass"
+        )
+        sessions = [
+            EscapeRoomSession(
+                name="Escape room {}".format(index),
+                played_datetime=datetime.datetime(2001, 1, 1, tzinfo=pytz.UTC)
+                + datetime.timedelta(hours=index),
+                duration_time=datetime.timedelta(seconds=1200),
+                number_of_hints=index % 4,
+                user=self.user,
+            )
+            for index in range(2500)
+        ]
+        assign_rooms(sessions)
+        EscapeRoomSession.objects.bulk_create(sessions)
+
+        self.client.login(email="romain@wye.com", password="pass")
+
+    @override_settings(ROOM_SESSIONS_EXPORT_CHUNK_SIZE=500)
+    def test_streams_csv_export_in_constant_queries(self):
+        # Warms up the session and user caches.
+        self.client.get(self.export_url, {"format": "csv"})
+
+        # A single cursor over the room sessions.
+        with self.assertNumQueries(1):
+            response = self.client.get(self.export_url, {"format": "csv"})
+            chunks = list(response.streaming_content)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "text/csv")
+        self.assertGreater(len(chunks), 5)
+
+        lines = b"".join(chunks).decode().splitlines()
+        self.assertEqual(len(lines), 2501)
+        self.assertEqual(lines[0], "name,played_datetime,duration_time,number_of_hints")
+        self.assertEqual(lines[1], "Escape room 0,2001-01-01T00:00:00+00:00,1200.0,0")
+
+    def test_streams_json_lines_export(self):
+        response = self.client.get(self.export_url, {"format": "ndjson"})
+
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 2500)
+        self.assertEqual(
+            json.loads(lines[-1]),
+            {
+                "name": "Escape room 2499",
+                "played_datetime": "2001-04-15T03:00:00+00:00",
+                "duration_time": 1200.0,
+                "number_of_hints": 3,
+            },
+        )
+
+    def test_compresses_export_when_accepted(self):
+        response = self.client.get(
+            self.export_url, {"format": "ndjson"}, HTTP_ACCEPT_ENCODING="gzip"
+        )
+
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        content = gzip.decompress(b"".join(response.streaming_content))
+        self.assertEqual(len(content.decode().splitlines()), 2500)
+
+    def test_export_can_be_imported_back(self):
+        response = self.client.get(self.export_url, {"format": "csv"})
+        export = b"".join(response.streaming_content)
+        EscapeRoomSession.objects.all().delete()
+
+        response = self.client.post("/room_sessions/import/", export, content_type="text/csv")
+
+        self.assertEqual(json.loads(response.content.decode())["created"], 2500)
+
+    def test_returns_401_if_user_is_anonymous(self):
+        self.client.logout()
+
+        response = self.client.get(self.export_url)
+
+        self.assertEqual(response.status_code, 401)
+
+
+class WYEEscapeRoomSessionsQueryCount(AssertMixin, TestCase):
+    def setUp(self):
+        # Refills the query cost budget, spent by expensive queries.
+        cache.clear()
+        self.private_graph_url = "/private_graphql/"
+        self.user = get_user_model().objects.create_user(
+            email="romain@wye.com", pseudo="Romain", password="pass"
+        )
+
+        self.client.login(email="romain@wye.com", password="pass")
+
+    def create_sessions(self, count):
+        sessions = [
+            EscapeRoomSession(
+                name="Escape room {}".format(index),
+                played_datetime=datetime.datetime(2001, 1, 1, tzinfo=pytz.UTC),
+                duration_time=datetime.timedelta(seconds=1200),
+                number_of_hints=0,
+                user=self.user,
+            )
+            for index in range(count)
+        ]
+        assign_rooms(sessions)
+        EscapeRoomSession.objects.bulk_create(sessions)
+
+    def assertConstantQueries(self, num, query, list_field):
+        # Warms up the session and user caches, so that only the queries of the
+        # GraphQL execution are counted. Another query is sent, the response to
+        # `query` would be cached.
+        self.client.get(self.private_graph_url, {"query": "{ whoami }"})
+
+        # The same number of queries must run whatever the number of sessions.
+        for sessions_count in (1, 10):
+            EscapeRoomSession.objects.all().delete()
+            self.create_sessions(sessions_count)
+
+            with self.assertNumQueries(num):
+                response = self.client.get(self.private_graph_url, {"query": query})
+
+            content = json.loads(response.content.decode())
+            self.assertNotIn("errors", content)
+            self.assertEqual(len(content["data"][list_field]), sessions_count)
+
+    def test_room_sessions_run_in_constant_queries(self):
+        query = """
+            {
+                roomSessions {
+                  name
+                  user {
+                    pseudo
+                  }
+                }
+            }
+        """
+
+        # Room sessions joined with their user.
+        self.assertConstantQueries(1, query, "roomSessions")
+
+    # Nested lists of sessions exceed the default cost limit.
+    @override_settings(GRAPHQL_MAX_COST=20000)
+    def test_room_sessions_of_room_session_users_run_in_constant_queries(self):
+        query = """
+            {
+                roomSessions {
+                  name
+                  user {
+                    escaperoomsessionSet {
+                      name
+                    }
+                  }
+                }
+            }
+        """
+
+        # Room sessions joined with their user, and room sessions of their users.
+        self.assertConstantQueries(2, query, "roomSessions")
+
+
+class WYEEscapeRoomSessionsQueryOptimization(AssertMixin, TestCase):
+    def setUp(self):
+        # Refills the query cost budget, spent by expensive queries.
+        cache.clear()
+        self.private_graph_url = "/private_graphql/"
+        self.user = get_user_model().objects.create_user(
+            email="romain@wye.com", pseudo="Romain", password="pass"
+        )
+        EscapeRoomSession.objects.create(
+            name="Escape Room Toulouse",
+            played_datetime=datetime.datetime(2001, 1, 1, 12, 0, 0, tzinfo=pytz.UTC),
+            duration_time=datetime.timedelta(minutes=50, seconds=00),
+            number_of_hints=2,
+            user=self.user,
+        )
+
+        self.client.login(email="romain@wye.com", password="pass")
+
+    def get_room_sessions_sql(self, query):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.private_graph_url, {"query": query})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(b'"errors"', response.content)
+        return [
+            captured["sql"]
+            for captured in context.captured_queries
+            if 'FROM "rooms_escaperoomsession"' in captured["sql"]
+        ]
+
+    def test_only_fetches_selected_columns(self):
+        sql = self.get_room_sessions_sql("{ roomSessions { name } }")
+
+        self.assertEqual(len(sql), 1)
+        self.assertIn('"rooms_escaperoomsession"."name"', sql[0])
+        self.assertNotIn('"rooms_escaperoomsession"."number_of_hints"', sql[0])
+        self.assertNotIn('"rooms_escaperoomsession"."duration_time"', sql[0])
+
+    def test_fetches_selected_columns_through_fragments(self):
+        query = """
+            query {
+                roomSessions {
+                  ...sessionFields
+                  ... on EscapeRoomSessionType {
+                    durationTime
+                  }
+                }
+            }
+            fragment sessionFields on EscapeRoomSessionType {
+              numberOfHints
+            }
+        """
+
+        sql = self.get_room_sessions_sql(query)
+
+        self.assertIn('"rooms_escaperoomsession"."number_of_hints"', sql[0])
+        self.assertIn('"rooms_escaperoomsession"."duration_time"', sql[0])
+        self.assertNotIn('"rooms_escaperoomsession"."name"', sql[0])
+
+    def test_joins_selected_foreign_keys(self):
+        sql = self.get_room_sessions_sql("{ roomSessions { name user { pseudo } } }")
+
+        self.assertEqual(len(sql), 1)
+        self.assertIn('INNER JOIN "account_wyeuser"', sql[0])
+        self.assertIn('"account_wyeuser"."pseudo"', sql[0])
+        self.assertNotIn('"account_wyeuser"."password"', sql[0])
+
+    # Nested lists of sessions exceed the default cost limit.
+    @override_settings(GRAPHQL_MAX_COST=20000)
+    def test_prefetches_selected_reverse_relations(self):
+        sql = self.get_room_sessions_sql(
+            "{ roomSessions { user { escaperoomsessionSet { name } } } }"
+        )
+
+        self.assertEqual(len(sql), 2)
+        self.assertIn('"rooms_escaperoomsession"."user_id" IN', sql[1])
+
+    def test_only_fetches_selected_columns_of_connection_nodes(self):
+        sql = self.get_room_sessions_sql(
+            "{ roomSessionsConnection(first: 1) { edges { cursor node { name } } } }"
+        )
+
+        self.assertNotIn('"rooms_escaperoomsession"."number_of_hints"', sql[0])
+        self.assertIn('"rooms_escaperoomsession"."played_datetime"', sql[0])
+
+
+class WYEEscapeRoomSessionsFlatLists(AssertMixin, TestCase):
+    # Queries of roomSessions sent by the tests above, and variants of them.
+    flat_queries = [
+        "{ roomSessions { name playedDatetime durationTime numberOfHints } }",
+        "{ roomSessions { name } }",
+        "{ roomSessions { id __typename name first: numberOfHints second: numberOfHints } }",
+        """
+            query sessions {
+                roomSessions {
+                  ...sessionFields
+                  ... on EscapeRoomSessionType {
+                    durationTime
+                  }
+                }
+                others: roomSessions { playedDatetime }
+            }
+            fragment sessionFields on EscapeRoomSessionType {
+              numberOfHints
+              name
+            }
+        """,
+    ]
+    other_queries = [
+        "{ roomSessions { name user { pseudo } } }",
+        "{ roomSessions { name room { name } } }",
+        "query ($skip: Boolean!) { roomSessions { name @skip(if: $skip) } }",
+        "{ whoami roomSessions { name } }",
+        "{ roomSessionsConnection(first: 2) { edges { node { name } } } }",
+    ]
+
+    def setUp(self):
+        cache.clear()
+        self.private_graph_url = "/private_graphql/"
+        self.user = get_user_model().objects.create_user(
+            email="romain@wye.com", pseudo="Romain", password="pass"
+        )
+        sessions = [
+            EscapeRoomSession(
+                name=name,
+                played_datetime=datetime.datetime(2001, 1, 1, 12, 0, index, 123, tzinfo=pytz.UTC),
+                duration_time=datetime.timedelta(minutes=50, microseconds=index * 1001),
+                number_of_hints=index,
+                user=self.user,
+            )
+            for index, name in enumerate(['Escape Room "Toulouse"', "L'Évasion", "Le Bunker"])
+        ]
+        assign_rooms(sessions)
+        EscapeRoomSession.objects.bulk_create(sessions)
+
+        self.client.login(email="romain@wye.com", password="pass")
+
+    def query(self, query):
+        response = self.client.post(
+            self.private_graph_url,
+            json.dumps({"query": query, "variables": {"skip": False}}),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.content
+
+    def assertSameResponses(self, query, flat):
+        with mock.patch.object(
+            FlatListPlan, "execute", autospec=True, side_effect=FlatListPlan.execute
+        ) as execute:
+            content = self.query(query)
+        self.assertEqual(execute.called, flat)
+
+        with override_settings(GRAPHQL_FLAT_LISTS=False):
+            self.assertEqual(content, self.query(query))
+        self.assertNotIn(b'"errors"', content)
+
+    def test_flat_lists_match_generic_execution(self):
+        for query in self.flat_queries:
+            with self.subTest(query=query):
+                self.assertSameResponses(query, flat=True)
+
+    def test_other_queries_run_the_generic_execution(self):
+        for query in self.other_queries:
+            with self.subTest(query=query):
+                self.assertSameResponses(query, flat=False)
+
+    def test_only_fetches_selected_columns(self):
+        with CaptureQueriesContext(connection) as context:
+            self.query("{ roomSessions { id numberOfHints } }")
+
+        sql = [
+            captured["sql"]
+            for captured in context.captured_queries
+            if 'FROM "rooms_escaperoomsession"' in captured["sql"]
+        ]
+        self.assertEqual(len(sql), 1)
+        self.assertIn('"rooms_escaperoomsession"."number_of_hints"', sql[0])
+        self.assertNotIn('"rooms_escaperoomsession"."name"', sql[0])
+
+
+class WYEEscapeRoomSessionPartitions(AssertMixin, TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="romain@wye.com", pseudo="Romain", password="pass"
+        )
+
+    def create_session(self, played_datetime):
+        return EscapeRoomSession.objects.create(
+            name="Le Bunker",
+            played_datetime=played_datetime,
+            duration_time=datetime.timedelta(minutes=50),
+            number_of_hints=0,
+            user=self.user,
+        )
+
+    def test_sessions_of_a_month_are_filtered_on_played_datetime_bounds(self):
+        last_of_january = self.create_session(
+            datetime.datetime(2001, 1, 31, 23, 59, 59, tzinfo=pytz.UTC)
+        )
+        self.create_session(datetime.datetime(2001, 2, 1, tzinfo=pytz.UTC))
+        self.create_session(datetime.datetime(2000, 12, 31, 23, 59, 59, tzinfo=pytz.UTC))
+
+        sessions = EscapeRoomSession.objects.played_in_month(datetime.date(2001, 1, 15))
+
+        self.assertEqual(list(sessions), [last_of_january])
+        sql = str(sessions.query)
+        self.assertIn('"rooms_escaperoomsession"."played_datetime" >=', sql)
+        self.assertIn('"rooms_escaperoomsession"."played_datetime" <', sql)
+
+    def test_sessions_are_looked_up_with_their_played_datetime(self):
+        session = self.create_session(datetime.datetime(2001, 1, 1, tzinfo=pytz.UTC))
+
+        self.assertEqual(
+            EscapeRoomSession.objects.with_key(session.pk, session.played_datetime).get(), session
+        )
+        self.assertFalse(
+            EscapeRoomSession.objects.with_key(
+                session.pk, datetime.datetime(2001, 1, 2, tzinfo=pytz.UTC)
+            ).exists()
+        )
+
+    def test_partitions_cover_a_month_in_utc(self):
+        month = datetime.date(2001, 12, 1)
+
+        self.assertEqual(partitions.get_partition_name(month), "rooms_escaperoomsession_p2001_12")
+        self.assertEqual(
+            partitions.get_partition_bounds(month),
+            (
+                datetime.datetime(2001, 12, 1, tzinfo=pytz.UTC),
+                datetime.datetime(2002, 1, 1, tzinfo=pytz.UTC),
+            ),
+        )
+        self.assertEqual(partitions.add_months(month, 13), datetime.date(2003, 1, 1))
+
+    def get_partition(self, session):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT tableoid::regclass::text FROM rooms_escaperoomsession WHERE id = %s",
+                [session.pk],
+            )
+            return cursor.fetchone()[0]
+
+    def test_sessions_are_saved_to_the_partition_of_their_month(self):
+        if not partitions.is_partitioned(connection):
+            self.skipTest("Room sessions are only partitioned on PostgreSQL.")
+        session = self.create_session(datetime.datetime(1990, 1, 1, tzinfo=pytz.UTC))
+        self.assertEqual(self.get_partition(session), partitions.DEFAULT_PARTITION)
+
+        partitions.create_partition(connection, datetime.date(1990, 1, 1))
+
+        self.assertEqual(self.get_partition(session), "rooms_escaperoomsession_p1990_01")
+        self.assertEqual(partitions.list_partitions(connection)[0], datetime.date(1990, 1, 1))
+
+    def test_commands_leave_single_tables_alone(self):
+        if connection.vendor == "postgresql":
+            self.skipTest("Room sessions are partitioned on PostgreSQL.")
+        stdout = io.StringIO()
+
+        call_command("create_room_session_partitions", stdout=stdout)
+        call_command("archive_room_session_partitions", before="2001-01", stdout=stdout)
+
+        self.assertEqual(
+            stdout.getvalue(), "Room sessions are not partitioned on this database.\n" * 2
+        )
+
+
+class WYEEscapeRoomSessionAdmin(AssertMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.changelist_url = "/admin/rooms/escaperoomsession/"
+        self.admin = get_user_model().objects.create_superuser(
+            email="admin@wye.com", pseudo="Admin", password="pass"
+        )
+        self.user = get_user_model().objects.create_user(
+            email="romain@wye.com", pseudo="Romain", password="pass"
+        )
+
+        self.client.login(email="admin@wye.com", password="pass")
+
+    def create_session(self, played_datetime, user=None):
+        return EscapeRoomSession.objects.create(
+            name="Le Bunker",
+            played_datetime=played_datetime,
+            duration_time=datetime.timedelta(minutes=50),
+            number_of_hints=0,
+            user=user or self.user,
+        )
+
+    def create_sessions(self, count):
+        return [
+            self.create_session(datetime.datetime(2001, 1, day, tzinfo=pytz.UTC))
+            for day in range(1, count + 1)
+        ]
+
+    def test_users_and_rooms_of_listed_sessions_are_not_queried_per_row(self):
+        self.create_sessions(2)
+        # Loads the session and the user of the admin in their caches.
+        self.client.get(self.changelist_url)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.changelist_url)
+
+        for index in range(3):
+            self.create_session(
+                datetime.datetime(2001, 1, 10, tzinfo=pytz.UTC),
+                get_user_model().objects.create_user(
+                    email="user{}@wye.com".format(index), pseudo="User", password="pass"
+                ),
+            )
+        with self.assertNumQueries(len(queries)):
+            response = self.client.get(self.changelist_url)
+
+        self.assertEqual(len(response.context["cl"].result_list), 5)
+
+    def test_next_pages_are_listed_before_the_last_session_of_the_previous_one(self):
+        sessions = self.create_sessions(5)
+        model_admin = site._registry[EscapeRoomSession]
+
+        with mock.patch.object(model_admin, "list_per_page", 2):
+            response = self.client.get(self.changelist_url)
+            cl = response.context["cl"]
+            self.assertEqual(list(cl.result_list), sessions[:2:-1])
+            self.assertEqual(cl.next_page_url, "?before={}".format(sessions[3].pk))
+            self.assertContains(response, "Next page")
+
+            response = self.client.get(self.changelist_url + cl.next_page_url)
+            cl = response.context["cl"]
+            self.assertEqual(list(cl.result_list), sessions[2:0:-1])
+
+            response = self.client.get(self.changelist_url + cl.next_page_url)
+            cl = response.context["cl"]
+            self.assertEqual(list(cl.result_list), sessions[:1])
+            self.assertIsNone(cl.next_page_url)
+            self.assertContains(response, "First page")
+
+    def test_invalid_cursors_are_rejected(self):
+        response = self.client.get(self.changelist_url, {"before": "nope"})
+
+        self.assertRedirects(response, self.changelist_url + "?e=1", fetch_redirect_response=False)
+
+    def test_date_hierarchy_lists_every_year_between_the_first_and_last_sessions(self):
+        self.create_session(datetime.datetime(2001, 6, 1, tzinfo=pytz.UTC))
+        self.create_session(datetime.datetime(2003, 6, 1, tzinfo=pytz.UTC))
+
+        response = self.client.get(self.changelist_url)
+
+        for year in (2001, 2002, 2003):
+            self.assertContains(response, "played_datetime__year={}".format(year))
+
+        response = self.client.get(self.changelist_url, {"played_datetime__year": 2001})
+
+        self.assertContains(response, "played_datetime__month=6")
+        self.assertNotContains(response, "played_datetime__month=5")
+
+    def test_date_hierarchy_of_next_pages_lists_the_years_of_every_page(self):
+        self.create_session(datetime.datetime(2001, 6, 1, tzinfo=pytz.UTC))
+        last_session = self.create_session(datetime.datetime(2003, 6, 1, tzinfo=pytz.UTC))
+
+        response = self.client.get(self.changelist_url, {"before": last_session.pk})
+
+        self.assertEqual(len(response.context["cl"].result_list), 1)
+        for year in (2001, 2002, 2003):
+            self.assertContains(response, "played_datetime__year={}".format(year))
+
+    def test_selected_sessions_are_deleted_by_chunks_along_with_their_stats(self):
+        sessions = self.create_sessions(3)
+        data = {
+            "action": "delete_room_sessions",
+            "_selected_action": [sessions[0].pk, sessions[1].pk],
+        }
+
+        response = self.client.post(self.changelist_url, data)
+
+        self.assertContains(response, "Delete the 2 selected room sessions?")
+        self.assertEqual(EscapeRoomSession.objects.count(), 3)
+
+        with self.settings(ADMIN_ACTION_CHUNK_SIZE=1):
+            response = self.client.post(self.changelist_url, dict(data, post="yes"))
+
+        self.assertRedirects(response, self.changelist_url, fetch_redirect_response=False)
+        self.assertEqual(list(EscapeRoomSession.objects.all()), sessions[2:])
+        self.assertEqual(RoomSessionStats.objects.get(user=self.user).count, 1)
+        self.assertEqual(
+            set(LeaderboardEntry.objects.values_list("played_datetime", flat=True)),
+            {sessions[2].played_datetime},
+        )
+
+    def test_users_are_picked_with_autocomplete(self):
+        response = self.client.get("/admin/account/wyeuser/autocomplete/", {"term": "rom"})
+
+        self.assertEqual(
+            json.loads(response.content.decode())["results"],
+            [{"id": str(self.user.pk), "text": str(self.user)}],
+        )
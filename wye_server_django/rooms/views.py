@@ -1,3 +1,71 @@
-from django.shortcuts import render
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views.decorators.gzip import gzip_page
+from django.views.generic import View
 
-# Create your views here.
+from core.views import AuthenticationRequiredMixin
+from rooms.exporters import export_csv, export_json_lines
+from rooms.importers import import_room_sessions, read_csv_rows, read_json_lines
+from rooms.models import EscapeRoomSession
+
+ROW_READERS = {
+    "text/csv": read_csv_rows,
+    "application/x-ndjson": read_json_lines,
+    "application/jsonl": read_json_lines,
+}
+
+
+class RoomSessionImportView(AuthenticationRequiredMixin, View):
+    """
+    Imports room sessions from a CSV or JSON lines request body.
+
+    The body is read line by line and written in batches, so that large files
+    are never held whole in memory.
+    """
+
+    def post(self, request):
+        read_rows = ROW_READERS.get(request.content_type)
+        if read_rows is None:
+            return HttpResponse(
+                "Unsupported content type, use one of: {}".format(", ".join(ROW_READERS)),
+                status=415,
+            )
+
+        lines = (line.decode("utf-8", errors="replace") for line in request)
+        report = import_room_sessions(request.user, read_rows(lines))
+
+        return JsonResponse(report.as_dict())
+
+
+EXPORT_FORMATS = {
+    "csv": (export_csv, "text/csv"),
+    "ndjson": (export_json_lines, "application/x-ndjson"),
+}
+
+
+@method_decorator(gzip_page, name="dispatch")
+class RoomSessionExportView(AuthenticationRequiredMixin, View):
+    """
+    Streams the room sessions of the user as CSV or JSON lines.
+
+    Rows are fetched in chunks from a server-side cursor and encoded as they are
+    sent, so memory use stays flat whatever the number of sessions.
+    """
+
+    def get(self, request):
+        export_format = request.GET.get("format", "csv")
+        if export_format not in EXPORT_FORMATS:
+            return HttpResponse(
+                "Unsupported format, use one of: {}".format(", ".join(EXPORT_FORMATS)),
+                status=400,
+            )
+
+        export, content_type = EXPORT_FORMATS[export_format]
+        response = StreamingHttpResponse(
+            export(EscapeRoomSession.objects.filter(user=request.user)),
+            content_type=content_type,
+        )
+        response["Content-Disposition"] = 'attachment; filename="room_sessions.{}"'.format(
+            export_format
+        )
+        return response